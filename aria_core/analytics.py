@@ -0,0 +1,373 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Execution analytics built from workflow events.
+
+task_started events are paired with the task_succeeded / task_failed
+events of the same task into task samples, which feed latency
+histograms per operation, per node and per plugin. The critical path
+is the chain of dependent nodes (through their relationships) with the
+longest accumulated duration, i.e. the nodes that set the length of
+the execution.
+"""
+
+import bisect
+import calendar
+import collections
+import datetime
+import json
+import os
+import tempfile
+
+TASK_STARTED = 'task_started'
+TASK_SUCCEEDED = 'task_succeeded'
+TASK_FAILED = 'task_failed'
+
+# seconds, last bucket is +Inf
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120, 300, 600)
+
+METRICS_PREFIX = 'aria'
+
+TaskSample = collections.namedtuple(
+    'TaskSample',
+    ['task_id', 'operation', 'node', 'node_instance', 'plugin',
+     'source_id', 'target_id', 'started_at', 'duration', 'succeeded'])
+
+
+def _parse_timestamp(timestamp):
+    timestamp = timestamp.replace('T', ' ').rstrip('Z')
+    seconds, _, fraction = timestamp.partition('.')
+    parsed = datetime.datetime.strptime(seconds, '%Y-%m-%d %H:%M:%S')
+    # only differences matter, the time zone is irrelevant
+    return (calendar.timegm(parsed.timetuple()) +
+            float('0.{0}'.format(fraction or '0')))
+
+
+def _node_name(context):
+    node_name = context.get('node_name')
+    if node_name:
+        return node_name
+    node_instance = context.get('node_id')
+    return node_instance.rsplit('_', 1)[0] if node_instance else None
+
+
+def _plugin(context):
+    plugin = context.get('plugin')
+    if plugin:
+        return plugin
+    task_name = context.get('task_name')
+    return task_name.split('.')[0] if task_name else None
+
+
+def _task_key(context):
+    task_id = context.get('task_id')
+    if task_id:
+        return task_id
+    return (context.get('node_id'), context.get('operation'),
+            context.get('source_id'), context.get('target_id'))
+
+
+def pair_tasks(events):
+    """
+    Pairs started and ended task events
+    :param events: iterable of raw workflow events
+    :return: generator of TaskSample, in order of task completion
+    """
+    started = {}
+    for event in events:
+        event_type = event.get('event_type')
+        if event_type not in (TASK_STARTED, TASK_SUCCEEDED, TASK_FAILED):
+            continue
+        context = event.get('context') or {}
+        timestamp = _parse_timestamp(
+            event.get('@timestamp') or event['timestamp'])
+        key = _task_key(context)
+        if event_type == TASK_STARTED:
+            started[key] = timestamp
+            continue
+        started_at = started.pop(key, None)
+        if started_at is None:
+            continue
+        operation = context.get('operation')
+        yield TaskSample(
+            task_id=context.get('task_id'),
+            operation=operation.split('.')[-1] if operation else None,
+            node=_node_name(context),
+            node_instance=context.get('node_id'),
+            plugin=_plugin(context),
+            source_id=context.get('source_id'),
+            target_id=context.get('target_id'),
+            started_at=started_at,
+            duration=timestamp - started_at,
+            succeeded=event_type == TASK_SUCCEEDED)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self):
+        total, cumulative = 0, []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the quantile
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, cumulative in zip(self.buckets + (self.max,),
+                                     self.cumulative_counts()):
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip(
+                [str(b) for b in self.buckets] + ['+Inf'],
+                self.cumulative_counts())),
+        }
+
+
+def node_dependencies(nodes):
+    """
+    Node dependencies of a deployment plan
+    :param nodes: plan nodes
+    :type nodes: list
+    :return: dict of node ID to the node IDs it depends on
+    """
+    return dict((node['id'], set(relationship['target_id']
+                                 for relationship in
+                                 node.get('relationships') or []))
+                for node in nodes)
+
+
+class ExecutionAnalytics(object):
+
+    def __init__(self, events, dependencies=None,
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Latency histograms and critical path of an execution
+        :param events: iterable of raw workflow events
+        :param dependencies: dict of node ID to the node IDs it depends
+                             on, taken from relationship operations
+                             of the events if missing
+        :type dependencies: dict
+        :param buckets: histogram bucket bounds in seconds
+        :return: None
+        """
+        self._buckets = buckets
+        self.by_operation = {}
+        self.by_node = {}
+        self.by_plugin = {}
+        self.failures = collections.Counter()
+        self.node_spans = {}
+        instance_nodes = {}
+        relationship_edges = set()
+        for sample in pair_tasks(events):
+            self._observe(self.by_operation, sample.operation, sample)
+            self._observe(self.by_node, sample.node, sample)
+            self._observe(self.by_plugin, sample.plugin, sample)
+            if not sample.succeeded:
+                self.failures[sample.operation] += 1
+            if sample.node is None:
+                continue
+            instance_nodes[sample.node_instance] = sample.node
+            ended_at = sample.started_at + sample.duration
+            first, last = self.node_spans.get(
+                sample.node, (sample.started_at, ended_at))
+            self.node_spans[sample.node] = (min(first, sample.started_at),
+                                            max(last, ended_at))
+            if sample.source_id and sample.target_id:
+                relationship_edges.add((sample.source_id, sample.target_id))
+        if dependencies is None:
+            dependencies = collections.defaultdict(set)
+            for source_id, target_id in relationship_edges:
+                source = instance_nodes.get(source_id)
+                target = instance_nodes.get(target_id)
+                if source and target and source != target:
+                    dependencies[source].add(target)
+        self.dependencies = dependencies
+
+    def _observe(self, histograms, label, sample):
+        if label is None:
+            return
+        if label not in histograms:
+            histograms[label] = Histogram(self._buckets)
+        histograms[label].observe(sample.duration)
+
+    def node_durations(self):
+        return dict((node, last - first)
+                    for node, (first, last) in self.node_spans.items())
+
+    def critical_path(self):
+        """
+        Chain of dependent nodes with the longest accumulated duration
+        :return: dict with the path (list of node and duration
+                 dicts, first node first) and its total duration
+        """
+        durations = self.node_durations()
+        costs, previous = {}, {}
+
+        def cost(node, visiting=()):
+            if node in costs:
+                return costs[node]
+            if node in visiting:
+                # relationships never form cycles in a valid
+                # plan, do not loop forever on a broken one
+                return 0
+            best, best_target = 0, None
+            for target in self.dependencies.get(node, ()):
+                target_cost = cost(target, visiting + (node,))
+                if target_cost > best:
+                    best, best_target = target_cost, target
+            costs[node] = durations.get(node, 0) + best
+            previous[node] = best_target
+            return costs[node]
+
+        nodes = set(durations) | set(self.dependencies)
+        for node in sorted(nodes):
+            cost(node)
+        if not costs:
+            return {'path': [], 'duration': 0}
+        node = max(sorted(costs), key=lambda n: costs[n])
+        total, path = costs[node], []
+        while node is not None:
+            path.append({'node': node, 'duration': durations.get(node, 0)})
+            node = previous.get(node)
+        path.reverse()
+        return {'path': path, 'duration': total}
+
+    def to_dict(self):
+        def histograms(by_label):
+            return dict((label, histogram.to_dict())
+                        for label, histogram in by_label.items())
+        return {
+            'operations': histograms(self.by_operation),
+            'nodes': histograms(self.by_node),
+            'plugins': histograms(self.by_plugin),
+            'failures': dict(self.failures),
+            'node_durations': self.node_durations(),
+            'critical_path': self.critical_path(),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix=METRICS_PREFIX, labels=None):
+        """
+        Renders the analytics in the Prometheus text exposition format
+        :param prefix: metric name prefix
+        :type prefix: str
+        :param labels: labels added to every sample,
+                       e.g. the Blueprint ID and Execution ID
+        :type labels: dict
+        :return: str
+        """
+        labels = labels or {}
+        lines = []
+        for dimension, by_label in (('operation', self.by_operation),
+                                    ('node', self.by_node),
+                                    ('plugin', self.by_plugin)):
+            name = '{0}_{1}_duration_seconds'.format(prefix, dimension)
+            lines.append('# HELP {0} Task duration per {1}.'
+                         .format(name, dimension))
+            lines.append('# TYPE {0} histogram'.format(name))
+            for label in sorted(by_label):
+                histogram = by_label[label]
+                sample_labels = dict(labels, **{dimension: label})
+                bounds = [repr(float(b)) for b in histogram.buckets]
+                for bound, cumulative in zip(bounds + ['+Inf'],
+                                             histogram.cumulative_counts()):
+                    lines.append(_sample(name + '_bucket',
+                                         dict(sample_labels, le=bound),
+                                         cumulative))
+                lines.append(_sample(name + '_sum', sample_labels,
+                                     histogram.sum))
+                lines.append(_sample(name + '_count', sample_labels,
+                                     histogram.count))
+
+        name = '{0}_task_failures'.format(prefix)
+        lines.append('# HELP {0} Failed tasks per operation.'.format(name))
+        lines.append('# TYPE {0} gauge'.format(name))
+        for operation in sorted(self.failures):
+            lines.append(_sample(name, dict(labels, operation=operation),
+                                 self.failures[operation]))
+
+        name = '{0}_critical_path_seconds'.format(prefix)
+        lines.append('# HELP {0} Duration of the critical path.'
+                     .format(name))
+        lines.append('# TYPE {0} gauge'.format(name))
+        lines.append(_sample(name, labels, self.critical_path()['duration']))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix=METRICS_PREFIX, labels=None):
+        """
+        Writes a textfile for the node exporter textfile collector,
+        atomically so that the collector never reads a partial file
+        :param path: path of the .prom file
+        :type path: str
+        :return: None
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus(prefix=prefix, labels=labels))
+            os.rename(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def _format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n'))
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{{{0}}}'.format(','.join(
+            '{0}="{1}"'.format(key, _escape(labels[key]))
+            for key in sorted(labels)))
+    return '{0} {1}'.format(name, _format_value(value))
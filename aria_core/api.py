@@ -12,23 +12,50 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import functools
 import shutil
 import warnings
 
+from aria_core import analytics
 from aria_core import blueprints
+from aria_core import checkpoint
+from aria_core import event_log
+from aria_core import exceptions
+from aria_core import executor
+from aria_core import instrumentation
 from aria_core import logger
+from aria_core import redeploy
 from aria_core import utils
+from aria_core import wd_settings
 from aria_core import workflows
+from aria_core.processor import plugin_env_cache
 
 
 LOG = logger.get_logger(__name__)
 
 
+def _in_working_dir(func):
+    # imports of blueprints are resolved with the
+    # settings of the working dir of the API object
+    @functools.wraps(func)
+    def in_working_dir(self, *args, **kwargs):
+        with wd_settings.working_dir(self._working_dir):
+            return func(self, *args, **kwargs)
+    return in_working_dir
+
+
 class BlueprintsAPI(object):
 
-    def __init__(self, storage_path):
+    def __init__(self, storage_path, env_cache=None, storage_backend=None,
+                 working_dir=None):
         self._storage_path = storage_path
+        self._storage_backend = storage_backend
+        self._working_dir = working_dir
+        self._env_cache = (env_cache if env_cache is not None
+                           else blueprints.EnvironmentCache())
 
+    @_in_working_dir
     def validate(self, blueprint_path):
         """
         Validates a blueprint using Aria DSL parser API
@@ -36,10 +63,16 @@ class BlueprintsAPI(object):
         :type blueprint_path: str
         :return: None
         """
-        return blueprints.validate(blueprint_path)
+        return blueprints.validate(blueprint_path,
+                                   storage_path=self._storage_path)
 
+    @instrumentation.instrumented('blueprints.initialize')
+    @_in_working_dir
     def initialize(self, blueprint_id, blueprint_path,
-                   inputs=None, install_plugins=False):
+                   inputs=None, install_plugins=False,
+                   shared_plugin_env=False,
+                   clone_plugin_env=False,
+                   use_wheelhouse=False):
         """
         Initialized a blueprint
         :param blueprint_id: Blueprint ID
@@ -50,11 +83,21 @@ class BlueprintsAPI(object):
         :type inputs: dict
         :param install_plugins: if necessary to install blueprint plugins
         :type install_plugins: bool
+        :param shared_plugin_env: reuse a plugin virtualenv shared by
+                                  blueprints with the same requirements
+        :type shared_plugin_env: bool
+        :param clone_plugin_env: clone the blueprint virtualenv from
+                                 a template with the same requirements
+        :type clone_plugin_env: bool
+        :param use_wheelhouse: install plugins offline from wheels
+                               built once into the local wheelhouse
+        :type use_wheelhouse: bool
         :return:
         """
         try:
             blueprint_storage = blueprints.init_blueprint_storage(
-                blueprint_id, storage_path=self._storage_path)
+                blueprint_id, storage_path=self._storage_path,
+                storage_backend=self._storage_backend)
             return blueprints.initialize_blueprint(
                 blueprint_path,
                 blueprint_id,
@@ -62,100 +105,470 @@ class BlueprintsAPI(object):
                 inputs=inputs,
                 install_plugins=install_plugins,
                 storage_path=self._storage_path,
+                shared_plugin_env=shared_plugin_env,
+                clone_plugin_env=clone_plugin_env,
+                use_wheelhouse=use_wheelhouse,
             )
         except BaseException as e:
             LOG.exception(str(e))
             raise e
+        finally:
+            self._env_cache.invalidate(
+                blueprint_id, storage_path=self._storage_path)
 
     def teardown(self, blueprint_id):
+        self._env_cache.invalidate(
+            blueprint_id, storage_path=self._storage_path)
+        plugin_env_cache.release(
+            blueprint_id, storage_path=self._storage_path)
         blueprint_storage = utils.storage_dir(
             blueprint_id, storage_path=self._storage_path)
         shutil.rmtree(blueprint_storage, ignore_errors=True)
 
     def load_blueprint_storage(self, blueprint_id):
         return blueprints.load_blueprint_storage_env(
-            blueprint_id, storage_path=self._storage_path)
+            blueprint_id, storage_path=self._storage_path,
+            storage_backend=self._storage_backend,
+            env_cache=self._env_cache)
 
     def outputs(self, blueprint_id):
         return blueprints.outputs(
-            blueprint_id, storage_path=self._storage_path)
+            blueprint_id, storage_path=self._storage_path,
+            storage_backend=self._storage_backend,
+            env_cache=self._env_cache)
 
     def instances(self, blueprint_id, node_id=None):
         return blueprints.instances(blueprint_id,
                                     node_id=node_id,
-                                    storage_path=self._storage_path)
+                                    storage_path=self._storage_path,
+                                    storage_backend=self._storage_backend,
+                                    env_cache=self._env_cache)
+
+    def query_instances(self, blueprint_id, node_ids=None, states=None,
+                        host_ids=None, after=None, limit=None):
+        """
+        Streams node instances of a blueprint matching every given filter
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param node_ids: node ID or list of node IDs
+        :param states: state or list of states
+        :param host_ids: host instance ID or list of host instance IDs
+        :param after: node instance ID to continue after, pass the ID
+                      of the last instance of a page to get the next one
+        :type after: str
+        :param limit: page size, all matching instances by default
+        :type limit: int
+        :return: generator of node instances, ordered by ID
+        """
+        return blueprints.query_instances(
+            blueprint_id,
+            node_ids=node_ids,
+            states=states,
+            host_ids=host_ids,
+            after=after,
+            limit=limit,
+            storage_path=self._storage_path,
+            storage_backend=self._storage_backend,
+            env_cache=self._env_cache)
 
+    @_in_working_dir
     def create_requirements(self, blueprint_path):
-        return blueprints.create_requirements(blueprint_path)
+        return blueprints.create_requirements(
+            blueprint_path, storage_path=self._storage_path)
 
 
 class ExecutionsAPI(object):
 
-    def __init__(self, storage_path):
+    def __init__(self, storage_path, env_cache=None, storage_backend=None,
+                 working_dir=None):
         self._storage_path = storage_path
+        self._storage_backend = storage_backend
+        self._working_dir = working_dir
+        self._env_cache = (env_cache if env_cache is not None
+                           else blueprints.EnvironmentCache())
+
+    @contextlib.contextmanager
+    def _environment(self, blueprint_id):
+        try:
+            with instrumentation.span('load_env'):
+                environment = blueprints.load_blueprint_storage_env(
+                    blueprint_id, storage_path=self._storage_path,
+                    storage_backend=self._storage_backend,
+                    env_cache=self._env_cache)
+            yield environment
+        finally:
+            # executions write to the blueprint storage
+            self._env_cache.invalidate(
+                blueprint_id, storage_path=self._storage_path)
 
+    @instrumentation.instrumented('executions.install')
     def install(self,
                 blueprint_id,
                 parameters=None,
                 allow_custom_parameters=None,
                 task_retries=None,
-                task_retry_interval=None):
-        environment = blueprints.load_blueprint_storage_env(
-            blueprint_id, storage_path=self._storage_path)
-        return workflows.install(
-            blueprint_id,
-            parameters=parameters,
-            allow_custom_parameters=allow_custom_parameters,
-            task_retries=task_retries,
-            task_retry_interval=task_retry_interval,
-            environment=environment)
+                task_retry_interval=None,
+                execution_id=None,
+                retry_policy=None,
+                concurrency=None):
+        with self._environment(blueprint_id) as environment:
+            return workflows.install(
+                blueprint_id,
+                parameters=parameters,
+                allow_custom_parameters=allow_custom_parameters,
+                task_retries=task_retries,
+                task_retry_interval=task_retry_interval,
+                environment=environment,
+                storage_path=self._storage_path,
+                execution_id=execution_id,
+                retry_policy=retry_policy,
+                concurrency=concurrency)
 
+    @instrumentation.instrumented('executions.uninstall')
     def uninstall(self,
                   blueprint_id,
                   parameters=None,
                   allow_custom_parameters=None,
                   task_retries=None,
-                  task_retry_interval=None):
-        environment = blueprints.load_blueprint_storage_env(
-            blueprint_id, storage_path=self._storage_path)
-        return workflows.uninstall(
-            blueprint_id,
-            parameters=parameters,
-            allow_custom_parameters=allow_custom_parameters,
-            task_retries=task_retries,
-            task_retry_interval=task_retry_interval,
-            environment=environment)
+                  task_retry_interval=None,
+                  execution_id=None,
+                  retry_policy=None,
+                  concurrency=None):
+        with self._environment(blueprint_id) as environment:
+            return workflows.uninstall(
+                blueprint_id,
+                parameters=parameters,
+                allow_custom_parameters=allow_custom_parameters,
+                task_retries=task_retries,
+                task_retry_interval=task_retry_interval,
+                environment=environment,
+                storage_path=self._storage_path,
+                execution_id=execution_id,
+                retry_policy=retry_policy,
+                concurrency=concurrency)
 
+    @instrumentation.instrumented('executions.execute_custom')
     def execute_custom(self,
                        blueprint_id,
                        workflow_id,
                        parameters=None,
                        allow_custom_parameters=None,
                        task_retries=None,
-                       task_retry_interval=None):
+                       task_retry_interval=None,
+                       execution_id=None,
+                       retry_policy=None,
+                       concurrency=None):
+        with self._environment(blueprint_id) as environment:
+            return workflows.generic_execute(
+                blueprint_id=blueprint_id,
+                workflow_id=workflow_id,
+                parameters=parameters,
+                allow_custom_parameters=allow_custom_parameters,
+                task_retries=task_retries,
+                task_retry_interval=task_retry_interval,
+                environment=environment,
+                storage_path=self._storage_path,
+                execution_id=execution_id,
+                retry_policy=retry_policy,
+                concurrency=concurrency)
+
+    @instrumentation.instrumented('executions.update')
+    @_in_working_dir
+    def update(self,
+               blueprint_id,
+               blueprint_path,
+               inputs=None,
+               install_plugins=False,
+               dry_run=False,
+               allow_custom_parameters=None,
+               task_retries=None,
+               task_retry_interval=None,
+               retry_policy=None,
+               concurrency=None):
+        """
+        Redeploys only the nodes changed since the blueprint was
+        installed, along with the nodes that depend on them
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param blueprint_path: path to the new blueprint
+        :type blueprint_path: str
+        :param inputs: deployment inputs of the new blueprint
+        :type inputs: dict
+        :param install_plugins: install plugins of the new blueprint
+        :type install_plugins: bool
+        :param dry_run: only compute what would change
+        :type dry_run: bool
+        :return: redeploy.PlanDiff with the added, removed, modified
+                 and dependent nodes, and the changed relationships
+        """
+        try:
+            return redeploy.update(
+                blueprint_id,
+                blueprint_path,
+                inputs=inputs,
+                install_plugins=install_plugins,
+                dry_run=dry_run,
+                storage_path=self._storage_path,
+                storage_backend=self._storage_backend,
+                env_cache=self._env_cache,
+                allow_custom_parameters=allow_custom_parameters,
+                task_retries=task_retries,
+                task_retry_interval=task_retry_interval,
+                retry_policy=retry_policy,
+                concurrency=concurrency)
+        finally:
+            self._env_cache.invalidate(
+                blueprint_id, storage_path=self._storage_path)
+
+    @instrumentation.instrumented('executions.resume')
+    def resume(self,
+               blueprint_id,
+               execution_id,
+               task_retries=None,
+               task_retry_interval=None,
+               retry_policy=None,
+               concurrency=None):
+        """
+        Resumes a failed execution, runs its workflow again
+        skipping the tasks that succeeded in earlier runs
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :param task_retries: overrides task_retries of the execution
+        :type task_retries: int
+        :param task_retry_interval: overrides task_retry_interval
+                                    of the execution
+        :type task_retry_interval: int
+        :param retry_policy: overrides the retry policy of the execution
+        :type retry_policy: retry.RetryPolicy
+        :param concurrency: overrides the concurrency of the execution
+        :return: workflow result
+        """
+        execution = checkpoint.Checkpoint(
+            blueprint_id, execution_id, storage_path=self._storage_path)
+        header = execution.header()
+        if header['status'] == checkpoint.STATUS_COMPLETED:
+            raise exceptions.AriaValidationError(
+                'Execution {0} of {1} has already completed'.format(
+                    execution_id, blueprint_id))
+        if execution.running():
+            raise exceptions.AriaValidationError(
+                'Execution {0} of {1} is still running'.format(
+                    execution_id, blueprint_id))
+        execute_kwargs = dict(header['execute_kwargs'])
+        if task_retries is not None:
+            execute_kwargs['task_retries'] = task_retries
+        if task_retry_interval is not None:
+            execute_kwargs['task_retry_interval'] = task_retry_interval
+        if retry_policy is None:
+            retry_policy = header.get('retry_policy')
+        if concurrency is None:
+            concurrency = header.get('concurrency')
+        completed_tasks = execution.completed_tasks()
+        LOG.info('Resuming execution {0} of {1}, skipping {2} '
+                 'completed tasks'.format(execution_id, blueprint_id,
+                                          len(completed_tasks)))
+        with self._environment(blueprint_id) as environment:
+            return workflows.generic_execute(
+                blueprint_id=blueprint_id,
+                workflow_id=header['workflow_id'],
+                parameters=header['parameters'],
+                environment=environment,
+                storage_path=self._storage_path,
+                execution_id=execution_id,
+                retry_policy=retry_policy,
+                concurrency=concurrency,
+                completed_tasks=completed_tasks,
+                **execute_kwargs)
+
+    def executions(self, blueprint_id):
+        """
+        Executions of a blueprint that have an event log
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :return: list of Execution IDs, oldest first
+        """
+        return event_log.executions(blueprint_id,
+                                    storage_path=self._storage_path)
+
+    def status(self, blueprint_id, execution_id):
+        """
+        Status of an execution
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :return: dict with status, error and number of events,
+                 None while the execution runs
+        """
+        return event_log.status(event_log.execution_dir(
+            blueprint_id, execution_id, storage_path=self._storage_path))
+
+    def events(self, blueprint_id, execution_id, since=0, limit=None):
+        """
+        Logged events of an execution
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :param since: offset of the first event, pass the offset
+                      after the last one read to get only new events
+        :type since: int
+        :param limit: maximum number of events
+        :type limit: int
+        :return: list of event_log.EventRecord (offset, event)
+        """
+        return event_log.read(
+            event_log.execution_dir(blueprint_id, execution_id,
+                                    storage_path=self._storage_path),
+            since=since, limit=limit)
+
+    def follow(self, blueprint_id, execution_id, since=0,
+               poll_interval=event_log.DEFAULT_POLL_INTERVAL, timeout=None):
+        """
+        Follows the events of an execution, possibly running
+        in another process, until the execution ends
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :param since: offset of the first event
+        :type since: int
+        :param poll_interval: seconds between polls once caught up
+        :type poll_interval: float
+        :param timeout: seconds to follow at most
+        :type timeout: float
+        :return: generator of event_log.EventRecord (offset, event)
+        """
+        return event_log.follow(
+            event_log.execution_dir(blueprint_id, execution_id,
+                                    storage_path=self._storage_path),
+            since=since, poll_interval=poll_interval, timeout=timeout)
+
+    def analytics(self, blueprint_id, execution_id):
+        """
+        Per-operation, per-node and per-plugin latency histograms
+        and the critical path of an execution, from its event log
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :return: analytics.ExecutionAnalytics, see its to_dict,
+                 to_json and write_prometheus
+        """
         environment = blueprints.load_blueprint_storage_env(
-            blueprint_id, storage_path=self._storage_path)
-        return workflows.generic_execute(
-            blueprint_id=blueprint_id,
-            workflow_id=workflow_id,
-            parameters=parameters,
+            blueprint_id, storage_path=self._storage_path,
+            storage_backend=self._storage_backend,
+            env_cache=self._env_cache)
+        records = event_log.iterate(event_log.execution_dir(
+            blueprint_id, execution_id, storage_path=self._storage_path))
+        return analytics.ExecutionAnalytics(
+            (record.event for record in records),
+            dependencies=analytics.node_dependencies(
+                environment.storage.get_nodes()))
+
+    def execute_many(self,
+                     deployments,
+                     workflow_id='install',
+                     max_workers=None,
+                     limits=None,
+                     allow_custom_parameters=None,
+                     task_retries=None,
+                     task_retry_interval=None,
+                     retry_policy=None,
+                     concurrency=None):
+        """
+        Executes a workflow on many deployments in worker processes
+        :param deployments: Blueprint IDs, executor.Deployment objects
+                            or dicts with blueprint_id, parameters
+                            and concurrency groups
+        :type deployments: list
+        :param workflow_id: Workflow ID
+        :type workflow_id: str
+        :param max_workers: worker processes, defaults to the CPU count
+        :type max_workers: int
+        :param limits: maximum concurrent deployments per group,
+                       e.g. {'plugin:openstack': 4}
+        :type limits: dict
+        :param retry_policy: retry policy of every execution
+        :type retry_policy: retry.RetryPolicy
+        :param concurrency: thread pool size of every execution
+                            or parallelism.AUTO
+        :return: generator of executor.DeploymentResult,
+                 in order of completion
+        """
+        results = executor.execute_many(
+            deployments,
+            workflow_id,
+            storage_path=self._storage_path,
+            storage_backend=self._storage_backend,
+            max_workers=max_workers,
+            limits=limits,
             allow_custom_parameters=allow_custom_parameters,
             task_retries=task_retries,
             task_retry_interval=task_retry_interval,
-            environment=environment)
+            retry_policy=retry_policy,
+            concurrency=concurrency)
+        for result in results:
+            self._env_cache.invalidate(
+                result.blueprint_id, storage_path=self._storage_path)
+            yield result
 
 
 class AriaCoreAPI(object):
 
-    def __init__(self, storage_path=None):
+    def __init__(self, storage_path=None, working_dir=None,
+                 storage_backend=None):
         """
         Aria CORE API class
         :param storage_path: Aria CORE storage folder
+        :param storage_backend: deployment storage backend,
+                                'file' (default) or 'sqlite'
+        :param working_dir: folder that holds the Aria settings folder,
+                            skips looking it up from the cwd for
+                            the calls of this API object only
         :return: None
         """
         self._storage_path = storage_path
-        self.blueprints = BlueprintsAPI(storage_path)
-        self.executions = ExecutionsAPI(storage_path)
+        self._env_cache = blueprints.EnvironmentCache()
+        self.blueprints = BlueprintsAPI(storage_path,
+                                        env_cache=self._env_cache,
+                                        storage_backend=storage_backend,
+                                        working_dir=working_dir)
+        self.executions = ExecutionsAPI(storage_path,
+                                        env_cache=self._env_cache,
+                                        storage_backend=storage_backend,
+                                        working_dir=working_dir)
+
+    @property
+    def env_cache(self):
+        return self._env_cache
+
+    def migrate_storage(self, remove_files=False):
+        """
+        Moves node instances of every blueprint from the
+        file storage backend into the SQLite backend
+        :param remove_files: remove the JSON instance files afterwards
+        :type remove_files: bool
+        :return: dict of Blueprint ID to number of migrated node instances
+        """
+        from aria_core import sqlite_storage
+        migrated = sqlite_storage.migrate(storage_path=self._storage_path,
+                                          remove_files=remove_files)
+        for blueprint_id in migrated:
+            self._env_cache.invalidate(blueprint_id,
+                                       storage_path=self._storage_path)
+        return migrated
+
+    @property
+    def last_report(self):
+        """
+        Timing report of the last initialize or workflow execution
+        made by the calling thread
+        :return: instrumentation.Report
+        """
+        return instrumentation.last_report()
 
     @property
     def storage_path(self):
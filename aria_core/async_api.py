@@ -0,0 +1,267 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Asynchronous front-end of the Aria CORE API.
+
+Every call runs the blocking API call in an executor and returns a
+future: an asyncio future to await when an event loop is given or runs
+the call, the concurrent.futures.Future of the call otherwise (always
+under Python 2, with the futures backport). Short queries and long
+running calls (initialize, workflow executions) use separate
+executors, so a few long executions never starve status queries.
+Cancelling a future whose call did not start yet drops the call; a
+call that already runs is left to finish in the background.
+
+Calls that stream their results (query_instances, follow and
+execute_many) return an OffloadedIterator instead, every item is
+pulled from the blocking iterator in an executor, with async for or
+with pull().
+"""
+
+import functools
+
+from concurrent import futures
+
+try:
+    import asyncio
+except ImportError:
+    # python 2, calls return concurrent.futures.Future objects
+    asyncio = None
+
+from aria_core import api
+from aria_core import instrumentation
+
+DEFAULT_QUERY_WORKERS = 32
+DEFAULT_EXECUTION_WORKERS = 4
+
+# the blocking iterator of an OffloadedIterator is exhausted
+DONE = object()
+
+
+def _event_loop(loop):
+    if loop is not None or asyncio is None:
+        return loop
+    # the loop running the calling coroutine, if any
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _offloaded(name, long_running=False):
+    executor_name = ('_execution_executor'
+                     if long_running else '_query_executor')
+
+    def offloaded(self, *args, **kwargs):
+        call = functools.partial(
+            self._core._reported, getattr(self._api, name), *args, **kwargs)
+        return self._submit(getattr(self._core, executor_name), call)
+
+    offloaded.__name__ = name
+    offloaded.__doc__ = 'Asynchronous counterpart of {0}'.format(name)
+    return offloaded
+
+
+class OffloadedIterator(object):
+    """
+    Asynchronous iterator over the results of a blocking call
+    returning an iterator, items are pulled in an executor
+    """
+
+    def __init__(self, async_api, executor, call):
+        self._async_api = async_api
+        self._executor = executor
+        self._call = call
+        self._iterator = None
+
+    def _next(self):
+        if self._iterator is None:
+            self._iterator = iter(self._call())
+        return next(self._iterator, DONE)
+
+    def pull(self):
+        """
+        Pulls the next item
+        :return: future of the item, of DONE once exhausted
+        """
+        return self._async_api._submit(self._executor, self._next)
+
+    def close(self):
+        """
+        Closes the blocking iterator, e.g. to stop
+        the workers of execute_many early
+        :return: future
+        """
+        close = getattr(self._iterator, 'close', None)
+        return self._async_api._submit(
+            self._executor, close or (lambda: None))
+
+    aclose = close
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        loop = _event_loop(self._async_api._loop)
+        item = loop.create_future()
+
+        def pulled(future):
+            if item.cancelled():
+                return
+            if future.cancelled():
+                item.cancel()
+            elif future.exception() is not None:
+                item.set_exception(future.exception())
+            elif future.result() is DONE:
+                item.set_exception(StopAsyncIteration())
+            else:
+                item.set_result(future.result())
+
+        asyncio.wrap_future(self._executor.submit(self._next),
+                            loop=loop).add_done_callback(pulled)
+        return item
+
+
+def _streamed(name, long_running=False):
+    executor_name = ('_execution_executor'
+                     if long_running else '_query_executor')
+
+    def streamed(self, *args, **kwargs):
+        return OffloadedIterator(
+            self, getattr(self._core, executor_name),
+            functools.partial(getattr(self._api, name), *args, **kwargs))
+
+    streamed.__name__ = name
+    streamed.__doc__ = 'Asynchronous iterator counterpart of {0}'.format(
+        name)
+    return streamed
+
+
+class _AsyncAPI(object):
+
+    def __init__(self, core, sync_api, loop=None):
+        self._core = core
+        self._api = sync_api
+        self._loop = loop
+
+    def _submit(self, executor, call):
+        future = executor.submit(call)
+        loop = _event_loop(self._loop)
+        if loop is None:
+            return future
+        return asyncio.wrap_future(future, loop=loop)
+
+class AsyncBlueprintsAPI(_AsyncAPI):
+    validate = _offloaded('validate')
+    initialize = _offloaded('initialize', long_running=True)
+    teardown = _offloaded('teardown')
+    load_blueprint_storage = _offloaded('load_blueprint_storage')
+    outputs = _offloaded('outputs')
+    instances = _offloaded('instances')
+    query_instances = _streamed('query_instances')
+    create_requirements = _offloaded('create_requirements')
+
+
+class AsyncExecutionsAPI(_AsyncAPI):
+    install = _offloaded('install', long_running=True)
+    uninstall = _offloaded('uninstall', long_running=True)
+    execute_custom = _offloaded('execute_custom', long_running=True)
+    update = _offloaded('update', long_running=True)
+    resume = _offloaded('resume', long_running=True)
+    executions = _offloaded('executions')
+    status = _offloaded('status')
+    events = _offloaded('events')
+    analytics = _offloaded('analytics')
+    # waiting for the next event does not hold an execution worker
+    follow = _streamed('follow')
+    execute_many = _streamed('execute_many', long_running=True)
+
+
+class AsyncAriaCoreAPI(object):
+
+    def __init__(self, storage_path=None, loop=None,
+                 query_executor=None, execution_executor=None,
+                 storage_backend=None, working_dir=None):
+        """
+        Asynchronous Aria CORE API class
+        :param storage_path: Aria CORE storage folder
+        :param loop: event loop of the returned futures, defaults
+                     to the loop running a call, if any
+        :param query_executor: executor of short calls (outputs, ...)
+        :param execution_executor: executor of initialize
+                                   and workflow executions
+        :param storage_backend: deployment storage backend
+        :param working_dir: folder that holds the Aria settings folder
+        :return: None
+        """
+        self._sync = api.AriaCoreAPI(storage_path=storage_path,
+                                     storage_backend=storage_backend,
+                                     working_dir=working_dir)
+        self._own_executors = []
+        self._last_report = None
+        self._query_executor = query_executor or self._executor(
+            DEFAULT_QUERY_WORKERS)
+        self._execution_executor = execution_executor or self._executor(
+            DEFAULT_EXECUTION_WORKERS)
+        self.blueprints = AsyncBlueprintsAPI(
+            self, self._sync.blueprints, loop=loop)
+        self.executions = AsyncExecutionsAPI(
+            self, self._sync.executions, loop=loop)
+
+    def _executor(self, max_workers):
+        executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._own_executors.append(executor)
+        return executor
+
+    def _reported(self, func, *args, **kwargs):
+        # reports are kept per thread, the one of an
+        # executor thread is taken over once the call ends
+        previous = instrumentation.last_report()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            report = instrumentation.last_report()
+            if report is not previous:
+                self._last_report = report
+
+    @property
+    def last_report(self):
+        """
+        Timing report of the last initialize or workflow
+        execution made through this API that ended
+        :return: instrumentation.Report
+        """
+        return self._last_report
+
+    @property
+    def storage_path(self):
+        return self._sync.storage_path
+
+    def close(self, wait=True):
+        """
+        Shuts down the executors created by this API
+        :param wait: wait for running calls to finish
+        :type wait: bool
+        :return: None
+        """
+        for executor in self._own_executors:
+            executor.shutdown(wait=wait)
+
+
+__all__ = [
+    'AsyncAriaCoreAPI',
+    'OffloadedIterator',
+    'DONE',
+]
@@ -12,43 +12,51 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import os
 import json
+import threading
 
+from aria_core import constants
 from aria_core import exceptions
 from aria_core import logger
+from aria_core import storage
 from aria_core import utils
 from aria_core.dependencies import futures
 
 
 from aria_core.processor import virtualenv_processor
 from aria_core.processor import blueprint_processor
+from aria_core.processor import plan_cache
 
 LOG = logger.logging.getLogger(__name__)
 
 initialize_blueprint = virtualenv_processor.initialize_blueprint
 create_requirements = blueprint_processor.create_requirements
 install_blueprint_plugins = virtualenv_processor.install_blueprint_plugins
+plugin_options = virtualenv_processor.plugin_options
 
 
-def validate(blueprint_path):
+def validate(blueprint_path, storage_path=None):
     try:
-        return futures.aria_dsl_parser.parse_from_path(
+        return plan_cache.parse_from_path(
             str(blueprint_path)
             if not isinstance(blueprint_path, file)
-            else blueprint_path.name)
+            else blueprint_path.name,
+            resolver=utils.get_import_resolver(),
+            storage_path=storage_path)
     except futures.aria_dsl_exceptions.DSLParsingException as e:
         LOG.error(str(e))
         raise Exception("Failed to validate blueprint. %s", str(e))
 
 
-def init_blueprint_storage(blueprint_id, storage_path=None):
+def init_blueprint_storage(blueprint_id, storage_path=None,
+                           storage_backend=None):
     _env_path = utils.storage_dir(blueprint_id,
                                   storage_path=storage_path)
     if not os.path.exists(_env_path):
         os.makedirs(_env_path)
-    return futures.aria_local.FileStorage(
-        storage_dir=_env_path)
+    return storage.create_storage(_env_path, backend=storage_backend)
 
 
 def with_blueprint_storage(action):
@@ -57,7 +65,9 @@ def with_blueprint_storage(action):
         b_id = args[0]
         storage_path = kwargs.get('storage_path')
         env = load_blueprint_storage_env(
-            b_id, storage_path=storage_path)
+            b_id, storage_path=storage_path,
+            storage_backend=kwargs.get('storage_backend'),
+            env_cache=kwargs.get('env_cache'))
         yield action(env, **kwargs)
 
     return with_blueprint_storage_wrapper
@@ -71,11 +81,75 @@ def coroutine(generator_func):
     return coroutine_wrapper
 
 
-def load_blueprint_storage_env(blueprint_id, storage_path=None):
+def load_blueprint_storage_env(blueprint_id, storage_path=None,
+                               storage_backend=None, env_cache=None):
+    if env_cache is not None:
+        return env_cache.get(blueprint_id, storage_path=storage_path,
+                             storage_backend=storage_backend)
     return futures.aria_local.load_env(
         name=blueprint_id,
         storage=init_blueprint_storage(blueprint_id,
-                                       storage_path=storage_path))
+                                       storage_path=storage_path,
+                                       storage_backend=storage_backend))
+
+
+class EnvironmentCache(object):
+
+    def __init__(self,
+                 max_entries=constants.ENVIRONMENT_CACHE_MAX_ENTRIES):
+        """
+        LRU cache of loaded blueprint storage environments
+        :param max_entries: maximum number of cached environments
+        :type max_entries: int
+        :return: None
+        """
+        self._max_entries = max_entries
+        self._environments = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, blueprint_id, storage_path=None, storage_backend=None):
+        key = storage_path, blueprint_id
+        with self._lock:
+            env = self._environments.pop(key, None)
+            if env is not None:
+                self._environments[key] = env
+                self.hits += 1
+                return env
+            self.misses += 1
+        env = load_blueprint_storage_env(blueprint_id,
+                                         storage_path=storage_path,
+                                         storage_backend=storage_backend)
+        with self._lock:
+            self._environments[key] = env
+            while len(self._environments) > self._max_entries:
+                self._environments.popitem(last=False)
+        return env
+
+    def invalidate(self, blueprint_id=None, storage_path=None):
+        """
+        Drops cached environments
+        :param blueprint_id: Blueprint ID, drops all if None
+        :type blueprint_id: str
+        :param storage_path: Aria CORE storage folder
+        :type storage_path: str
+        :return: None
+        """
+        with self._lock:
+            if blueprint_id is None:
+                self._environments.clear()
+            else:
+                self._environments.pop((storage_path, blueprint_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._environments),
+                'max_entries': self._max_entries,
+            }
 
 
 @coroutine
@@ -96,3 +170,15 @@ def instances(env, **kwargs):
         raise exceptions.AriaError('No node with id: {0}'
                                    .format(node_id))
     return node_instances
+
+
+@coroutine
+@with_blueprint_storage
+def query_instances(env, **kwargs):
+    return storage.query_node_instances(
+        env.storage,
+        node_ids=kwargs.get('node_ids'),
+        states=kwargs.get('states'),
+        host_ids=kwargs.get('host_ids'),
+        after=kwargs.get('after'),
+        limit=kwargs.get('limit'))
@@ -0,0 +1,328 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Execution checkpoints.
+
+While an execution runs, every succeeded task (an operation of a node
+instance, or of one side of a relationship instance) is appended to a
+journal in <storage>/<blueprint_id>/checkpoints/, next to a header
+holding the workflow, its parameters and the execution status.
+Resuming an execution runs its workflow again with the operations of
+the journaled tasks replaced by no-op tasks, so it continues from the
+point of failure. An execution whose process is still alive is never
+resumed.
+"""
+
+import contextlib
+import errno
+import json
+import os
+import threading
+import time
+
+from aria_core import event_log
+from aria_core import exceptions
+from aria_core import logger
+from aria_core import utils
+from aria_core.dependencies import futures
+
+LOG = logger.logging.getLogger(__name__)
+
+HEADER_SUFFIX = '.json'
+JOURNAL_SUFFIX = '.tasks'
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+TASK_SUCCEEDED = 'task_succeeded'
+
+
+def task_key(node_instance_id, operation, source_id=None, target_id=None):
+    return node_instance_id, operation, source_id, target_id
+
+
+def _task_id(task):
+    cloudify_context = getattr(task, 'cloudify_context', None) or {}
+    return cloudify_context.get('task_id') or getattr(task, 'id', None)
+
+
+class Checkpoint(object):
+
+    def __init__(self, blueprint_id, execution_id, storage_path=None):
+        """
+        Checkpoint of an execution
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param execution_id: Execution ID
+        :type execution_id: str
+        :param storage_path: Aria CORE storage folder
+        :type storage_path: str
+        :return: None
+        """
+        directory = utils.checkpoints_dir(blueprint_id,
+                                          storage_path=storage_path)
+        self.blueprint_id = blueprint_id
+        self.execution_id = execution_id
+        self._directory = directory
+        self._header_path = os.path.join(
+            directory, execution_id + HEADER_SUFFIX)
+        self._journal_path = os.path.join(
+            directory, execution_id + JOURNAL_SUFFIX)
+        self._journal = None
+        self._task_keys = {}
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self):
+        return os.path.exists(self._header_path)
+
+    def header(self):
+        """
+        Workflow, parameters and status of the execution
+        :return: dict
+        """
+        try:
+            with open(self._header_path) as f:
+                return json.load(f)
+        except IOError:
+            raise exceptions.AriaValidationError(
+                'No checkpoint of execution {0} of {1}'.format(
+                    self.execution_id, self.blueprint_id))
+
+    def _write_header(self, header):
+        tmp_path = self._header_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.rename(tmp_path, self._header_path)
+
+    def completed_tasks(self):
+        """
+        Tasks that succeeded in any run of the execution
+        :return: set of task keys
+        """
+        completed = set()
+        try:
+            with open(self._journal_path) as f:
+                for line in f:
+                    # a torn last line is a task that never got journaled
+                    if line.endswith('\n'):
+                        completed.add(tuple(json.loads(line)))
+        except IOError:
+            pass
+        return completed
+
+    def start(self, workflow_id, parameters, execute_kwargs,
+              retry_policy=None, concurrency=None):
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        if self.exists:
+            header = self.header()
+        else:
+            header = {
+                'workflow_id': workflow_id,
+                'parameters': parameters,
+                'execute_kwargs': execute_kwargs,
+                'retry_policy': (retry_policy.to_dict()
+                                 if retry_policy is not None else None),
+                'concurrency': concurrency,
+                'started_at': time.time(),
+                'runs': 0,
+            }
+        header.update(status=STATUS_RUNNING, error=None,
+                      runs=header['runs'] + 1, pid=os.getpid())
+        self._write_header(header)
+        self._journal = open(self._journal_path, 'a')
+
+    def register(self, task, key):
+        self._task_keys[_task_id(task)] = key
+
+    def observe(self, event):
+        if event.get('event_type') != TASK_SUCCEEDED:
+            return
+        context = event.get('context') or {}
+        key = self._task_keys.pop(context.get('task_id'), None)
+        if key is None and context.get('node_id'):
+            key = task_key(context['node_id'], context.get('operation'))
+        if key is None:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.write(json.dumps(list(key)) + '\n')
+                self._journal.flush()
+
+    def running(self):
+        """
+        Whether a live process runs the execution, an execution
+        whose process died keeps the running status
+        :return: bool
+        """
+        header = self.header()
+        if header['status'] != STATUS_RUNNING:
+            return False
+        pid = header.get('pid')
+        if pid is None:
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    def finish(self, status, error=None):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+        header = self.header()
+        header.update(status=status, error=error, ended_at=time.time())
+        self._write_header(header)
+
+
+# execution ID -> Checkpoint of the running execution
+_tracked = {}
+# execution ID -> task keys to skip
+_skipped = {}
+_lock = threading.Lock()
+_hooks_installed = False
+
+
+def _execution_id(ctx):
+    return event_log.running_execution(
+        getattr(getattr(ctx, 'deployment', None), 'id', None))
+
+
+def _checkpointing(execute, key_of):
+    def checkpointing_execute(self, operation, *args, **kwargs):
+        ctx, key = key_of(self, operation)
+        execution_id = _execution_id(ctx)
+        if key in _skipped.get(execution_id, ()):
+            LOG.debug('Skipping completed task {0}'.format(key))
+            return futures.aria_workflow_tasks.NOPLocalWorkflowTask(ctx)
+        task = execute(self, operation, *args, **kwargs)
+        checkpoint = _tracked.get(execution_id)
+        if checkpoint is not None:
+            checkpoint.register(task, key)
+        return task
+    checkpointing_execute.aria_checkpointing = True
+    return checkpointing_execute
+
+
+def _node_key(node_instance, operation):
+    return node_instance.ctx, task_key(node_instance.id, operation)
+
+
+def _source_key(relationship, operation):
+    source = relationship.node_instance
+    return source.ctx, task_key(source.id, operation,
+                                source.id, relationship.target_id)
+
+
+def _target_key(relationship, operation):
+    source = relationship.node_instance
+    return source.ctx, task_key(relationship.target_id, operation,
+                                source.id, relationship.target_id)
+
+
+_HOOKS = (
+    ('CloudifyWorkflowNodeInstance', 'execute_operation', _node_key),
+    ('CloudifyWorkflowRelationshipInstance',
+     'execute_source_operation', _source_key),
+    ('CloudifyWorkflowRelationshipInstance',
+     'execute_target_operation', _target_key),
+)
+
+
+def _install_hooks():
+    # the operations of node and relationship instances are wrapped,
+    # so that every task gets its key and completed ones are skipped
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    workflow_context = futures.aria_workflow_context
+    for class_name, method_name, key_of in _HOOKS:
+        cls = getattr(workflow_context, class_name)
+        execute = getattr(cls, method_name)
+        if not getattr(execute, 'aria_checkpointing', False):
+            setattr(cls, method_name, _checkpointing(execute, key_of))
+    _hooks_installed = True
+
+
+@contextlib.contextmanager
+def _registered(registry, execution_id, value):
+    with _lock:
+        _install_hooks()
+        registry[execution_id] = value
+    try:
+        yield value
+    finally:
+        with _lock:
+            if registry.get(execution_id) is value:
+                del registry[execution_id]
+
+
+@contextlib.contextmanager
+def track(blueprint_id, execution_id, workflow_id, parameters,
+          execute_kwargs, storage_path=None, retry_policy=None,
+          concurrency=None):
+    """
+    Journals the succeeded tasks of a running execution
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param workflow_id: Workflow ID
+    :type workflow_id: str
+    :param parameters: workflow parameters
+    :type parameters: dict
+    :param execute_kwargs: allow_custom_parameters, task_retries
+                           and task_retry_interval
+    :type execute_kwargs: dict
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :param retry_policy: retry policy of the execution
+    :type retry_policy: retry.RetryPolicy
+    :param concurrency: thread pool size or parallelism.AUTO
+    :return: Checkpoint
+    """
+    checkpoint = Checkpoint(blueprint_id, execution_id,
+                            storage_path=storage_path)
+    checkpoint.start(workflow_id, parameters, execute_kwargs,
+                     retry_policy=retry_policy, concurrency=concurrency)
+    try:
+        with _registered(_tracked, execution_id, checkpoint), \
+                event_log.observe(execution_id, checkpoint.observe):
+            yield checkpoint
+    except BaseException as e:
+        checkpoint.finish(STATUS_FAILED, error=str(e))
+        raise
+    checkpoint.finish(STATUS_COMPLETED)
+
+
+@contextlib.contextmanager
+def skipping(execution_id, completed_tasks):
+    """
+    Replaces the operations of completed tasks
+    of a running execution with no-op tasks
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param completed_tasks: task keys, None skips nothing
+    :type completed_tasks: set
+    """
+    if not completed_tasks:
+        yield
+        return
+    with _registered(_skipped, execution_id, frozenset(completed_tasks)):
+        yield
@@ -21,6 +21,26 @@ DEFAULTS_CONFIG_FILE_NAME = 'aria-config.defaults.yaml'
 
 WORKFLOW_TASK_RETRIES = -1
 WORKFLOW_TASK_RETRY_INTERVAL = 30
+WORKFLOW_TASK_RETRY_INITIAL_DELAY = 1
+WORKFLOW_TASK_RETRY_BACKOFF = 2
+WORKFLOW_TASK_RETRY_MAX_DELAY = 300
+WORKFLOW_TASK_THREAD_POOL_MAX_SIZE = 64
+
+PLAN_CACHE_DIRECTORY_NAME = 'plan-cache'
+PLAN_CACHE_MAX_ENTRIES = 32
+
+PLUGIN_ENVS_DIR_NAME = 'plugin-envs'
+PLUGIN_ENVS_MAX_UNUSED = 8
+
+WHEELHOUSE_DIR_NAME = 'wheelhouse'
+PLUGIN_OPTIONS_FILE_NAME = 'plugin-options.json'
+
+ENVIRONMENT_CACHE_MAX_ENTRIES = 128
+
+EVENTS_DIR_NAME = 'events'
+CHECKPOINTS_DIR_NAME = 'checkpoints'
+EVENT_LOG_SEGMENT_BYTES = 8 * 1024 * 1024
+EVENT_LOG_INDEX_INTERVAL_BYTES = 4096
 
 IGNORED_LOCAL_WORKFLOW_MODULES = futures.IGNORED_LOCAL_WORKFLOW_MODULES
 
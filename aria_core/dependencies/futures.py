@@ -13,21 +13,39 @@
 #    under the License.
 
 
-# flake8: noqa
+"""
+Aliases of the Aria plugins common and DSL parser modules.
 
-from cloudify import exceptions as aria_aside_exceptions
-from cloudify import ctx as aria_ctx
-from cloudify import utils as aria_side_utils
+The aliases are imported on first attribute access, so importing
+aria_core does not pay for loading the workflow engine and the parser
+until they are actually used.
+"""
 
-from cloudify.decorators import operation as aria_operation
-from cloudify.decorators import workflow as aria_workflow
-from cloudify.workflows import ctx as aria_workflow_ctx
-from cloudify.workflows import local as aria_local
+import importlib
+import sys
+import types
 
-from dsl_parser import constants as aria_dsl_constants
-from dsl_parser import exceptions as aria_dsl_exceptions
-from dsl_parser import parser as aria_dsl_parser
-from dsl_parser import utils as aria_dsl_utils
+# alias: (module, attribute of the module or None for the module itself)
+_LAZY_ALIASES = {
+    'aria_aside_exceptions': ('cloudify.exceptions', None),
+    'aria_ctx': ('cloudify', 'ctx'),
+    'aria_side_utils': ('cloudify.utils', None),
+
+    'aria_operation': ('cloudify.decorators', 'operation'),
+    'aria_workflow': ('cloudify.decorators', 'workflow'),
+    'aria_workflow_ctx': ('cloudify.workflows', 'ctx'),
+    'aria_local': ('cloudify.workflows.local', None),
+    'aria_logs': ('cloudify.logs', None),
+    'aria_lifecycle': ('cloudify.plugins.lifecycle', None),
+    'aria_workflow_context': ('cloudify.workflows.workflow_context', None),
+    'aria_workflow_tasks': ('cloudify.workflows.tasks', None),
+
+    'aria_dsl_constants': ('dsl_parser.constants', None),
+    'aria_dsl_exceptions': ('dsl_parser.exceptions', None),
+    'aria_dsl_parser': ('dsl_parser.parser', None),
+    'aria_dsl_tasks': ('dsl_parser.tasks', None),
+    'aria_dsl_utils': ('dsl_parser.utils', None),
+}
 
 IGNORED_LOCAL_WORKFLOW_MODULES = (
     'cloudify_agent.operations',
@@ -37,3 +55,31 @@ IGNORED_LOCAL_WORKFLOW_MODULES = (
     'windows_agent_installer.tasks',
     'windows_plugin_installer.tasks',
 )
+
+
+class _LazyAliasesModule(types.ModuleType):
+
+    def __init__(self, module):
+        super(_LazyAliasesModule, self).__init__(module.__name__)
+        self.__dict__.update(module.__dict__)
+        # python 2 clears the globals of a module once it is collected
+        self._module = module
+
+    def __getattr__(self, name):
+        try:
+            module_name, attribute = _LAZY_ALIASES[name]
+        except KeyError:
+            raise AttributeError(
+                "'{0}' module has no attribute '{1}'"
+                .format(self.__name__, name))
+        value = importlib.import_module(module_name)
+        if attribute is not None:
+            value = getattr(value, attribute)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_ALIASES))
+
+
+sys.modules[__name__] = _LazyAliasesModule(sys.modules[__name__])
@@ -0,0 +1,534 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Persistent per-execution event log.
+
+Every execution appends its events to
+<storage>/<blueprint_id>/events/<execution_id>/ as JSON lines, split in
+segments named after the offset of their first event. Next to every
+segment a sparse index maps an event offset to its byte position every
+few kilobytes, so reading from an offset seeks close to it instead of
+scanning the log. The time the execution started is kept in a file of
+its own, which orders the executions of a blueprint. Once the execution
+ends, a marker file records its status, which is what lets followers in
+other processes stop.
+"""
+
+import bisect
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+from aria_core import constants
+from aria_core import exceptions
+from aria_core import utils
+from aria_core.dependencies import futures
+
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.index'
+COMPLETE_FILE_NAME = 'complete'
+STARTED_FILE_NAME = 'started'
+
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+EventRecord = collections.namedtuple('EventRecord', ['offset', 'event'])
+
+
+def execution_dir(blueprint_id, execution_id, storage_path=None):
+    return os.path.join(utils.events_dir(blueprint_id,
+                                         storage_path=storage_path),
+                        execution_id)
+
+
+def _segment_name(base_offset, suffix):
+    return '{0:020d}{1}'.format(base_offset, suffix)
+
+
+def _segments(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in names
+                  if name.endswith(SEGMENT_SUFFIX))
+
+
+def _started(directory):
+    try:
+        with open(os.path.join(directory, STARTED_FILE_NAME)) as f:
+            return float(f.read())
+    except (IOError, ValueError):
+        # logs written before start times were recorded
+        return 0.0
+
+
+def _read_index(directory, base_offset):
+    offsets, positions = [base_offset], [0]
+    try:
+        with open(os.path.join(directory, _segment_name(
+                base_offset, INDEX_SUFFIX))) as f:
+            for line in f:
+                if line.endswith('\n'):
+                    offset, position = line.split()
+                    offsets.append(int(offset))
+                    positions.append(int(position))
+    except IOError:
+        pass
+    return offsets, positions
+
+
+def _seek_point(directory, base_offset, offset):
+    # closest indexed position at or before the offset
+    offsets, positions = _read_index(directory, base_offset)
+    i = bisect.bisect_right(offsets, offset) - 1
+    return offsets[i], positions[i]
+
+
+def _segment_end(directory, base_offset):
+    # offset and position after the last complete event of a segment
+    offset, position = _seek_point(directory, base_offset, float('inf'))
+    with open(os.path.join(directory, _segment_name(
+            base_offset, SEGMENT_SUFFIX)), 'rb') as f:
+        f.seek(position)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            position += len(line)
+            offset += 1
+    return offset, position
+
+
+class EventLogWriter(object):
+
+    def __init__(self,
+                 directory,
+                 segment_bytes=constants.EVENT_LOG_SEGMENT_BYTES,
+                 index_interval_bytes=(
+                     constants.EVENT_LOG_INDEX_INTERVAL_BYTES)):
+        """
+        Appends events to a segmented event log
+        :param directory: event log folder
+        :type directory: str
+        :param segment_bytes: size a segment is rolled over at
+        :type segment_bytes: int
+        :param index_interval_bytes: bytes between two index entries
+        :type index_interval_bytes: int
+        :return: None
+        """
+        self._directory = directory
+        self._segment_bytes = segment_bytes
+        self._index_interval_bytes = index_interval_bytes
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # a resumed execution keeps the time it first started
+        started_path = os.path.join(directory, STARTED_FILE_NAME)
+        if not os.path.exists(started_path):
+            with open(started_path, 'w') as f:
+                f.write(repr(time.time()))
+        complete_path = os.path.join(directory, COMPLETE_FILE_NAME)
+        if os.path.exists(complete_path):
+            os.remove(complete_path)
+        bases = _segments(directory)
+        if bases:
+            self._recover(bases[-1])
+        else:
+            self._open_segment(0)
+
+    @property
+    def next_offset(self):
+        return self._next_offset
+
+    def _open_segment(self, base_offset):
+        self._close_segment()
+        self._segment = open(os.path.join(
+            self._directory, _segment_name(base_offset, SEGMENT_SUFFIX)),
+            'ab')
+        self._index = open(os.path.join(
+            self._directory, _segment_name(base_offset, INDEX_SUFFIX)), 'a')
+        self._next_offset = base_offset
+        self._size = os.path.getsize(self._segment.name)
+        self._indexed_at = 0
+
+    def _recover(self, base_offset):
+        # continue after the last complete event of the last segment
+        offset, position = _segment_end(self._directory, base_offset)
+        path = os.path.join(self._directory,
+                            _segment_name(base_offset, SEGMENT_SUFFIX))
+        with open(path, 'rb+') as f:
+            f.truncate(position)
+        self._open_segment(base_offset)
+        self._next_offset = offset
+        self._indexed_at = self._size
+
+    def append(self, event):
+        """
+        Appends an event
+        :param event: event or log record
+        :type event: dict
+        :return: offset of the event
+        """
+        line = (json.dumps(event, separators=(',', ':'), default=repr) +
+                '\n').encode('utf-8')
+        with self._lock:
+            if self._size and self._size + len(line) > self._segment_bytes:
+                self._open_segment(self._next_offset)
+            if (self._size and
+                    self._size - self._indexed_at >=
+                    self._index_interval_bytes):
+                self._index.write('{0} {1}\n'.format(self._next_offset,
+                                                     self._size))
+                self._index.flush()
+                self._indexed_at = self._size
+            self._segment.write(line)
+            self._segment.flush()
+            self._size += len(line)
+            offset = self._next_offset
+            self._next_offset += 1
+        return offset
+
+    def _close_segment(self):
+        for f in (self._segment, self._index):
+            if f is not None:
+                f.close()
+        self._segment = self._index = None
+
+    def close(self, status=STATUS_COMPLETED, error=None):
+        """
+        Marks the execution as ended
+        :param status: execution status
+        :type status: str
+        :param error: error of a failed execution
+        :type error: str
+        :return: None
+        """
+        with self._lock:
+            self._close_segment()
+            with open(os.path.join(self._directory,
+                                   COMPLETE_FILE_NAME), 'w') as f:
+                json.dump({'status': status,
+                           'error': error,
+                           'events': self._next_offset}, f)
+
+
+class _Cursor(object):
+    """
+    Reads an event log onwards from an offset, keeping its
+    file position so that polling again reads only new events
+    """
+
+    def __init__(self, directory, since=0):
+        self._directory = directory
+        self._since = since
+        self._file = None
+        self._base = None
+        self._offset = None
+
+    def _open(self, base_offset, offset, position):
+        self.close()
+        self._file = open(os.path.join(
+            self._directory, _segment_name(base_offset, SEGMENT_SUFFIX)),
+            'rb')
+        self._file.seek(position)
+        self._base = base_offset
+        self._offset = offset
+
+    def _next_segment(self):
+        later = [base for base in _segments(self._directory)
+                 if base > self._base]
+        return later[0] if later else None
+
+    def _start(self):
+        bases = _segments(self._directory)
+        if not bases:
+            return False
+        i = max(bisect.bisect_right(bases, self._since) - 1, 0)
+        offset, position = _seek_point(self._directory, bases[i],
+                                       self._since)
+        self._open(bases[i], offset, position)
+        return True
+
+    def read(self, limit=None):
+        records = []
+        if self._file is None and not self._start():
+            return records
+        while limit is None or len(records) < limit:
+            position = self._file.tell()
+            line = self._file.readline()
+            if not line.endswith(b'\n'):
+                # the writer is in the middle of this event
+                self._file.seek(position)
+                next_base = self._next_segment()
+                if next_base is not None:
+                    # a segment is complete once the next one exists
+                    self._open(next_base, next_base, 0)
+                    continue
+                break
+            if self._offset >= self._since:
+                records.append(EventRecord(
+                    self._offset, json.loads(line.decode('utf-8'))))
+            self._offset += 1
+        return records
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def status(directory):
+    """
+    Status of an execution, None while it runs
+    :param directory: event log folder
+    :type directory: str
+    :return: dict with status, error and number of events
+    """
+    try:
+        with open(os.path.join(directory, COMPLETE_FILE_NAME)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def end_offset(directory):
+    """
+    Offset the next event of a log gets, i.e. its number of events
+    :param directory: event log folder
+    :type directory: str
+    :return: int
+    """
+    bases = _segments(directory)
+    if not bases:
+        return 0
+    return _segment_end(directory, bases[-1])[0]
+
+
+def read(directory, since=0, limit=None):
+    """
+    Reads logged events
+    :param directory: event log folder
+    :type directory: str
+    :param since: offset of the first event to read
+    :type since: int
+    :param limit: maximum number of events
+    :type limit: int
+    :return: list of EventRecord
+    """
+    cursor = _Cursor(directory, since=since)
+    try:
+        return cursor.read(limit=limit)
+    finally:
+        cursor.close()
+
+
+def iterate(directory, since=0, chunk_size=1000):
+    """
+    Iterates over logged events, reading them chunk by chunk
+    :param directory: event log folder
+    :type directory: str
+    :param since: offset of the first event to read
+    :type since: int
+    :param chunk_size: events read at once
+    :type chunk_size: int
+    :return: generator of EventRecord
+    """
+    cursor = _Cursor(directory, since=since)
+    try:
+        while True:
+            records = cursor.read(limit=chunk_size)
+            for record in records:
+                yield record
+            if len(records) < chunk_size:
+                return
+    finally:
+        cursor.close()
+
+
+def follow(directory, since=0, poll_interval=DEFAULT_POLL_INTERVAL,
+           timeout=None):
+    """
+    Follows an event log until its execution ends
+    :param directory: event log folder
+    :type directory: str
+    :param since: offset of the first event to read
+    :type since: int
+    :param poll_interval: seconds between polls once caught up
+    :type poll_interval: float
+    :param timeout: seconds to follow at most
+    :type timeout: float
+    :return: generator of EventRecord
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    cursor = _Cursor(directory, since=since)
+    try:
+        while True:
+            # the marker is checked before reading, so
+            # events written before it are never missed
+            ended = status(directory) is not None
+            records = cursor.read()
+            for record in records:
+                yield record
+            if records:
+                continue
+            if ended or (deadline is not None and time.time() >= deadline):
+                return
+            time.sleep(poll_interval)
+    finally:
+        cursor.close()
+
+
+def executions(blueprint_id, storage_path=None):
+    """
+    Executions of a blueprint that have an event log, oldest first
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: list of Execution IDs
+    """
+    root = utils.events_dir(blueprint_id, storage_path=storage_path)
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    return sorted(names,
+                  key=lambda name: (_started(os.path.join(root, name)), name))
+
+
+# local workflows tag events with the deployment (Blueprint) ID only,
+# so executions of a blueprint run one at a time in a process
+# Blueprint ID -> Execution ID of its running execution
+_running = {}
+# Execution ID -> EventLogWriter
+_writers = {}
+# Execution ID -> observers
+_observers = {}
+_writers_lock = threading.Lock()
+_hooks_installed = False
+
+
+def _recording(out_func):
+    def recording_out_func(item):
+        out_func(item)
+        try:
+            deployment_id = item['context']['deployment_id']
+        except (KeyError, TypeError):
+            return
+        execution_id = _running.get(deployment_id)
+        if execution_id is None:
+            return
+        writer = _writers.get(execution_id)
+        if writer is not None:
+            writer.append(item)
+        for observer in _observers.get(execution_id, ()):
+            observer(item)
+    recording_out_func.aria_recording = True
+    return recording_out_func
+
+
+def running_execution(blueprint_id):
+    """
+    Execution of a blueprint running in this process
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :return: Execution ID or None
+    """
+    return _running.get(blueprint_id)
+
+
+def _install_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    # local workflows send events and logs of workflows and
+    # operations through these functions, looked up on every use
+    logs = futures.aria_logs
+    for name in ('stdout_event_out', 'stdout_log_out'):
+        out_func = getattr(logs, name, None)
+        if out_func is not None and not getattr(
+                out_func, 'aria_recording', False):
+            setattr(logs, name, _recording(out_func))
+    _hooks_installed = True
+
+
+@contextlib.contextmanager
+def record(blueprint_id, execution_id, storage_path=None):
+    """
+    Appends the events of a running execution to its event log
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: EventLogWriter
+    """
+    with _writers_lock:
+        running = _running.get(blueprint_id)
+        if running is not None:
+            raise exceptions.AriaValidationError(
+                'Execution {0} of {1} is still running, executions of a '
+                'blueprint run one at a time'.format(running, blueprint_id))
+        _install_hooks()
+        _running[blueprint_id] = execution_id
+    try:
+        writer = EventLogWriter(execution_dir(blueprint_id, execution_id,
+                                              storage_path=storage_path))
+        with _writers_lock:
+            _writers[execution_id] = writer
+        try:
+            yield writer
+        except BaseException as e:
+            writer.close(status=STATUS_FAILED, error=str(e))
+            raise
+        else:
+            writer.close()
+    finally:
+        with _writers_lock:
+            _writers.pop(execution_id, None)
+            del _running[blueprint_id]
+
+
+@contextlib.contextmanager
+def observe(execution_id, observer):
+    """
+    Hands every event and log record of a running execution to an observer
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param observer: callable that takes an event
+    """
+    with _writers_lock:
+        _install_hooks()
+        # copied on write, the hook iterates without the lock
+        _observers[execution_id] = (
+            _observers.get(execution_id, ()) + (observer,))
+    try:
+        yield
+    finally:
+        with _writers_lock:
+            remaining = tuple(o for o in _observers.get(execution_id, ())
+                              if o is not observer)
+            if remaining:
+                _observers[execution_id] = remaining
+            else:
+                _observers.pop(execution_id, None)
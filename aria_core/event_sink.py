@@ -0,0 +1,329 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Queue-backed workflow events sink.
+
+Workflows only append events to a bounded queue. A background thread
+formats queued events and writes them in batches, so formatting and
+disk writes stay out of the workflow's execution path. Once the queue
+is full, the overflow policy decides between blocking the workflow
+and dropping events.
+"""
+
+import atexit
+import collections
+import json
+import threading
+import time
+
+from aria_core import exceptions
+from aria_core import logger
+
+LOG = logger.logging.getLogger(__name__)
+
+BLOCK = 'block'
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+SAMPLE = 'sample'
+
+OVERFLOW_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, SAMPLE)
+
+DEFAULT_MAX_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_SAMPLE_RATE = 10
+DEFAULT_SAMPLE_THRESHOLD = 0.8
+
+DROPPED_EVENT_TYPE = 'aria_events_dropped'
+
+
+def format_pretty(event):
+    return [json.dumps(event, indent=4), str(logger.Event(event))]
+
+
+def format_json_lines(event):
+    return [json.dumps(event, separators=(',', ':'))]
+
+
+class LoggerWriter(object):
+    """
+    Writes every line as a record of the Aria events logger
+    """
+
+    def __init__(self, log=None):
+        self._log = log
+
+    def __call__(self, lines):
+        log = self._log or logger.get_logger(logger.EVENTS_LOGGER_NAME)
+        for line in lines:
+            log.info(line)
+
+
+class FileWriter(object):
+    """
+    Appends every batch to a file with a single write
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+
+    def __call__(self, lines):
+        if self._file is None:
+            self._file = open(self._path, 'a')
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EventSink(object):
+
+    def __init__(self,
+                 writer=None,
+                 json_lines=False,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 overflow=BLOCK,
+                 sample_rate=DEFAULT_SAMPLE_RATE,
+                 sample_threshold=DEFAULT_SAMPLE_THRESHOLD):
+        """
+        Queue-backed events sink
+        :param writer: callable that takes a list of lines,
+                       defaults to the Aria events logger
+        :param json_lines: write one compact JSON document per event
+                           instead of pretty JSON and a summary line
+        :type json_lines: bool
+        :param max_queue_size: maximum number of queued events
+        :type max_queue_size: int
+        :param batch_size: maximum number of events written at once
+        :type batch_size: int
+        :param flush_interval: seconds to wait for a batch to fill up
+        :type flush_interval: float
+        :param overflow: what to do with events once the queue is full:
+                         'block' the workflow, 'drop_newest' events,
+                         'drop_oldest' queued events, or 'sample'
+        :type overflow: str
+        :param sample_rate: with 'sample', keep one of every sample_rate
+                            events while the queue is above the threshold
+        :type sample_rate: int
+        :param sample_threshold: queue fill ratio sampling starts at
+        :type sample_threshold: float
+        :return: None
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise exceptions.AriaValidationError(
+                'Unknown overflow policy: {0}, available policies: {1}'
+                .format(overflow, ', '.join(OVERFLOW_POLICIES)))
+        if max_queue_size < 1 or batch_size < 1 or sample_rate < 1:
+            raise exceptions.AriaValidationError(
+                'Queue size, batch size and sample rate must be positive')
+        self._writer = writer or LoggerWriter()
+        self._format = format_json_lines if json_lines else format_pretty
+        self._json_lines = json_lines
+        self._max_queue_size = max_queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow = overflow
+        self._sample_rate = sample_rate
+        self._sample_size = max(1, int(max_queue_size * sample_threshold))
+
+        self._events = collections.deque()
+        self._condition = threading.Condition()
+        self._writing = 0
+        self._sampled = 0
+        self._dropped = 0
+        self._unreported_drops = 0
+        self._written = 0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name='aria-event-sink')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __call__(self, events):
+        for event in events:
+            self.put(event)
+
+    def put(self, event):
+        """
+        Queues an event
+        :param event: workflow event
+        :type event: dict
+        :return: whether the event was queued
+        """
+        with self._condition:
+            if self._closed:
+                raise exceptions.AriaError('Events sink is closed')
+            if len(self._events) >= self._max_queue_size:
+                if self._overflow == BLOCK:
+                    while (len(self._events) >= self._max_queue_size and
+                           not self._closed):
+                        self._condition.wait()
+                    if self._closed:
+                        raise exceptions.AriaError('Events sink is closed')
+                elif self._overflow == DROP_OLDEST:
+                    self._events.popleft()
+                    self._drop()
+                else:
+                    self._drop()
+                    return False
+            elif (self._overflow == SAMPLE and
+                  len(self._events) >= self._sample_size):
+                self._sampled += 1
+                if self._sampled % self._sample_rate:
+                    self._drop()
+                    return False
+            self._events.append(event)
+            self._condition.notify_all()
+        return True
+
+    def _drop(self):
+        self._dropped += 1
+        self._unreported_drops += 1
+
+    def _dropped_lines(self, count):
+        event = {'type': DROPPED_EVENT_TYPE, 'count': count}
+        if self._json_lines:
+            return format_json_lines(event)
+        return ['{0} events were dropped by the events sink'.format(count)]
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._events and not self._closed:
+                self._condition.wait()
+            deadline = time.time() + self._flush_interval
+            while (len(self._events) < self._batch_size and
+                   not self._closed):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [self._events.popleft() for _ in
+                     range(min(self._batch_size, len(self._events)))]
+            dropped, self._unreported_drops = self._unreported_drops, 0
+            self._writing = len(batch)
+            # producers blocked on a full queue can go on
+            self._condition.notify_all()
+        return batch, dropped
+
+    def _run(self):
+        while True:
+            batch, dropped = self._next_batch()
+            if not batch and not dropped:
+                return
+            lines = self._dropped_lines(dropped) if dropped else []
+            for event in batch:
+                try:
+                    lines.extend(self._format(event))
+                except Exception:
+                    LOG.exception('Failed to format event {0!r}'
+                                  .format(event))
+            try:
+                self._writer(lines)
+            except Exception:
+                LOG.exception('Failed to write {0} events'
+                              .format(len(batch)))
+            with self._condition:
+                self._written += len(batch)
+                self._writing = 0
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued event was written
+        :param timeout: seconds to wait at most
+        :type timeout: float
+        :return: whether the queue was drained
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._events or self._writing:
+                if not self._thread.is_alive():
+                    return False
+                remaining = (None if deadline is None
+                             else deadline - time.time())
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(
+                    remaining if remaining is not None else 1)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Writes the queued events and stops the background thread
+        :param timeout: seconds to wait at most
+        :type timeout: float
+        :return: None
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        close_writer = getattr(self._writer, 'close', None)
+        if close_writer is not None:
+            close_writer()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queued': len(self._events),
+                'written': self._written,
+                'dropped': self._dropped,
+            }
+
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+
+def get_default_sink():
+    """
+    Process-wide events sink, writing pretty events
+    through the Aria events logger
+    :return: EventSink
+    """
+    global _default_sink
+    with _default_sink_lock:
+        if _default_sink is None:
+            _default_sink = EventSink()
+        return _default_sink
+
+
+def set_default_sink(sink):
+    """
+    Replaces the process-wide events sink, the previous one is closed
+    :param sink: EventSink
+    :return: None
+    """
+    global _default_sink
+    with _default_sink_lock:
+        previous, _default_sink = _default_sink, sink
+    if previous is not None and previous is not sink:
+        previous.close()
+
+
+@atexit.register
+def _close_default_sink():
+    with _default_sink_lock:
+        sink = _default_sink
+    if sink is not None:
+        sink.close()
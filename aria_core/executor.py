@@ -0,0 +1,245 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Concurrent execution of a workflow over many deployments.
+
+Deployments run in a bounded pool of worker processes, one process per
+deployment, so plugins of different deployments never share modules.
+Every deployment may belong to concurrency groups (for instance
+'plugin:openstack' or 'target:vcenter-1'), and limits cap how many
+deployments of a group run at the same time. A blueprint appears once
+in a run, its deployment storage is not shared between processes.
+"""
+
+import collections
+import multiprocessing
+import pickle
+import time
+import traceback
+
+from aria_core import exceptions
+from aria_core import parallelism
+from aria_core import retry
+
+# seconds between two checks of the worker processes
+POLL_INTERVAL = 0.1
+
+DeploymentResult = collections.namedtuple(
+    'DeploymentResult',
+    ['blueprint_id', 'workflow_id', 'result', 'error',
+     'started_at', 'duration'])
+
+
+class Deployment(object):
+
+    def __init__(self, blueprint_id, parameters=None, groups=()):
+        """
+        Deployment to execute a workflow on
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :param parameters: workflow parameters for this deployment
+        :type parameters: dict
+        :param groups: concurrency groups the deployment belongs to
+        :type groups: list
+        :return: None
+        """
+        self.blueprint_id = blueprint_id
+        self.parameters = parameters
+        self.groups = frozenset(groups)
+
+    @classmethod
+    def coerce(cls, deployment):
+        if isinstance(deployment, cls):
+            return deployment
+        if isinstance(deployment, dict):
+            return cls(**deployment)
+        return cls(deployment)
+
+
+def _execute_deployment(storage_path, storage_backend, workflow_id,
+                        blueprint_id, execute_kwargs):
+    from aria_core import api
+
+    started_at = time.time()
+    result, error = None, None
+    try:
+        executions = api.ExecutionsAPI(storage_path,
+                                       storage_backend=storage_backend)
+        result = executions.execute_custom(
+            blueprint_id, workflow_id, **execute_kwargs)
+    except BaseException:
+        error = traceback.format_exc()
+    try:
+        pickle.dumps(result)
+    except (pickle.PicklingError, TypeError):
+        # results travel back to the parent process
+        result = repr(result)
+    return DeploymentResult(blueprint_id=blueprint_id,
+                            workflow_id=workflow_id,
+                            result=result,
+                            error=error,
+                            started_at=started_at,
+                            duration=time.time() - started_at)
+
+
+def _run_deployment(connection, args):
+    try:
+        connection.send(_execute_deployment(*args))
+    finally:
+        connection.close()
+
+
+class _Worker(object):
+
+    def __init__(self, deployment, args):
+        self.deployment = deployment
+        self.started_at = time.time()
+        self._connection, child_connection = multiprocessing.Pipe(
+            duplex=False)
+        self._process = multiprocessing.Process(
+            target=_run_deployment, args=(child_connection, args))
+        self._process.daemon = True
+        self._process.start()
+        child_connection.close()
+
+    def _failed(self, workflow_id, error):
+        return DeploymentResult(blueprint_id=self.deployment.blueprint_id,
+                                workflow_id=workflow_id,
+                                result=None,
+                                error=error,
+                                started_at=self.started_at,
+                                duration=time.time() - self.started_at)
+
+    def result(self, workflow_id):
+        """
+        :return: DeploymentResult, None while the deployment runs
+        """
+        # checked before the exit code, so that a result sent right
+        # before the process exited is never missed
+        alive = self._process.is_alive()
+        if self._connection.poll():
+            try:
+                result = self._connection.recv()
+            except EOFError:
+                result = None
+            if result is not None:
+                self._finish()
+                return result
+        elif alive:
+            return None
+        self._finish()
+        return self._failed(
+            workflow_id,
+            'Worker process of {0} exited with code {1} before returning '
+            'a result'.format(self.deployment.blueprint_id,
+                              self._process.exitcode))
+
+    def _finish(self):
+        self._connection.close()
+        self._process.join()
+
+    def terminate(self):
+        if self._process.is_alive():
+            self._process.terminate()
+        self._finish()
+
+
+def execute_many(deployments,
+                 workflow_id,
+                 storage_path=None,
+                 storage_backend=None,
+                 max_workers=None,
+                 limits=None,
+                 retry_policy=None,
+                 concurrency=None,
+                 **execute_kwargs):
+    """
+    Executes a workflow on many deployments concurrently
+    :param deployments: Blueprint IDs, Deployment objects or dicts
+    :type deployments: list
+    :param workflow_id: Workflow ID
+    :type workflow_id: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :param storage_backend: deployment storage backend
+    :type storage_backend: str
+    :param max_workers: worker processes, defaults to the CPU count
+    :type max_workers: int
+    :param limits: maximum concurrent deployments per group
+    :type limits: dict
+    :param retry_policy: retry policy of every execution
+    :type retry_policy: retry.RetryPolicy
+    :param concurrency: thread pool size of every execution
+                        or parallelism.AUTO
+    :return: generator of DeploymentResult, in order of completion
+    """
+    deployments = [Deployment.coerce(d) for d in deployments]
+    repeated = sorted(
+        blueprint_id for blueprint_id, count in collections.Counter(
+            d.blueprint_id for d in deployments).items() if count > 1)
+    if repeated:
+        raise exceptions.AriaValidationError(
+            'Every blueprint may be executed once per run, got {0} '
+            'more than once'.format(', '.join(repeated)))
+    parallelism.validate(concurrency)
+    retry_policy = retry.policy_from(retry_policy)
+    # settings travel to the worker processes
+    execute_kwargs.update(
+        retry_policy=(retry_policy.to_dict()
+                      if retry_policy is not None else None),
+        concurrency=concurrency)
+    limits = limits or {}
+    for group, limit in limits.items():
+        if limit < 1:
+            raise exceptions.AriaValidationError(
+                'Concurrency limit of {0} must be positive, got {1}'
+                .format(group, limit))
+    max_workers = max_workers or multiprocessing.cpu_count()
+
+    pending = collections.deque(deployments)
+    running = collections.Counter()
+    workers = []
+    try:
+        while pending or workers:
+            for deployment in list(pending):
+                if len(workers) >= max_workers:
+                    break
+                if any(running[group] >= limits[group]
+                       for group in deployment.groups if group in limits):
+                    continue
+                pending.remove(deployment)
+                running.update(deployment.groups)
+                kwargs = dict(execute_kwargs,
+                              parameters=deployment.parameters)
+                workers.append(_Worker(
+                    deployment,
+                    (storage_path, storage_backend, workflow_id,
+                     deployment.blueprint_id, kwargs)))
+
+            completed = []
+            while not completed:
+                for worker in workers:
+                    result = worker.result(workflow_id)
+                    if result is not None:
+                        completed.append((worker, result))
+                if not completed:
+                    time.sleep(POLL_INTERVAL)
+            for worker, result in completed:
+                workers.remove(worker)
+                running.subtract(worker.deployment.groups)
+                yield result
+    finally:
+        for worker in workers:
+            worker.terminate()
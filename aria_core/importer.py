@@ -0,0 +1,185 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Scoped import of blueprint plugins.
+
+Instead of appending blueprint site-packages to the shared sys.path,
+executions register them with a meta path finder for as long as they
+run. Registration is thread-safe and always undone. Local workflows
+import plugin operations on their task threads, so imports cannot be
+attributed to an execution, and every registered path is searched, in
+order of registration. Executions whose site-packages hold different
+versions of the same distribution are therefore serialized: a path
+registers only once no registered path conflicts with it. Like
+sys.path, the finder only comes after the regular path entries. Once
+the last registration of a path ends, the modules imported from it are
+dropped from sys.modules, so that a later execution imports its own
+versions of the same plugins.
+"""
+
+import contextlib
+import os
+import pkgutil
+import sys
+import threading
+
+try:
+    from importlib import machinery
+except ImportError:
+    machinery = None
+
+try:
+    import imp
+except ImportError:
+    imp = None
+
+from aria_core import logger
+
+LOG = logger.logging.getLogger(__name__)
+
+METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+
+
+def _distributions(path):
+    # distribution name -> version of the packages installed in a path
+    distributions = {}
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return distributions
+    for name in names:
+        base, suffix = os.path.splitext(name)
+        if suffix not in METADATA_SUFFIXES:
+            continue
+        project, _, version = base.partition('-')
+        distributions[project.lower().replace('-', '_')] = (
+            version.split('-py')[0])
+    return distributions
+
+
+def _purge_modules(path):
+    prefix = os.path.join(os.path.abspath(path), '')
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None)
+        if module_file and os.path.abspath(module_file).startswith(prefix):
+            sys.modules.pop(name, None)
+
+
+class _PluginPathsFinder(object):
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # [token, path, distributions], in order of registration
+        self._registrations = []
+        self._next_token = 0
+
+    def _conflicts(self, path, distributions):
+        return [registered for _, registered, registered_distributions
+                in self._registrations
+                if registered != path and any(
+                    registered_distributions.get(name, version) != version
+                    for name, version in distributions.items())]
+
+    def register(self, path):
+        distributions = _distributions(path)
+        with self._condition:
+            conflicts = self._conflicts(path, distributions)
+            if conflicts:
+                LOG.info('Waiting for executions using {0} to end, they '
+                         'hold other versions of plugins of {1}'.format(
+                             ', '.join(conflicts), path))
+            while conflicts:
+                self._condition.wait()
+                conflicts = self._conflicts(path, distributions)
+            token = self._next_token
+            self._next_token += 1
+            self._registrations.append([token, path, distributions])
+            return token
+
+    def unregister(self, token):
+        with self._condition:
+            paths = [path for registered, path, _ in self._registrations
+                     if registered == token]
+            self._registrations = [registration for registration
+                                   in self._registrations
+                                   if registration[0] != token]
+            for path in paths:
+                if path not in self.paths():
+                    _purge_modules(path)
+            self._condition.notify_all()
+
+    def paths(self):
+        with self._condition:
+            paths = []
+            for _, path, _ in self._registrations:
+                if path not in paths:
+                    paths.append(path)
+            return paths
+
+    def find_spec(self, fullname, path=None, target=None):
+        if path is not None or not self._registrations:
+            return None
+        return machinery.PathFinder.find_spec(fullname, self.paths())
+
+    def find_module(self, fullname, path=None):
+        if path is not None or not self._registrations:
+            return None
+        try:
+            # meta path finders take precedence over sys.path
+            # on python 2, keep sys.path first as appending did
+            module_file = imp.find_module(fullname)[0]
+        except ImportError:
+            pass
+        else:
+            if module_file is not None:
+                module_file.close()
+            return None
+        for plugin_path in self.paths():
+            loader = pkgutil.ImpImporter(plugin_path).find_module(fullname)
+            if loader is not None:
+                return loader
+        return None
+
+
+_finder = _PluginPathsFinder()
+_install_lock = threading.Lock()
+
+
+def _install_finder():
+    with _install_lock:
+        if _finder not in sys.meta_path:
+            sys.meta_path.append(_finder)
+
+
+@contextlib.contextmanager
+def plugin_path(path):
+    """
+    Makes modules under a path importable while in the context
+    :param path: blueprint site-packages, ignored if None
+    :type path: str
+    """
+    if path is None:
+        yield
+        return
+    _install_finder()
+    token = _finder.register(path)
+    try:
+        yield
+    finally:
+        _finder.unregister(token)
+
+
+def active_plugin_paths():
+    return _finder.paths()
@@ -0,0 +1,368 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing and profiling of API calls.
+
+Instrumented API calls build a Report of the phases (spans) they went
+through. cProfile and tracemalloc captures are off by default, they are
+enabled with configure() or the ARIA_PROFILE and ARIA_TRACEMALLOC
+environment variables. Threads started by a profiled call, such as the
+task threads of a workflow execution, and the threads they start are
+profiled into its report too, until they end. The report of the last call made by a thread is returned
+by last_report(), and every report is handed to the listeners
+registered with add_listener().
+"""
+
+import contextlib
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import cProfile as profile_module
+except ImportError:
+    import profile as profile_module
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+from aria_core import logger
+
+LOG = logger.logging.getLogger(__name__)
+
+PROFILE_ENV_VAR = 'ARIA_PROFILE'
+TRACEMALLOC_ENV_VAR = 'ARIA_TRACEMALLOC'
+
+PROFILE_TOP_FUNCTIONS = 25
+TRACEMALLOC_TOP_LINES = 10
+
+_settings = {'profile': None, 'trace_memory': None}
+_listeners = []
+_local = threading.local()
+
+# cProfile follows every thread from python 3.12 on,
+# before that it only follows the thread enabling it
+_PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+# profiled call (id of its Report) -> profilers of the threads it started
+_thread_profilers = {}
+_thread_profilers_lock = threading.Lock()
+_thread_start = threading.Thread.__dict__['start']
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def configure(profile=None, trace_memory=None):
+    """
+    Enables or disables profiling of instrumented API calls,
+    None falls back to the environment variables
+    :param profile: capture a cProfile profile of every call
+    :type profile: bool
+    :param trace_memory: capture tracemalloc statistics of every call
+    :type trace_memory: bool
+    :return: None
+    """
+    _settings['profile'] = profile
+    _settings['trace_memory'] = trace_memory
+
+
+def _enabled(setting, env_var):
+    value = _settings[setting]
+    return _env_flag(env_var) if value is None else value
+
+
+def add_listener(listener):
+    """
+    Registers a callable that receives the Report of every call
+    :param listener: callable that takes a Report
+    :return: None
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    _listeners.remove(listener)
+
+
+class Span(object):
+    __slots__ = ('name', 'depth', 'started_at', 'duration')
+
+    def __init__(self, name, depth, started_at):
+        self.name = name
+        self.depth = depth
+        self.started_at = started_at
+        self.duration = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'started_at': self.started_at,
+            'duration': self.duration,
+        }
+
+
+class Report(object):
+
+    def __init__(self, operation):
+        """
+        Timing report of an API call
+        :param operation: name of the API call
+        :type operation: str
+        :return: None
+        """
+        self.operation = operation
+        self.started_at = time.time()
+        self.duration = None
+        self.error = None
+        self.spans = []
+        self.profile = None
+        self.memory = None
+        self.concurrency = None
+        self._depth = 0
+
+    def phases(self):
+        """
+        Total duration of every span name
+        :return: dict of span name to seconds
+        """
+        totals = {}
+        for span in self.spans:
+            if span.duration is not None:
+                totals[span.name] = totals.get(span.name, 0) + span.duration
+        return totals
+
+    def to_dict(self):
+        return {
+            'operation': self.operation,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'error': self.error,
+            'spans': [span.to_dict() for span in self.spans],
+            'phases': self.phases(),
+            'profile': self.profile,
+            'memory': self.memory,
+            'concurrency': self.concurrency,
+        }
+
+    def __str__(self):
+        lines = ['{0}: {1:.3f}s'.format(self.operation, self.duration or 0)]
+        for span in self.spans:
+            lines.append('{0}{1}: {2:.3f}s'.format(
+                '  ' * (span.depth + 1), span.name, span.duration or 0))
+        return os.linesep.join(lines)
+
+
+def current_report():
+    return getattr(_local, 'report', None)
+
+
+def last_report():
+    """
+    Report of the last instrumented call made by this thread
+    :return: Report or None
+    """
+    return getattr(_local, 'last_report', None)
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Times a phase of the instrumented call running
+    in this thread, does nothing outside of one
+    :param name: phase name
+    :type name: str
+    """
+    report = current_report()
+    if report is None:
+        yield
+        return
+    current = Span(name, report._depth, time.time())
+    report.spans.append(current)
+    report._depth += 1
+    try:
+        yield
+    finally:
+        report._depth -= 1
+        current.duration = time.time() - current.started_at
+
+
+def _run_profiled(run, report):
+    profiler = profile_module.Profile()
+    with _thread_profilers_lock:
+        profilers = _thread_profilers.get(id(report))
+        if profilers is None:
+            # the call ended before the thread ran
+            return run()
+        profilers.append(profiler)
+    _local.profiled_report = report
+    # a profiler can only be disabled by its own thread,
+    # it is once the thread is done
+    profiler.enable()
+    try:
+        return run()
+    finally:
+        profiler.disable()
+        _local.profiled_report = None
+
+
+def _start_profiled_thread(thread):
+    report = current_report() or getattr(_local, 'profiled_report', None)
+    if report is not None:
+        with _thread_profilers_lock:
+            profiled = id(report) in _thread_profilers
+        if profiled:
+            thread.run = functools.partial(_run_profiled, thread.run, report)
+    return _thread_start(thread)
+
+
+def _start_thread_profiling(report):
+    if _PROFILES_ALL_THREADS:
+        return
+    with _thread_profilers_lock:
+        if not _thread_profilers:
+            threading.Thread.start = _start_profiled_thread
+        _thread_profilers[id(report)] = []
+
+
+def _stop_thread_profiling(report):
+    with _thread_profilers_lock:
+        profilers = _thread_profilers.pop(id(report), [])
+        if not _thread_profilers:
+            threading.Thread.start = _thread_start
+    return profilers
+
+
+class _ThreadProfile(object):
+    # pstats reads a profiler with create_stats(), which disables the
+    # profiling of the calling thread rather than the profiled one
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+        self.stats = {}
+
+    def create_stats(self):
+        self._profiler.snapshot_stats()
+        self.stats = self._profiler.stats
+
+
+def _profile_summary(profiler, thread_profilers=()):
+    stats = pstats.Stats(profiler)
+    for thread_profiler in thread_profilers:
+        thread_profile = _ThreadProfile(thread_profiler)
+        thread_profile.create_stats()
+        if thread_profile.stats:
+            stats.add(thread_profile)
+    rows = sorted(stats.stats.items(),
+                  key=lambda item: item[1][3], reverse=True)
+    return [{
+        'function': '{0}:{1}({2})'.format(*function),
+        'calls': calls,
+        'total_time': total_time,
+        'cumulative_time': cumulative_time,
+    } for function, (_, calls, total_time, cumulative_time, _)
+        in rows[:PROFILE_TOP_FUNCTIONS]]
+
+
+def _memory_summary(snapshot, peak):
+    return {
+        'peak_bytes': peak,
+        'top': [{
+            'location': '{0}:{1}'.format(stat.traceback[0].filename,
+                                         stat.traceback[0].lineno),
+            'size_bytes': stat.size,
+            'count': stat.count,
+        } for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP_LINES]]
+    }
+
+
+@contextlib.contextmanager
+def measure(operation):
+    """
+    Builds the Report of an API call, calls nested
+    in an instrumented call become spans of it
+    :param operation: name of the API call
+    :type operation: str
+    :return: Report
+    """
+    if current_report() is not None:
+        with span(operation):
+            yield current_report()
+        return
+
+    report = Report(operation)
+    profiler = None
+    if _enabled('profile', PROFILE_ENV_VAR):
+        profiler = profile_module.Profile()
+    trace_memory = _enabled('trace_memory', TRACEMALLOC_ENV_VAR)
+    if trace_memory and tracemalloc is None:
+        LOG.debug('tracemalloc is not available, memory is not traced')
+        trace_memory = False
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    _local.report = report
+    if profiler is not None:
+        _start_thread_profiling(report)
+        profiler.enable()
+    try:
+        yield report
+    except BaseException as e:
+        report.error = str(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            thread_profilers = _stop_thread_profiling(report)
+        report.duration = time.time() - report.started_at
+        _local.report = None
+        if profiler is not None:
+            report.profile = _profile_summary(profiler, thread_profilers)
+        if trace_memory:
+            report.memory = _memory_summary(
+                tracemalloc.take_snapshot(),
+                tracemalloc.get_traced_memory()[1])
+            if started_tracing:
+                tracemalloc.stop()
+        _local.last_report = report
+        for listener in list(_listeners):
+            try:
+                listener(report)
+            except Exception:
+                LOG.exception('Instrumentation listener {0!r} failed'
+                              .format(listener))
+
+
+def instrumented(operation):
+    """
+    Decorates an API call with measure()
+    :param operation: name of the API call
+    :type operation: str
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
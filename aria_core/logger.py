@@ -12,19 +12,29 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import json
 import logging
 import logging.config
 import os
 import copy
+import threading
 
 
-_lgr = None
+EVENTS_LOGGER_NAME = 'aria_core.events'
 
 _all_loggers = set()
 
+_NOT_CONFIGURED = object()
+
+_lock = threading.RLock()
+_handlers = []
+_configured_version = _NOT_CONFIGURED
+
 
 def get_logger(name=__name__):
+    # loggers are configured once per configuration version,
+    # asking for a known logger is a plain lookup
+    if name in _all_loggers:
+        return logging.getLogger(name)
     return configure_loggers(name=name)
 
 
@@ -33,79 +43,105 @@ def all_loggers():
 
 
 def configure_loggers(name=None):
-    # first off, configure defaults
-    # to enable the use of the logger
-    # even before the init was executed.
     _name = name if name else __name__
-    _configure_defaults(name=_name)
-
+    with _lock:
+        version = _configuration_version()
+        if version != _configured_version:
+            _configure(version, names=[_name])
+        elif _name not in _all_loggers:
+            _attach_handlers(_name)
+    return logging.getLogger(_name)
+
+
+def reconfigure(force=False):
+    """
+    Re-applies the logging configuration if the
+    configuration file changed since it was applied
+    :param force: re-apply even if nothing changed
+    :type force: bool
+    :return: whether the configuration was re-applied
+    """
+    with _lock:
+        version = _configuration_version()
+        if force or version != _configured_version:
+            _configure(version)
+            return True
+    return False
+
+
+def _configuration_version():
+    # None stands for the defaults,
+    # used until the init was executed
     from aria_core import utils
-    if utils.is_initialized():
-        # init was already called
-        # use the configuration file.
-        _configure_from_file()
-
-    return logging.getLogger(name=name if name else __name__)
-
-
-def _configure_defaults(name=None):
-
-    # add handlers to the main logger
-    from aria_core import logger_config
-    logger_dict = copy.deepcopy(logger_config.LOGGER)
-    logger_dict['loggers'] = {
-        name: {
-            'handlers': list(logger_dict['handlers'].keys())
-        }
-    }
+    if not utils.is_initialized():
+        return None
     from aria_core import logger_config
-    logger_dict['handlers']['file'][
-        'filename'] = logger_config.DEFAULT_LOG_FILE
-    logfile_dir = os.path.dirname(
-        logger_config.DEFAULT_LOG_FILE)
-    if not os.path.exists(logfile_dir):
-        os.makedirs(logfile_dir)
-
-    logging.config.dictConfig(logger_dict)
-    logging.getLogger(name).setLevel(logging.INFO)
-    _all_loggers.add(name)
+    config_path = utils.get_configuration_path()
+    signature = logger_config.configuration_signature(config_path)
+    if signature is None:
+        return None
+    return config_path, signature
 
 
-def _configure_from_file():
+def _configure(version, names=()):
+    global _configured_version
 
     from aria_core import logger_config
-    config = logger_config.AriaConfig()
-    logging_config = config.logging
-    loggers_config = logging_config.loggers
-    logfile = logging_config.filename
+    levels = {}
+    logfile = logger_config.DEFAULT_LOG_FILE
+    if version is not None:
+        # init was already called
+        # use the configuration file.
+        logging_config = logger_config.get_config().logging
+        levels = logging_config.loggers
+        logfile = logging_config.filename or logfile
 
-    # set filename on file handler
     logger_dict = copy.deepcopy(logger_config.LOGGER)
+    logger_dict['disable_existing_loggers'] = False
     logger_dict['handlers']['file']['filename'] = logfile
     logfile_dir = os.path.dirname(logfile)
     if not os.path.exists(logfile_dir):
         os.makedirs(logfile_dir)
 
     # add handlers to every logger
-    # specified in the file
-    loggers = {}
-    for logger_name in loggers_config:
-        loggers[logger_name] = {
-            'handlers': list(logger_dict['handlers'].keys())
-        }
-    logger_dict['loggers'] = loggers
+    # known so far and specified in the file
+    configured = _all_loggers | set(names) | set(levels) | set([__name__])
+    logger_dict['loggers'] = dict(
+        (logger_name, {'handlers': list(logger_dict['handlers'].keys())})
+        for logger_name in configured)
+    logging.config.dictConfig(logger_dict)
 
     # set level for each logger
-    for logger_name, logging_level in loggers_config.iteritems():
-        log = logging.getLogger(logger_name)
-        level = logging._levelNames[logging_level.upper()]
-        log.setLevel(level)
-        _all_loggers.add(logger_name)
-
-    logging.config.dictConfig(logger_dict)
+    for logger_name in configured:
+        level = levels.get(logger_name)
+        logging.getLogger(logger_name).setLevel(
+            logging.getLevelName(level.upper()) if level else logging.INFO)
+
+    _handlers[:] = logging.getLogger(__name__).handlers
+    _all_loggers.update(configured)
+    _configured_version = version
+
+
+def _attach_handlers(name):
+    log = logging.getLogger(name)
+    for handler in _handlers:
+        if handler not in log.handlers:
+            log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    _all_loggers.add(name)
 
 
-def get_events_logger():
+def get_events_logger(sink=None):
+    """
+    Events logger for workflow executions, events are queued
+    and written in batches by a background thread
+    :param sink: aria_core.event_sink.EventSink,
+                 defaults to the process-wide sink
+    :return: callable that takes an iterable of events
+    """
+    if sink is None:
+        from aria_core import event_sink
+        sink = event_sink.get_default_sink()
 
     def generic_events_logger(events):
         """
@@ -113,104 +149,125 @@ def get_events_logger():
         :param events: The events to log.
         :return:
         """
-        for event in events:
-            _lgr.info(json.dumps(event, indent=4))
-            _lgr.info(str(Event(event)))
+        sink(events)
 
     return generic_events_logger
 
 
+_EVENT_FIELDS = ('timestamp', 'is_log_message', 'log_level',
+                 'deployment_id', 'node_id', 'operation', 'source_id',
+                 'target_id', 'group', 'policy', 'trigger', 'message',
+                 'event_type')
+
+_PY2 = str is bytes
+
+
+def _parse_event(event):
+    # single pass over the raw event, in _EVENT_FIELDS order
+    context = event['context']
+    get = context.get
+    is_log_message = 'aria_log' in event['type']
+    operation = get('operation')
+    message = event['message']['text']
+    if _PY2 and isinstance(message, unicode):
+        message = message.encode('utf-8')
+    return ((event.get('@timestamp') or event['timestamp']).split('.')[0],
+            is_log_message,
+            event['level'].upper() if 'level' in event else None,
+            context['deployment_id'],
+            get('node_id'),
+            operation.split('.')[-1] if operation is not None else None,
+            get('source_id'),
+            get('target_id'),
+            get('group'),
+            get('policy'),
+            get('trigger'),
+            message,
+            event.get('event_type'))
+
+
+def _operation_info(node_id, operation, source_id, target_id,
+                    group, policy, trigger):
+    if source_id is not None:
+        return '[{0}->{1}|{2}]'.format(source_id, target_id, operation)
+    info = '.'.join(e for e in (node_id, operation, group, policy, trigger)
+                    if e is not None)
+    return '[{0}]'.format(info) if info else ''
+
+
+def _render(fields):
+    (timestamp, is_log_message, log_level, deployment_id, node_id,
+     operation, source_id, target_id, group, policy, trigger,
+     message, _) = fields
+    info = _operation_info(node_id, operation, source_id, target_id,
+                           group, policy, trigger)
+    if is_log_message:
+        return '{0} LOG <{1}> {2}{3}: {4}'.format(
+            timestamp, deployment_id, info + ' ' if info else '',
+            log_level, message)
+    return '{0} CFY <{1}> {2}{3}'.format(
+        timestamp, deployment_id, info + ' ' if info else '', message)
+
+
+def render_events(events):
+    """
+    Renders raw events to output lines, without
+    building an Event object per event
+    :param events: iterable of raw events
+    :return: generator of rendered lines
+    """
+    for event in events:
+        yield _render(_parse_event(event))
+
+
+def _field(index):
+    return property(lambda self: self._fields[index])
+
+
 class Event(object):
+    """
+    Event parsed once on creation, its line is rendered
+    on first use and cached
+    """
+
+    __slots__ = ('_fields', '_rendered')
 
     def __init__(self, event):
-        self._event = event
+        self._fields = _parse_event(event)
+        self._rendered = None
 
     def __str__(self):
-        deployment_id = self.deployment_id
-        timestamp = self.timestamp
-        event_type_indicator = self.event_type_indicator
-        message = self.text
-        info = self.operation_info
-
-        if info:  # spacing in between of the info and the message
-            info += ' '
-
-        return '{0} {1} {2} {3}{4}'.format(timestamp,
-                                           event_type_indicator,
-                                           deployment_id,
-                                           info,
-                                           message)
+        if self._rendered is None:
+            self._rendered = _render(self._fields)
+        return self._rendered
 
     @property
     def operation_info(self):
-        operation = self.operation
-        node_id = self.node_id
-        source_id = self.source_id
-        target_id = self.target_id
-
-        context = self._event['context']
-        group = context.get('group')
-        policy = context.get('policy')
-        trigger = context.get('trigger')
-
-        if source_id is not None:
-            info = '{0}->{1}|{2}'.format(source_id, target_id, operation)
-        else:
-            info_elements = [
-                e for e in [node_id, operation, group, policy, trigger]
-                if e is not None]
-            info = '.'.join(info_elements)
-        if info:
-            info = '[{0}]'.format(info)
-        return info
+        (_, _, _, _, node_id, operation, source_id, target_id,
+         group, policy, trigger, _, _) = self._fields
+        return _operation_info(node_id, operation, source_id, target_id,
+                               group, policy, trigger)
 
     @property
     def text(self):
-        message = self._event['message']['text'].encode('utf-8')
         if self.is_log_message:
-            message = '{0}: {1}'.format(self.log_level, message)
-        return message
-
-    @property
-    def log_level(self):
-        return self._event['level'].upper()
-
-    @property
-    def timestamp(self):
-        return (self._event.get('@timestamp') or self._event[
-            'timestamp']).split('.')[0]
+            return '{0}: {1}'.format(self.log_level, self.message)
+        return self.message
 
     @property
     def event_type_indicator(self):
         return 'LOG' if self.is_log_message else 'CFY'
 
-    @property
-    def operation(self):
-        op = self._event['context'].get('operation')
-        if op is None:
-            return None
-        return op.split('.')[-1]
-
-    @property
-    def node_id(self):
-        return self._event['context'].get('node_id')
-
-    @property
-    def source_id(self):
-        return self._event['context'].get('source_id')
-
-    @property
-    def target_id(self):
-        return self._event['context'].get('target_id')
-
     @property
     def deployment_id(self):
-        return '<{0}>'.format(self._event['context']['deployment_id'])
-
-    @property
-    def event_type(self):
-        return self._event.get('event_type')  # not available for logs
-
-    @property
-    def is_log_message(self):
-        return 'aria_log' in self._event['type']
+        return '<{0}>'.format(self._fields[3])
+
+    timestamp = _field(0)
+    is_log_message = _field(1)
+    log_level = _field(2)
+    node_id = _field(4)
+    operation = _field(5)
+    source_id = _field(6)
+    target_id = _field(7)
+    message = _field(11)
+    event_type = _field(12)
@@ -28,8 +28,9 @@ import os
 import yaml
 import tempfile
 import getpass
+import threading
 
-from aria_core import constants
+from aria_core import wd_settings
 from aria_core.dependencies import futures
 
 
@@ -40,18 +41,7 @@ DEFAULT_LOG_FILE = os.path.expanduser(
 
 
 def get_init_path():
-    current_lookup_dir = os.getcwd()
-    while True:
-
-        path = os.path.join(current_lookup_dir,
-                            constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
-
-        if os.path.exists(path):
-            return path
-        else:
-            if os.path.dirname(current_lookup_dir) == current_lookup_dir:
-                return None
-            current_lookup_dir = os.path.dirname(current_lookup_dir)
+    return wd_settings.get_init_path()
 
 
 def get_configuration_path():
@@ -62,10 +52,44 @@ def get_configuration_path():
     )
 
 
+class _FrozenDict(dict):
+    """
+    Read-only dict, deep copies of it are plain mutable structures
+    """
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Aria configuration is read-only')
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return dict((k, _thaw(v)) for k, v in value.items())
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
 class AriaConfig(object):
     class Logging(object):
         def __init__(self, logging):
-            self._logging = logging or {}
+            self._logging = logging or _FrozenDict()
 
         @property
         def filename(self):
@@ -73,24 +97,63 @@ class AriaConfig(object):
 
         @property
         def loggers(self):
-            return self._logging.get('loggers', {})
+            return self._logging.get('loggers', _FrozenDict())
 
-    def __init__(self):
-        with open(get_configuration_path()) as f:
-            self._config = yaml.safe_load(f.read())
+    def __init__(self, config=None):
+        if config is None:
+            with open(get_configuration_path()) as f:
+                config = yaml.safe_load(f.read())
+        self._config = _freeze(config or {})
 
     @property
     def logging(self):
-        return self.Logging(self._config.get('logging', {}))
+        return self.Logging(self._config.get('logging'))
 
     @property
     def local_provider_context(self):
-        return self._config.get('local_provider_context', {})
+        return self._config.get('local_provider_context', _FrozenDict())
 
     @property
     def local_import_resolver(self):
         return self._config.get(
-            futures.aria_dsl_constants.IMPORT_RESOLVER_KEY, {})
+            futures.aria_dsl_constants.IMPORT_RESOLVER_KEY, _FrozenDict())
+
+
+_config_lock = threading.Lock()
+_configs = {}
+
+
+def configuration_signature(config_path):
+    """
+    Stat signature of a configuration file
+    :param config_path: path to the configuration file
+    :type config_path: str
+    :return: tuple that changes along with the file, None if missing
+    """
+    try:
+        stat = os.stat(config_path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+def get_config():
+    """
+    Process-wide Aria configuration, the configuration
+    file is parsed again only once it changes
+    :return: read-only AriaConfig
+    """
+    config_path = get_configuration_path()
+    signature = configuration_signature(config_path)
+    with _config_lock:
+        cached = _configs.get(config_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    with open(config_path) as f:
+        config = AriaConfig(config=yaml.safe_load(f.read()))
+    with _config_lock:
+        _configs[config_path] = signature, config
+    return config
 
 
 LOGGER = {
@@ -107,8 +170,8 @@ LOGGER = {
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "file",
-            "maxBytes": "5000000",
-            "backupCount": "20"
+            "maxBytes": 5000000,
+            "backupCount": 20
         },
         "console": {
             "class": "logging.StreamHandler",
@@ -0,0 +1,225 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Task parallelism of local workflow executions.
+
+Local workflows run the operations of an execution on a thread pool of
+one thread by default. An execution asks for a pool size with an
+integer concurrency, or for AUTO: the pool is then sized to the width
+of the deployment, the largest number of node instances that share a
+depth in the relationship graph (instances at the same depth do not
+depend on each other). When the operations of the last execution of
+the blueprint were fast, threads only contend for the GIL, so the pool
+is capped at the number of CPUs. The concurrency reached, the largest
+number of tasks running at once, is logged and added to the Report of
+the instrumented API call.
+"""
+
+import contextlib
+import multiprocessing
+import threading
+
+from aria_core import analytics
+from aria_core import constants
+from aria_core import event_log
+from aria_core import exceptions
+from aria_core import instrumentation
+from aria_core import logger
+
+LOG = logger.logging.getLogger(__name__)
+
+AUTO = 'auto'
+
+# median operation duration under which operations are CPU bound
+FAST_OPERATION_SECONDS = 0.005
+# events of the last execution read to measure operation latency
+LATENCY_SAMPLE_EVENTS = 5000
+
+
+def validate(concurrency):
+    if concurrency is None or concurrency == AUTO:
+        return
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) \
+            or concurrency < 1:
+        raise exceptions.AriaValidationError(
+            'concurrency must be a positive integer or {0}, got {1!r}'
+            .format(AUTO, concurrency))
+
+
+def _depths(dependencies):
+    depths = {}
+
+    def depth(node, visiting=()):
+        if node in depths:
+            return depths[node]
+        if node in visiting:
+            return 0
+        depths[node] = 1 + max(
+            [depth(target, visiting + (node,))
+             for target in dependencies.get(node, ())] or [-1])
+        return depths[node]
+
+    for node in dependencies:
+        depth(node)
+    return depths
+
+
+def _instance_counts(plan):
+    counts = {}
+    for instance in plan.get('node_instances') or []:
+        counts[instance['node_id']] = counts.get(instance['node_id'], 0) + 1
+    for node in plan['nodes']:
+        if node['id'] not in counts:
+            counts[node['id']] = node.get('number_of_instances', 1)
+    return counts
+
+
+def graph_width(plan):
+    """
+    Largest number of node instances that can run
+    their operations in parallel
+    :param plan: deployment plan
+    :type plan: dict
+    :return: int
+    """
+    dependencies = analytics.node_dependencies(plan['nodes'])
+    counts = _instance_counts(plan)
+    widths = {}
+    for node, depth in _depths(dependencies).items():
+        widths[depth] = widths.get(depth, 0) + counts.get(node, 1)
+    return max(widths.values() or [1])
+
+
+def _latency(directory):
+    since = max(0, event_log.end_offset(directory) - LATENCY_SAMPLE_EVENTS)
+    records = event_log.read(directory, since=since)
+    durations = sorted(sample.duration for sample in
+                       analytics.pair_tasks(r.event for r in records))
+    return durations[len(durations) // 2] if durations else None
+
+
+def observed_latency(blueprint_id, storage_path=None):
+    """
+    Median duration of the most recent operations of the
+    last execution of a blueprint that ran operations
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: seconds, None without such an execution
+    """
+    try:
+        execution_ids = event_log.executions(blueprint_id,
+                                             storage_path=storage_path)
+        for execution_id in reversed(execution_ids):
+            latency = _latency(event_log.execution_dir(
+                blueprint_id, execution_id, storage_path=storage_path))
+            if latency is not None:
+                return latency
+    except Exception:
+        # sizing the pool never fails an execution
+        LOG.debug('Operation latency of {0} is unknown'.format(
+            blueprint_id), exc_info=True)
+    return None
+
+
+def auto_size(plan, latency=None,
+              max_size=constants.WORKFLOW_TASK_THREAD_POOL_MAX_SIZE):
+    """
+    Thread pool size of an execution
+    :param plan: deployment plan
+    :type plan: dict
+    :param latency: median operation duration in seconds, if known
+    :type latency: float
+    :param max_size: upper bound of the pool size
+    :type max_size: int
+    :return: int
+    """
+    size = max(1, min(graph_width(plan), max_size))
+    if latency is not None and latency < FAST_OPERATION_SECONDS:
+        size = min(size, multiprocessing.cpu_count())
+    return size
+
+
+def pool_size(concurrency, environment, blueprint_id, storage_path=None):
+    """
+    Resolves the concurrency option of an execution
+    :param concurrency: pool size, AUTO or None for the default
+    :param environment: aria_local environment of the blueprint
+    :return: pool size, None for the local workflows default
+    """
+    validate(concurrency)
+    if concurrency != AUTO:
+        return concurrency
+    latency = observed_latency(blueprint_id, storage_path=storage_path)
+    size = auto_size(environment.plan, latency=latency)
+    LOG.debug('Thread pool of {0}: {1} (median operation latency {2})'
+              .format(blueprint_id, size, latency))
+    return size
+
+
+class ConcurrencyMonitor(object):
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self.running = 0
+        self.reached = 0
+        self.tasks = 0
+        self._lock = threading.Lock()
+
+    def observe(self, event):
+        event_type = event.get('event_type')
+        with self._lock:
+            if event_type == analytics.TASK_STARTED:
+                self.running += 1
+                self.tasks += 1
+                self.reached = max(self.reached, self.running)
+            elif event_type in (analytics.TASK_SUCCEEDED,
+                                analytics.TASK_FAILED):
+                self.running = max(0, self.running - 1)
+
+    def to_dict(self):
+        return {
+            'pool_size': self.pool_size,
+            'reached': self.reached,
+            'tasks': self.tasks,
+        }
+
+
+@contextlib.contextmanager
+def monitor(blueprint_id, execution_id, pool_size=None):
+    """
+    Measures the concurrency reached by the
+    running execution of a blueprint
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param pool_size: thread pool size of the execution
+    :type pool_size: int
+    :return: ConcurrencyMonitor
+    """
+    concurrency = ConcurrencyMonitor(pool_size=pool_size)
+    try:
+        with event_log.observe(execution_id, concurrency.observe):
+            yield concurrency
+    finally:
+        LOG.info('Execution of {0} reached a concurrency of {1} '
+                 '(thread pool of {2})'.format(
+                     blueprint_id, concurrency.reached,
+                     pool_size or 'default size'))
+        report = instrumentation.current_report()
+        if report is not None:
+            report.concurrency = concurrency.to_dict()
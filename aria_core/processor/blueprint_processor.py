@@ -14,13 +14,19 @@
 
 import os
 
+from aria_core import instrumentation
+from aria_core import utils
 from aria_core.dependencies import futures
+from aria_core.processor import plan_cache
 
 
-def create_requirements(blueprint_path):
+@instrumentation.instrumented('requirements')
+def create_requirements(blueprint_path, storage_path=None):
 
-    parsed_dsl = futures.aria_dsl_parser.parse_from_path(
-        dsl_file_path=blueprint_path)
+    parsed_dsl = plan_cache.parse_from_path(
+        dsl_file_path=blueprint_path,
+        resolver=utils.get_import_resolver(),
+        storage_path=storage_path)
 
     requirements = _plugins_to_requirements(
         blueprint_path=blueprint_path,
@@ -0,0 +1,390 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Content-addressed cache of parsed blueprint plans.
+
+A plan is looked up by a hash of the blueprint file, the resolver
+configuration and the parser arguments. Every import fetched while
+parsing is recorded with its content digest, so a cached plan is only
+reused while all of its imports are unchanged.
+
+Plans are kept in a private folder of the Aria CORE storage folder.
+Entries are pickles, so a folder or an entry owned by another user is
+never read.
+"""
+
+import collections
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from aria_core import constants
+from aria_core import instrumentation
+from aria_core import utils
+from aria_core.dependencies import futures
+
+LOG = logging.getLogger(__name__)
+
+# the plan cache folder of the storage folder of a call
+STORAGE_CACHE_DIR = 'storage'
+
+# parser arguments and their defaults, a call relying on
+# a default and a call passing it share cache entries
+_PARSER_DEFAULTS = {
+    'resources_base_url': None,
+    'validate_version': True,
+    'additional_resource_sources': [],
+}
+
+
+def _digest(*chunks):
+    sha = hashlib.sha256()
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+        sha.update(chunk)
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def _parser_signature(kwargs):
+    arguments = dict(_PARSER_DEFAULTS)
+    arguments.update(kwargs)
+    if isinstance(arguments['additional_resource_sources'], tuple):
+        arguments['additional_resource_sources'] = list(
+            arguments['additional_resource_sources'])
+    try:
+        return json.dumps(arguments, sort_keys=True)
+    except (TypeError, ValueError):
+        # no stable key, e.g. an object argument
+        return None
+
+
+def _owned_by_us(path_stat):
+    return path_stat.st_uid == os.getuid()
+
+
+def _resolver_signature(resolver):
+    if resolver is None:
+        return 'default'
+    return json.dumps(
+        [type(resolver).__module__,
+         type(resolver).__name__,
+         vars(resolver)],
+        sort_keys=True, default=repr)
+
+
+class _RecordingResolver(object):
+    """
+    Delegates to an import resolver and records
+    the digest of every import it fetches.
+    """
+
+    def __init__(self, resolver):
+        self._resolver = resolver
+        self.imports = []
+
+    def fetch_import(self, import_url):
+        content = self._resolver.fetch_import(import_url)
+        self.imports.append((import_url, _digest(content)))
+        return content
+
+    def __getattr__(self, item):
+        return getattr(self._resolver, item)
+
+
+class PlanCache(object):
+
+    def __init__(self, cache_dir=None,
+                 max_entries=constants.PLAN_CACHE_MAX_ENTRIES,
+                 parser=None):
+        """
+        Parsed blueprint plans cache
+        :param cache_dir: on-disk cache folder, None keeps it in-process
+        :type cache_dir: str
+        :param max_entries: LRU bound for both in-process and on-disk caches
+        :type max_entries: int
+        :param parser: DSL parser module, defaults to the Aria DSL parser
+        :return: None
+        """
+        self._cache_dir = cache_dir
+        self._max_entries = max_entries
+        self._parser = parser
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def parser(self):
+        return self._parser or futures.aria_dsl_parser
+
+    def parse_from_path(self, dsl_file_path, resolver=None, **kwargs):
+        """
+        Drop-in replacement of the DSL parser parse_from_path
+        :param dsl_file_path: path to a blueprint
+        :type dsl_file_path: str
+        :param resolver: import resolver
+        :return: parsed plan, a private copy for every caller
+        """
+        if resolver is None:
+            resolver = futures.aria_dsl_utils.create_import_resolver(None)
+        parser_signature = _parser_signature(kwargs)
+        if parser_signature is None:
+            LOG.debug('Parsing {0} without the plan cache, its parser '
+                      'arguments have no stable key'.format(dsl_file_path))
+            with instrumentation.span('dsl_parse'):
+                return self.parser.parse_from_path(
+                    dsl_file_path=dsl_file_path, resolver=resolver,
+                    **kwargs)
+        with open(dsl_file_path, 'rb') as f:
+            blueprint = f.read()
+        key = _digest(os.path.abspath(dsl_file_path),
+                      blueprint,
+                      _resolver_signature(resolver),
+                      parser_signature)
+
+        entry = self._get(key)
+        if entry is not None and self._is_fresh(entry, resolver):
+            self.hits += 1
+            return pickle.loads(entry['plan'])
+
+        self.misses += 1
+        recorder = _RecordingResolver(resolver)
+        with instrumentation.span('dsl_parse'):
+            plan = self.parser.parse_from_path(
+                dsl_file_path=dsl_file_path, resolver=recorder, **kwargs)
+        self._put(key, {
+            'imports': recorder.imports,
+            'plan': pickle.dumps(plan, pickle.HIGHEST_PROTOCOL),
+        })
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._private_dir(create=False):
+            for name in os.listdir(self._cache_dir):
+                _remove_quietly(os.path.join(self._cache_dir, name))
+
+    @staticmethod
+    def _is_fresh(entry, resolver):
+        for import_url, digest in entry['imports']:
+            try:
+                content = resolver.fetch_import(import_url)
+            except Exception as e:
+                LOG.debug('Unable to re-fetch import {0}: {1}'
+                          .format(import_url, str(e)))
+                return False
+            if _digest(content) != digest:
+                return False
+        return True
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def _put(self, key, entry):
+        self._remember(key, entry)
+        self._dump(key, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _private_dir(self, create):
+        """
+        Whether the cache folder can be used: a folder (not a link)
+        of the current user, that only the current user can access
+        """
+        if not self._cache_dir:
+            return False
+        try:
+            if create and not os.path.lexists(self._cache_dir):
+                os.makedirs(self._cache_dir, 0o700)
+            dir_stat = os.lstat(self._cache_dir)
+        except OSError:
+            return False
+        if not stat.S_ISDIR(dir_stat.st_mode) or not _owned_by_us(dir_stat):
+            LOG.warning('Not using plan cache folder {0}, it is not a '
+                        'folder of the current user'.format(self._cache_dir))
+            return False
+        if stat.S_IMODE(dir_stat.st_mode) & 0o077:
+            os.chmod(self._cache_dir, 0o700)
+        return True
+
+    def _entry_path(self, key):
+        return os.path.join(self._cache_dir, '{0}.plan'.format(key))
+
+    def _load(self, key):
+        if not self._private_dir(create=False):
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                if not _owned_by_us(os.fstat(f.fileno())):
+                    LOG.warning('Not loading plan cache entry {0}, it is '
+                                'owned by another user'.format(path))
+                    return None
+                entry = pickle.load(f)
+            # the access time is what the on-disk LRU eviction uses
+            os.utime(path, None)
+            return entry
+        except (IOError, OSError):
+            return None
+        except Exception as e:
+            LOG.debug('Discarding unreadable plan cache entry {0}: {1}'
+                      .format(path, str(e)))
+            _remove_quietly(path)
+            return None
+
+    def _dump(self, key, entry):
+        if not self._private_dir(create=True):
+            return
+        try:
+            path = self._entry_path(key)
+            tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+            self._evict()
+        except (IOError, OSError) as e:
+            LOG.debug('Unable to store plan cache entry: {0}'.format(str(e)))
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith('.plan'):
+                continue
+            path = os.path.join(self._cache_dir, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self._max_entries)]:
+            _remove_quietly(path)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_settings = {
+    'cache_dir': STORAGE_CACHE_DIR,
+    'max_entries': constants.PLAN_CACHE_MAX_ENTRIES,
+}
+# cache folder -> PlanCache
+_plan_caches = {}
+_plan_caches_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_plan_cache(storage_path=None):
+    """
+    Plan cache of a storage folder, or the configured one
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: PlanCache
+    """
+    cache_dir = _settings['cache_dir']
+    if cache_dir == STORAGE_CACHE_DIR:
+        cache_dir = utils.plan_cache_dir(storage_path=storage_path)
+    with _plan_caches_lock:
+        plan_cache = _plan_caches.get(cache_dir)
+        if plan_cache is None:
+            plan_cache = _plan_caches[cache_dir] = PlanCache(
+                cache_dir=cache_dir, max_entries=_settings['max_entries'])
+        return plan_cache
+
+
+def configure(cache_dir=STORAGE_CACHE_DIR,
+              max_entries=constants.PLAN_CACHE_MAX_ENTRIES):
+    """
+    :param cache_dir: plan cache folder of every call, STORAGE_CACHE_DIR
+                      for the folder of the storage folder of a call,
+                      None keeps plans in-process
+    :param max_entries: LRU bound of every plan cache
+    :return: PlanCache of the default storage folder
+    """
+    with _plan_caches_lock:
+        _settings.update(cache_dir=cache_dir, max_entries=max_entries)
+        _plan_caches.clear()
+    return get_plan_cache()
+
+
+def parse_from_path(dsl_file_path, resolver=None, storage_path=None,
+                    **kwargs):
+    return get_plan_cache(storage_path=storage_path).parse_from_path(
+        dsl_file_path, resolver=resolver, **kwargs)
+
+
+class _CachingParserModule(object):
+    """
+    Stands in for the DSL parser module inside aria_local,
+    so that init_env reuses cached plans as well.
+    """
+
+    def __init__(self, parser):
+        self._parser = parser
+
+    def parse_from_path(self, dsl_file_path, resolver=None, **kwargs):
+        return parse_from_path(
+            dsl_file_path, resolver=resolver,
+            storage_path=getattr(_local, 'storage_path', None), **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self._parser, item)
+
+
+@contextlib.contextmanager
+def local_workflows(storage_path=None):
+    """
+    Makes aria_local parse blueprints of the calling
+    thread through the plan cache of a storage folder
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    """
+    local = futures.aria_local
+    if not isinstance(local.dsl_parser, _CachingParserModule):
+        local.dsl_parser = _CachingParserModule(local.dsl_parser)
+    previous = getattr(_local, 'storage_path', None)
+    _local.storage_path = storage_path
+    try:
+        yield
+    finally:
+        _local.storage_path = previous
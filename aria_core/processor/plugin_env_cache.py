@@ -0,0 +1,353 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Plugin virtualenvs shared between blueprints.
+
+Blueprints with the same set of plugin requirements and the same
+interpreter share one virtualenv. Local plugin sources are identified
+by a hash of their contents and the interpreter by its resolved path
+and version, so that an edited plugin or an upgraded interpreter gets
+a virtualenv of its own. The index keeps track of which blueprints use
+an environment, so teardown releases it and unused environments are
+garbage collected, least recently used first. Lock files are never
+removed, processes waiting on one would otherwise lock a file that
+nobody else uses.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from aria_core import constants
+from aria_core import utils
+from aria_core.processor import wheelhouse
+
+LOG = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = 'index.json'
+COMPLETE_MARKER_NAME = '.aria-complete'
+
+_python_fingerprints = {}
+_python_fingerprints_lock = threading.Lock()
+
+
+def _find_executable(name):
+    if os.path.dirname(name):
+        return name if os.path.exists(name) else None
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def python_fingerprint(python):
+    """
+    Resolved path and version of an interpreter
+    :param python: interpreter name or path
+    :type python: str
+    :return: str
+    """
+    with _python_fingerprints_lock:
+        if python in _python_fingerprints:
+            return _python_fingerprints[python]
+    executable = _find_executable(python)
+    if executable is None:
+        fingerprint = python
+    else:
+        executable = os.path.realpath(executable)
+        try:
+            version = subprocess.check_output(
+                [executable, '-c',
+                 'import sys; sys.stdout.write(sys.version)'],
+                stderr=subprocess.STDOUT).decode('utf-8')
+        except (OSError, subprocess.CalledProcessError):
+            version = None
+        fingerprint = '{0} {1}'.format(executable, version or '')
+    with _python_fingerprints_lock:
+        _python_fingerprints[python] = fingerprint
+    return fingerprint
+
+
+def _source_digest(path):
+    if os.path.isdir(path):
+        return wheelhouse.source_key(path)
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def requirement_fingerprint(requirement):
+    """
+    A requirement, with the content hash of local plugin sources
+    :param requirement: pip requirement, URL or local path
+    :type requirement: str
+    :return: str
+    """
+    requirement = requirement.strip()
+    if os.path.exists(requirement):
+        return '{0}@sha256:{1}'.format(requirement,
+                                       _source_digest(requirement))
+    return requirement
+
+
+def _fingerprints(requirements):
+    return dict((req.strip(), requirement_fingerprint(req))
+                for req in requirements)
+
+
+def environment_key(requirements, python):
+    normalized = sorted(set(requirement_fingerprint(req)
+                            for req in requirements))
+    sha = hashlib.sha256()
+    sha.update(json.dumps([python_fingerprint(python),
+                           normalized]).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class PluginEnvCache(object):
+
+    def __init__(self, root,
+                 max_unused=constants.PLUGIN_ENVS_MAX_UNUSED):
+        """
+        Shared plugin virtualenvs cache
+        :param root: folder that holds shared virtualenvs
+        :type root: str
+        :param max_unused: number of unreferenced virtualenvs to keep
+        :type max_unused: int
+        :return: None
+        """
+        self._root = root
+        self._max_unused = max_unused
+
+    @property
+    def root(self):
+        return self._root
+
+    def env_path(self, key):
+        return os.path.join(self._root, key)
+
+    def acquire(self, blueprint_id, requirements, python, build):
+        """
+        Returns a shared virtualenv for a set of requirements,
+        building it first if necessary
+        :param blueprint_id: Blueprint ID that references the virtualenv
+        :type blueprint_id: str
+        :param requirements: plugin requirements
+        :type requirements: set
+        :param python: virtualenv interpreter
+        :type python: str
+        :param build: callable that creates a virtualenv at a given path
+        :return: path to the shared virtualenv
+        """
+        def register(index, key):
+            self.release_from_index(index, blueprint_id)
+            entry = self._touch(index, key, requirements, python)
+            entry['blueprints'].append(blueprint_id)
+
+        return self._build(requirements, python, build, register)
+
+    def build_template(self, requirements, python, build):
+        """
+        Returns a virtualenv to be cloned for a set of requirements,
+        building it first if necessary
+        :param requirements: plugin requirements
+        :type requirements: set
+        :param python: virtualenv interpreter
+        :type python: str
+        :param build: callable that creates a virtualenv at a given path
+        :return: path to the template virtualenv
+        """
+        return self._build(
+            requirements, python, build,
+            lambda index, key: self._touch(index, key, requirements, python))
+
+    def find_template(self, requirements, python):
+        """
+        Looks up the virtualenv that covers most of the requirements
+        without having anything else installed
+        :param requirements: plugin requirements
+        :type requirements: set
+        :param python: virtualenv interpreter
+        :type python: str
+        :return: tuple of the template path and its requirements, or None
+        """
+        if not os.path.isdir(self._root):
+            return None
+        fingerprints = _fingerprints(requirements)
+        python = python_fingerprint(python)
+        best = None
+        with self._index() as index:
+            for key, entry in index.items():
+                # entries without fingerprints predate them,
+                # what they hold is unknown
+                covered = entry.get('fingerprints')
+                if (covered is None or entry.get('python') != python or
+                        any(fingerprints.get(req) != fingerprint
+                            for req, fingerprint in covered.items()) or
+                        not os.path.exists(os.path.join(
+                            self.env_path(key), COMPLETE_MARKER_NAME))):
+                    continue
+                if best is None or len(covered) > len(best[1]):
+                    best = key, set(covered)
+            if best is not None:
+                index[best[0]]['last_used'] = time.time()
+        if best is None:
+            return None
+        return self.env_path(best[0]), best[1]
+
+    def _build(self, requirements, python, build, register):
+        if not os.path.isdir(self._root):
+            os.makedirs(self._root)
+        key = environment_key(requirements, python)
+        path = self.env_path(key)
+        marker = os.path.join(path, COMPLETE_MARKER_NAME)
+
+        # registered while the virtualenv is locked, so that
+        # it is never collected before its user is in the index
+        with env_lock(path):
+            if not os.path.exists(marker):
+                if os.path.exists(path):
+                    LOG.debug('Removing incomplete plugin '
+                              'virtualenv {0}'.format(path))
+                    shutil.rmtree(path, ignore_errors=True)
+                build(path)
+                with open(marker, 'w') as f:
+                    f.write(python)
+            else:
+                LOG.info('Reusing plugin virtualenv {0}'.format(path))
+            with self._index() as index:
+                register(index, key)
+        return path
+
+    @staticmethod
+    def _touch(index, key, requirements, python):
+        entry = index.setdefault(key, {'blueprints': []})
+        fingerprints = _fingerprints(requirements)
+        entry['requirements'] = sorted(fingerprints)
+        entry['fingerprints'] = fingerprints
+        entry['python'] = python_fingerprint(python)
+        entry['last_used'] = time.time()
+        return entry
+
+    def release(self, blueprint_id):
+        """
+        Drops a blueprint reference and garbage collects
+        virtualenvs that are no longer in use
+        :param blueprint_id: Blueprint ID
+        :type blueprint_id: str
+        :return: None
+        """
+        if not os.path.isdir(self._root):
+            return
+        with self._index() as index:
+            self.release_from_index(index, blueprint_id)
+            self._collect(index)
+
+    @staticmethod
+    def release_from_index(index, blueprint_id):
+        for entry in index.values():
+            if blueprint_id in entry['blueprints']:
+                entry['blueprints'].remove(blueprint_id)
+                entry['last_used'] = time.time()
+
+    def _collect(self, index):
+        unused = sorted((entry['last_used'], key)
+                        for key, entry in index.items()
+                        if not entry['blueprints'])
+        for _, key in unused[:max(0, len(unused) - self._max_unused)]:
+            path = self.env_path(key)
+            # a locked virtualenv is being built, acquired or cloned,
+            # waiting for it while holding the index would deadlock
+            with env_lock(path, blocking=False) as locked:
+                if not locked:
+                    continue
+                LOG.info('Removing unused plugin virtualenv {0}'
+                         .format(path))
+                shutil.rmtree(path, ignore_errors=True)
+                del index[key]
+
+    @contextlib.contextmanager
+    def _index(self):
+        index_path = os.path.join(self._root, INDEX_FILE_NAME)
+        with utils.file_lock('{0}.lock'.format(index_path)):
+            index = {}
+            if os.path.exists(index_path):
+                with open(index_path) as f:
+                    index = json.load(f)
+            yield index
+            tmp_path = '{0}.{1}.tmp'.format(index_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.rename(tmp_path, index_path)
+
+
+def env_lock(path, blocking=True):
+    return utils.file_lock('{0}.lock'.format(path), blocking=blocking)
+
+
+def get_plugin_env_cache(storage_path=None):
+    return PluginEnvCache(utils.plugin_envs_dir(storage_path=storage_path))
+
+
+def link_environment(shared_path, venv_path):
+    """
+    Points a blueprint .venv at a shared virtualenv
+    :param shared_path: shared virtualenv path
+    :type shared_path: str
+    :param venv_path: blueprint virtualenv path
+    :type venv_path: str
+    :return: None
+    """
+    if os.path.islink(venv_path):
+        if os.readlink(venv_path) == shared_path:
+            return
+        os.remove(venv_path)
+    elif os.path.exists(venv_path):
+        shutil.rmtree(venv_path)
+    parent = os.path.dirname(venv_path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    os.symlink(shared_path, venv_path)
+
+
+def unlink_environment(blueprint_id, venv_path, storage_path=None):
+    """
+    Detaches a blueprint .venv from the shared virtualenv it
+    points at, before the blueprint gets a virtualenv of its own
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param venv_path: blueprint virtualenv path
+    :type venv_path: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: None
+    """
+    if not os.path.islink(venv_path):
+        return
+    os.remove(venv_path)
+    release(blueprint_id, storage_path=storage_path)
+
+
+def release(blueprint_id, storage_path=None):
+    get_plugin_env_cache(storage_path=storage_path).release(blueprint_id)
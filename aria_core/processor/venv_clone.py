@@ -0,0 +1,131 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cloning of template virtualenvs.
+
+A clone is a reflink copy of the template when the filesystem supports
+it, otherwise a tree of hardlinks. Files that pip or setuptools rewrite
+in place (scripts, .pth files, ...) are always copied, and absolute
+references to the template path are rewritten to the clone path.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+
+LOG = logging.getLogger(__name__)
+
+_REWRITTEN_DIRS = ('bin', 'Scripts')
+_REWRITTEN_SUFFIXES = ('.pth', '.egg-link', '.cfg', 'orig-prefix.txt')
+
+
+def clone_virtualenv(template_path, target_path):
+    """
+    Clones a virtualenv
+    :param template_path: path to the template virtualenv
+    :type template_path: str
+    :param target_path: path of the clone, must not exist
+    :type target_path: str
+    :return: None
+    """
+    template_path = os.path.abspath(template_path)
+    target_path = os.path.abspath(target_path)
+    parent = os.path.dirname(target_path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    if _reflink_copy(template_path, target_path):
+        LOG.debug('Reflink-copied {0} to {1}'
+                  .format(template_path, target_path))
+    else:
+        _hardlink_copy(template_path, target_path)
+        LOG.debug('Hardlink-copied {0} to {1}'
+                  .format(template_path, target_path))
+
+    for path in _rewritten_files(target_path):
+        _relocate_file(path, template_path, target_path)
+
+
+def _reflink_copy(source, target):
+    with open(os.devnull, 'w') as devnull:
+        try:
+            returncode = subprocess.call(
+                ['cp', '-a', '--reflink=always', source, target],
+                stdout=devnull, stderr=devnull)
+        except OSError:
+            return False
+    if returncode:
+        shutil.rmtree(target, ignore_errors=True)
+        return False
+    return True
+
+
+def _hardlink_copy(source, target):
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(target, relative))
+        os.makedirs(target_root)
+        shutil.copystat(root, target_root)
+
+        for name in list(dirs):
+            if os.path.islink(os.path.join(root, name)):
+                # os.walk does not descend into linked folders
+                files.append(name)
+                dirs.remove(name)
+
+        for name in files:
+            source_file = os.path.join(root, name)
+            target_file = os.path.join(target_root, name)
+            if os.path.islink(source_file):
+                link = os.readlink(source_file)
+                if link.startswith(source + os.sep):
+                    link = target + link[len(source):]
+                os.symlink(link, target_file)
+            elif _is_rewritten(relative, name):
+                shutil.copy2(source_file, target_file)
+            else:
+                try:
+                    os.link(source_file, target_file)
+                except OSError:
+                    shutil.copy2(source_file, target_file)
+
+
+def _is_rewritten(relative, name):
+    top = relative.split(os.sep)[0]
+    return top in _REWRITTEN_DIRS or name.endswith(_REWRITTEN_SUFFIXES)
+
+
+def _rewritten_files(target):
+    for root, _, files in os.walk(target):
+        relative = os.path.relpath(root, target)
+        for name in files:
+            path = os.path.join(root, name)
+            if not os.path.islink(path) and _is_rewritten(relative, name):
+                yield path
+
+
+def _relocate_file(path, old_prefix, new_prefix):
+    with open(path, 'rb') as f:
+        content = f.read()
+    if b'\0' in content[:1024]:
+        return
+    old_prefix = old_prefix.encode('utf-8')
+    if old_prefix not in content:
+        return
+    mode = os.stat(path).st_mode
+    with open(path, 'wb') as f:
+        f.write(content.replace(old_prefix, new_prefix.encode('utf-8')))
+    os.chmod(path, mode)
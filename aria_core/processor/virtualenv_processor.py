@@ -12,73 +12,372 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import json
 import os
-import sys
+import re
+import shutil
+import tempfile
 
 from virtualenvapi import manage
 from virtualenvapi import exceptions
 
 from aria_core import constants
 from aria_core import exceptions as aria_exceptions
+from aria_core import importer
+from aria_core import instrumentation
 from aria_core import logger
 from aria_core import logger_config
 from aria_core import utils
 
 from aria_core.dependencies import futures
 from aria_core.processor import blueprint_processor
+from aria_core.processor import plan_cache
+from aria_core.processor import plugin_env_cache
+from aria_core.processor import venv_clone
+from aria_core.processor import wheelhouse
 
 LOG = logger.get_logger('aria_cli.cli.main')
 
+# content hashes of the local plugin sources installed in a virtualenv
+SOURCES_FILE_NAME = 'aria-sources.json'
+
+_SETUP_PY_NAME = re.compile(r'\bname\s*=\s*[\'"]([^\'"]+)[\'"]')
+_SETUP_CFG_NAME = re.compile(r'^name\s*=\s*(\S+)', re.MULTILINE)
+_ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.zip')
+
+# how the plugins of a blueprint are installed, and their defaults
+PLUGIN_OPTIONS = {
+    'batch_install': True,
+    'shared_plugin_env': False,
+    'clone_plugin_env': False,
+    'use_wheelhouse': False,
+}
+
 
 def initialize_blueprint(blueprint_path,
                          blueprint_id,
                          storage,
                          install_plugins=False,
                          inputs=None,
-                         storage_path=None):
+                         storage_path=None,
+                         batch_install=True,
+                         shared_plugin_env=False,
+                         clone_plugin_env=False,
+                         use_wheelhouse=False):
 
     venv_path = install_blueprint_plugins(
         blueprint_id, blueprint_path,
         install_plugins=install_plugins,
-        storage_path=storage_path)
-    provider_context = (
-        logger_config.AriaConfig().local_provider_context)
+        storage_path=storage_path,
+        batch_install=batch_install,
+        shared_plugin_env=shared_plugin_env,
+        clone_plugin_env=clone_plugin_env,
+        use_wheelhouse=use_wheelhouse)
+    _record_plugin_options(blueprint_id, storage_path, {
+        'batch_install': batch_install,
+        'shared_plugin_env': shared_plugin_env,
+        'clone_plugin_env': clone_plugin_env,
+        'use_wheelhouse': use_wheelhouse,
+    })
+    provider_context = copy.deepcopy(
+        logger_config.get_config().local_provider_context)
     inputs = utils.inputs_to_dict(inputs, 'inputs')
-    sys.path.append(venv_path)
-    env = futures.aria_local.init_env(
-        blueprint_path=blueprint_path,
-        name=blueprint_id,
-        inputs=inputs,
-        storage=storage,
-        ignored_modules=constants.IGNORED_LOCAL_WORKFLOW_MODULES,
-        provider_context=provider_context,
-        resolver=utils.get_import_resolver())
-    del sys.path[sys.path.index(venv_path)]
-    return env
+    with importer.plugin_path(venv_path), \
+            plan_cache.local_workflows(storage_path=storage_path), \
+            instrumentation.span('init_env'):
+        return futures.aria_local.init_env(
+            blueprint_path=blueprint_path,
+            name=blueprint_id,
+            inputs=inputs,
+            storage=storage,
+            ignored_modules=constants.IGNORED_LOCAL_WORKFLOW_MODULES,
+            provider_context=provider_context,
+            resolver=utils.get_import_resolver())
+
+
+def plugin_options(blueprint_id, storage_path=None):
+    """
+    Plugin options a blueprint was initialized with
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: dict of the PLUGIN_OPTIONS
+    """
+    options = dict(PLUGIN_OPTIONS)
+    try:
+        with open(utils.plugin_options_path(
+                blueprint_id, storage_path=storage_path)) as f:
+            options.update(json.load(f))
+    except (IOError, ValueError):
+        pass
+    return options
 
 
+def _record_plugin_options(blueprint_id, storage_path, options):
+    with open(utils.plugin_options_path(
+            blueprint_id, storage_path=storage_path), 'w') as f:
+        json.dump(options, f, indent=2, sort_keys=True)
+
+
+@instrumentation.instrumented('plugins')
 def install_blueprint_plugins(blueprint_id, blueprint_path,
                               install_plugins=False,
                               default_python_interpreter='python2.7',
-                              storage_path=None):
-    requirements = blueprint_processor.create_requirements(blueprint_path)
+                              storage_path=None,
+                              batch_install=True,
+                              shared_plugin_env=False,
+                              clone_plugin_env=False,
+                              use_wheelhouse=False):
+    requirements = blueprint_processor.create_requirements(
+        blueprint_path, storage_path=storage_path)
     if install_plugins:
         if requirements:
+            options = None
+            if use_wheelhouse:
+                with instrumentation.span('wheelhouse'):
+                    requirements, options = wheelhouse.get_wheelhouse(
+                        storage_path=storage_path).requirements(
+                            requirements, default_python_interpreter)
             venv_path = utils.venv_path(blueprint_id,
                                         storage_path=storage_path)
-            venv = manage.VirtualEnvironment(
-                venv_path, python=default_python_interpreter)
-            venv.open_or_create()
-            for req in requirements:
-                if not venv.is_installed(req):
-                    try:
-                        venv.install(req)
-                        LOG.info("Installed dependency: {0}".format(req))
-                    except exceptions.PackageInstallationException:
-                        msg = 'Unable to install {0} dependency'.format(req)
-                        LOG.error(msg)
-                        raise aria_exceptions.AriaError(msg)
+            if shared_plugin_env:
+                cache = plugin_env_cache.get_plugin_env_cache(
+                    storage_path=storage_path)
+                shared_path = cache.acquire(
+                    blueprint_id, requirements, default_python_interpreter,
+                    build=lambda path: _create_virtualenv(
+                        path, requirements,
+                        default_python_interpreter, batch_install,
+                        options=options))
+                plugin_env_cache.link_environment(shared_path, venv_path)
+            elif clone_plugin_env:
+                plugin_env_cache.unlink_environment(
+                    blueprint_id, venv_path, storage_path=storage_path)
+                _clone_virtualenv(venv_path, requirements,
+                                  default_python_interpreter,
+                                  batch_install, options=options,
+                                  storage_path=storage_path)
+            else:
+                # pip would install into the shared virtualenv
+                plugin_env_cache.unlink_environment(
+                    blueprint_id, venv_path, storage_path=storage_path)
+                _create_virtualenv(venv_path, requirements,
+                                   default_python_interpreter,
+                                   batch_install, options=options)
             LOG.info("Virtualenv {0} was used or created.".format(venv_path))
-            return os.path.join(venv_path, 'lib', venv.python, 'site-packages')
+            return os.path.join(venv_path, 'lib',
+                                default_python_interpreter, 'site-packages')
         else:
             LOG.debug('There are no plugins to install.')
+
+
+def _create_virtualenv(venv_path, requirements, python,
+                       batch_install, options=None):
+    venv = manage.VirtualEnvironment(venv_path, python=python)
+    with instrumentation.span('venv_create'):
+        venv.open_or_create()
+    with instrumentation.span('pip_install'):
+        if batch_install:
+            _install_requirements_batch(venv, requirements, options=options)
+        else:
+            _install_requirements(venv, requirements, options=options)
+    return venv
+
+
+def _clone_virtualenv(venv_path, requirements, python,
+                      batch_install, options=None, storage_path=None):
+    cache = plugin_env_cache.get_plugin_env_cache(storage_path=storage_path)
+
+    def build_template():
+        return cache.build_template(
+            requirements, python,
+            build=lambda path: _create_virtualenv(
+                path, requirements, python, batch_install,
+                options=options)), requirements
+
+    template_path, template_requirements = (
+        cache.find_template(requirements, python) or build_template())
+    if os.path.islink(venv_path):
+        os.remove(venv_path)
+    elif os.path.exists(venv_path):
+        shutil.rmtree(venv_path)
+    if not _clone_template(template_path, venv_path):
+        # collected between being found and being locked
+        template_path, template_requirements = build_template()
+        _clone_template(template_path, venv_path)
+    LOG.info("Virtualenv {0} was cloned from {1}."
+             .format(venv_path, template_path))
+
+    missing = set(requirements) - set(template_requirements)
+    if missing:
+        _create_virtualenv(venv_path, missing, python,
+                           batch_install, options=options)
+        # the next blueprint with these requirements clones it as is
+        with instrumentation.span('venv_clone'):
+            cache.build_template(
+                requirements, python,
+                build=lambda path: venv_clone.clone_virtualenv(
+                    venv_path, path))
+
+
+def _clone_template(template_path, venv_path):
+    with plugin_env_cache.env_lock(template_path), \
+            instrumentation.span('venv_clone'):
+        if not os.path.exists(os.path.join(
+                template_path, plugin_env_cache.COMPLETE_MARKER_NAME)):
+            return False
+        venv_clone.clone_virtualenv(template_path, venv_path)
+    return True
+
+
+def _installed_sources(venv):
+    try:
+        with open(os.path.join(venv.path, SOURCES_FILE_NAME)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _record_sources(venv, requirements):
+    # content hashes of the installed local plugin sources,
+    # a source whose hash changed is installed again
+    sources = _installed_sources(venv)
+    for req in requirements:
+        if os.path.exists(req):
+            sources[req] = plugin_env_cache.requirement_fingerprint(req)
+    with open(os.path.join(venv.path, SOURCES_FILE_NAME), 'w') as f:
+        json.dump(sources, f, indent=2, sort_keys=True)
+
+
+def _missing_requirements(venv, requirements):
+    # single pip freeze for the whole requirement set
+    installed = set(_normalize_package_name(name)
+                    for name in venv.installed_package_names)
+    sources = _installed_sources(venv)
+    missing, changed = [], []
+    for req in sorted(requirements):
+        name = _requirement_name(req)
+        if name is None or _normalize_package_name(name) not in installed:
+            missing.append(req)
+        elif os.path.exists(req) and sources.get(req) != \
+                plugin_env_cache.requirement_fingerprint(req):
+            changed.append(req)
+    return missing, changed
+
+
+def _install_requirements(venv, requirements, options=None):
+    missing, changed = _missing_requirements(venv, requirements)
+    for req in missing + changed:
+        args = _options_to_args(options)
+        if req in changed:
+            args.append('--force-reinstall')
+        try:
+            venv.install(req, options=args)
+            LOG.info("Installed dependency: {0}".format(req))
+        except exceptions.PackageInstallationException:
+            msg = 'Unable to install {0} dependency'.format(req)
+            LOG.error(msg)
+            raise aria_exceptions.AriaError(msg)
+    _record_sources(venv, requirements)
+
+
+def _install_requirements_batch(venv, requirements, options=None):
+    missing, changed = _missing_requirements(venv, requirements)
+    if not missing and not changed:
+        LOG.debug('All plugins are already installed.')
+        return
+
+    try:
+        if missing:
+            _pip_install_file(venv, missing, options)
+        if changed:
+            # same version as the installed one, pip skips it otherwise
+            _pip_install_file(venv, changed, options,
+                              install_args=['--force-reinstall'])
+    except exceptions.PackageInstallationException as e:
+        LOG.warning('Batched installation failed, '
+                    'falling back to one by one: {0}'.format(str(e)))
+        # the failing requirement is unknown at this point,
+        # installing one by one pins it down for the error report
+        _install_requirements(venv, requirements, options=options)
+        return
+    for req in missing + changed:
+        LOG.info("Installed dependency: {0}".format(req))
+    _record_sources(venv, requirements)
+
+
+def _pip_install_file(venv, requirements, options, install_args=None):
+    fd, requirements_file = tempfile.mkstemp(
+        prefix='aria-requirements-', suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(os.linesep.join((options or []) + requirements))
+            f.write(os.linesep)
+        venv.install('-r {0}'.format(requirements_file),
+                     options=install_args)
+    finally:
+        os.remove(requirements_file)
+
+
+def _options_to_args(options):
+    args = []
+    for option in options or []:
+        args.extend(option.split())
+    return args
+
+
+def _source_name(path):
+    # project name of a local plugin folder, from its metadata
+    for file_name, pattern in (('setup.py', _SETUP_PY_NAME),
+                               ('setup.cfg', _SETUP_CFG_NAME)):
+        try:
+            with open(os.path.join(path, file_name)) as f:
+                match = pattern.search(f.read())
+        except IOError:
+            continue
+        if match:
+            return match.group(1)
+    return None
+
+
+def _archive_name(file_name):
+    # name-version.tar.gz, name-version-py2-none-any.whl
+    if file_name.endswith('.whl'):
+        return file_name.split('-')[0]
+    for suffix in _ARCHIVE_SUFFIXES:
+        if file_name.endswith(suffix):
+            name = file_name[:-len(suffix)].rsplit('-', 1)[0]
+            # GitHub archives are named after the version only
+            return None if name[:1].isdigit() else name
+    return None
+
+
+def _requirement_name(requirement):
+    """
+    Project name of a requirement
+    :param requirement: pip requirement, URL or local path
+    :type requirement: str
+    :return: name, None when it cannot be told without installing
+    """
+    requirement = requirement.strip()
+    if '#egg=' in requirement:
+        return requirement.split('#egg=', 1)[1].split('&')[0]
+    if os.path.isdir(requirement):
+        return _source_name(requirement)
+    if os.path.isfile(requirement):
+        return _archive_name(os.path.basename(requirement))
+    if '://' in requirement or requirement.startswith('git+'):
+        file_name = requirement.split('#')[0].split('?')[0].rstrip('/')
+        file_name = file_name.rsplit('/', 1)[-1]
+        if file_name.endswith('.git'):
+            return file_name[:-len('.git')]
+        return _archive_name(file_name)
+    for separator in ('==', '>=', '<=', '>', '<', '[', ';'):
+        requirement = requirement.split(separator)[0]
+    return requirement.strip()
+
+
+def _normalize_package_name(name):
+    return name.lower().replace('_', '-')
@@ -0,0 +1,181 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local wheelhouse for blueprint plugins.
+
+Every plugin source is built into wheels once, together with its
+dependencies. Local plugin folders are keyed by a hash of their source
+tree and URL sources by their URL, so later installs come from the
+wheelhouse without any package index access. Wheels are built by a
+virtualenv of the requested interpreter, which brings its own pip and
+wheel whatever the system interpreter has installed.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+
+from virtualenvapi import exceptions as venv_exceptions
+from virtualenvapi import manage
+
+from aria_core import exceptions
+from aria_core import utils
+
+LOG = logging.getLogger(__name__)
+
+PLUGIN_WHEEL_FILE_NAME = '.aria-wheel'
+BUILD_ENV_PREFIX = '.build-'
+
+_IGNORED_DIRS = ('.git', '.hg', '.svn', '.tox', 'build', 'dist',
+                 '__pycache__')
+_IGNORED_SUFFIXES = ('.pyc', '.pyo', '.egg-info')
+
+
+def source_key(source):
+    """
+    Hashes a plugin source
+    :param source: plugin URL or path to a local plugin folder
+    :type source: str
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    if '://' in source:
+        sha.update(source.encode('utf-8'))
+        return sha.hexdigest()
+
+    for root, dirs, files in os.walk(source):
+        dirs[:] = sorted(d for d in dirs
+                         if d not in _IGNORED_DIRS and
+                         not d.endswith(_IGNORED_SUFFIXES))
+        for name in sorted(files):
+            if name.endswith(_IGNORED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            sha.update(os.path.relpath(path, source).encode('utf-8'))
+            sha.update(b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    sha.update(chunk)
+            sha.update(b'\0')
+    return sha.hexdigest()
+
+
+class Wheelhouse(object):
+
+    def __init__(self, root):
+        """
+        Plugin wheels storage
+        :param root: wheelhouse folder
+        :type root: str
+        :return: None
+        """
+        self._root = root
+
+    @property
+    def root(self):
+        return self._root
+
+    def requirements(self, sources, python):
+        """
+        Builds missing wheels for plugin sources
+        :param sources: plugin URLs and local plugin folders
+        :type sources: set
+        :param python: interpreter the wheels are built with
+        :type python: str
+        :return: tuple of the plugin wheel paths
+                 and the pip options to install them offline
+        """
+        wheels = set()
+        options = ['--no-index']
+        for source in sorted(sources):
+            wheel_dir = self.build(source, python)
+            with open(os.path.join(wheel_dir, PLUGIN_WHEEL_FILE_NAME)) as f:
+                wheels.add(os.path.join(wheel_dir, f.read().strip()))
+            options.append('--find-links {0}'.format(wheel_dir))
+        return wheels, options
+
+    def build(self, source, python):
+        """
+        Builds a plugin source and its dependencies into wheels,
+        unless that was already done
+        :param source: plugin URL or path to a local plugin folder
+        :type source: str
+        :param python: interpreter the wheels are built with
+        :type python: str
+        :return: folder with the plugin wheels
+        """
+        if not os.path.isdir(self._root):
+            os.makedirs(self._root)
+        wheel_dir = os.path.join(
+            self._root, '{0}-{1}'.format(python, source_key(source)))
+        marker = os.path.join(wheel_dir, PLUGIN_WHEEL_FILE_NAME)
+
+        with utils.file_lock('{0}.lock'.format(wheel_dir)):
+            if os.path.exists(marker):
+                LOG.debug('Using wheels of {0} from {1}'
+                          .format(source, wheel_dir))
+                return wheel_dir
+            shutil.rmtree(wheel_dir, ignore_errors=True)
+            os.makedirs(wheel_dir)
+            try:
+                build_python = self._build_python(python)
+                plugin_wheel = self._build_plugin_wheel(
+                    source, build_python, wheel_dir)
+                self._pip_wheel(build_python, wheel_dir,
+                                ['--find-links', wheel_dir,
+                                 os.path.join(wheel_dir, plugin_wheel)])
+            except (subprocess.CalledProcessError, OSError,
+                    venv_exceptions.VirtualenvCreationException) as e:
+                shutil.rmtree(wheel_dir, ignore_errors=True)
+                msg = 'Unable to build wheels for {0}: {1}'.format(
+                    source, str(e))
+                LOG.error(msg)
+                raise exceptions.AriaError(msg)
+            with open(marker, 'w') as f:
+                f.write(plugin_wheel)
+            LOG.info('Built wheels of {0} into {1}'
+                     .format(source, wheel_dir))
+        return wheel_dir
+
+    def _build_python(self, python):
+        build_env = os.path.join(
+            self._root, '{0}{1}'.format(BUILD_ENV_PREFIX, python))
+        with utils.file_lock('{0}.lock'.format(build_env)):
+            manage.VirtualEnvironment(
+                build_env, python=python).open_or_create()
+        return os.path.join(build_env, 'bin', 'python')
+
+    def _build_plugin_wheel(self, source, python, wheel_dir):
+        self._pip_wheel(python, wheel_dir, ['--no-deps', source])
+        wheels = [name for name in os.listdir(wheel_dir)
+                  if name.endswith('.whl')]
+        if len(wheels) != 1:
+            raise exceptions.AriaError(
+                'Expected a single wheel for {0}, got: {1}'
+                .format(source, ', '.join(wheels) or 'none'))
+        return wheels[0]
+
+    @staticmethod
+    def _pip_wheel(python, wheel_dir, args):
+        subprocess.check_call(
+            [python, '-m', 'pip', 'wheel',
+             '--disable-pip-version-check',
+             '--wheel-dir', wheel_dir] + args)
+
+
+def get_wheelhouse(storage_path=None):
+    return Wheelhouse(utils.wheelhouse_dir(storage_path=storage_path))
@@ -0,0 +1,316 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Incremental redeploy of an installed blueprint.
+
+The new plan is diffed against the plan in the blueprint storage. Nodes
+that were removed, modified, or are not fully started, and every node
+depending on them (through relationships, transitively) are uninstalled
+with the old plan. The storage is then initialized with the new plan,
+carrying over the instances (IDs, state and runtime properties) of the
+untouched nodes, and the added, modified and dependent nodes are
+installed. Untouched nodes only see the relationship operations of
+their relationships with reinstalled nodes.
+"""
+
+import json
+import os
+import shutil
+
+from aria_core import blueprints
+from aria_core import logger
+from aria_core import utils
+from aria_core import workflows
+from aria_core.dependencies import futures
+from aria_core.processor import plan_cache
+
+LOG = logger.logging.getLogger(__name__)
+
+STARTED = 'started'
+
+INSTALL_NODES_WORKFLOW = 'aria_update_install_nodes'
+UNINSTALL_NODES_WORKFLOW = 'aria_update_uninstall_nodes'
+
+_WORKFLOWS = {
+    INSTALL_NODES_WORKFLOW: 'aria_core.redeploy_workflows.install_nodes',
+    UNINSTALL_NODES_WORKFLOW: 'aria_core.redeploy_workflows.uninstall_nodes',
+}
+
+
+def _nodes(plan):
+    return dict((node['id'], node) for node in plan['nodes'])
+
+
+def _fingerprint(value):
+    return json.dumps(value, sort_keys=True, default=repr)
+
+
+def _relationships(nodes):
+    return set((node_id, relationship['target_id'], relationship['type'])
+               for node_id, node in nodes.items()
+               for relationship in node.get('relationships') or [])
+
+
+def _dependents(roots, relationships):
+    sources_of = {}
+    for source, target, _ in relationships:
+        sources_of.setdefault(target, set()).add(source)
+    dependents, pending = set(), list(roots)
+    while pending:
+        for source in sources_of.get(pending.pop(), ()):
+            if source not in dependents and source not in roots:
+                dependents.add(source)
+                pending.append(source)
+    return dependents
+
+
+class PlanDiff(object):
+
+    def __init__(self, old_plan, new_plan, unhealthy=()):
+        """
+        Difference between the installed and the new plan
+        :param old_plan: plan in the blueprint storage
+        :type old_plan: dict
+        :param new_plan: prepared deployment plan
+        :type new_plan: dict
+        :param unhealthy: nodes of the old plan whose
+                          instances are not all started
+        :return: None
+        """
+        old_nodes, new_nodes = _nodes(old_plan), _nodes(new_plan)
+        self.added = set(new_nodes) - set(old_nodes)
+        self.removed = set(old_nodes) - set(new_nodes)
+        self.modified = set(
+            node_id for node_id in set(old_nodes) & set(new_nodes)
+            if _fingerprint(old_nodes[node_id]) !=
+            _fingerprint(new_nodes[node_id]))
+        self.unhealthy = set(unhealthy) & set(new_nodes) - self.modified
+        old_relationships = _relationships(old_nodes)
+        new_relationships = _relationships(new_nodes)
+        self.relationships_added = new_relationships - old_relationships
+        self.relationships_removed = old_relationships - new_relationships
+
+        changed = self.added | self.removed | self.modified | self.unhealthy
+        self.dependents = _dependents(
+            changed, old_relationships | new_relationships)
+        self.to_uninstall = ((self.removed | self.modified |
+                              self.unhealthy | self.dependents) &
+                             set(old_nodes))
+        self.to_install = ((self.added | self.modified |
+                            self.unhealthy | self.dependents) &
+                           set(new_nodes))
+        self.intact = set(new_nodes) - self.to_install
+
+    @property
+    def is_empty(self):
+        return not (self.to_install or self.to_uninstall)
+
+    def to_dict(self):
+        return {
+            'added': sorted(self.added),
+            'removed': sorted(self.removed),
+            'modified': sorted(self.modified),
+            'unhealthy': sorted(self.unhealthy),
+            'dependents': sorted(self.dependents),
+            'relationships_added': sorted(
+                list(r) for r in self.relationships_added),
+            'relationships_removed': sorted(
+                list(r) for r in self.relationships_removed),
+            'to_uninstall': sorted(self.to_uninstall),
+            'to_install': sorted(self.to_install),
+        }
+
+
+def _carry_over(node_instances, previous_instances, intact):
+    # reuse the instances of untouched nodes, and point host and
+    # relationship targets of every new instance at the reused IDs
+    previous_by_node, new_by_node = {}, {}
+    for instance in previous_instances:
+        previous_by_node.setdefault(instance['node_id'], []).append(instance)
+    for instance in node_instances:
+        new_by_node.setdefault(instance['node_id'], []).append(instance)
+
+    # instances are paired by position within their node: both lists
+    # are in plan order, and the DSL lays the instances of a node out
+    # by position in its containment tree. An intact node depends only
+    # on intact nodes (dependents of changed nodes are reinstalled), so
+    # its k-th instance has the same host and targets in both plans.
+    # Sorting the random instance IDs would pair them arbitrarily.
+    renamed, previous_of = {}, {}
+    for node_id in intact:
+        previous = previous_by_node.get(node_id, [])
+        new = new_by_node.get(node_id, [])
+        if len(previous) != len(new):
+            continue
+        for previous_instance, new_instance in zip(previous, new):
+            renamed[new_instance['id']] = previous_instance['id']
+            previous_of[new_instance['id']] = previous_instance
+
+    for instance in node_instances:
+        previous = previous_of.get(instance['id'])
+        if previous is not None:
+            for key in ('runtime_properties', 'state', 'version'):
+                if key in previous:
+                    instance[key] = previous[key]
+        instance['id'] = renamed.get(instance['id'], instance['id'])
+        if instance.get('host_id') in renamed:
+            instance['host_id'] = renamed[instance['host_id']]
+        for relationship in instance.get('relationships') or []:
+            if relationship.get('target_id') in renamed:
+                relationship['target_id'] = renamed[relationship['target_id']]
+    return node_instances
+
+
+def _in_plan_order(node_instances, plan):
+    position = dict((instance['id'], index) for index, instance in
+                    enumerate(plan.get('node_instances') or []))
+    return sorted((dict(instance) for instance in node_instances),
+                  key=lambda i: (position.get(i['id'], len(position)),
+                                 i['id']))
+
+
+def _preserve_instances(storage, previous_instances, intact):
+    init = storage.init
+
+    def preserving_init(name, plan, nodes, node_instances,
+                        blueprint_path, provider_context):
+        node_instances = _carry_over(node_instances,
+                                     previous_instances, intact)
+        if plan.get('node_instances') is not None:
+            plan['node_instances'] = [dict(instance)
+                                      for instance in node_instances]
+        return init(name, plan, nodes, node_instances,
+                    blueprint_path, provider_context)
+
+    storage.init = preserving_init
+    return storage
+
+
+def _run_nodes_workflow(environment, workflow_id, node_ids,
+                        blueprint_id, storage_path, execute_kwargs):
+    plan_workflows = environment.plan['workflows']
+    if workflow_id not in plan_workflows:
+        plan_workflows[workflow_id] = {
+            'operation': _WORKFLOWS[workflow_id],
+            'plugin': 'default_workflows',
+            'parameters': {'node_ids': {'default': []}},
+        }
+    return workflows.generic_execute(
+        blueprint_id=blueprint_id,
+        workflow_id=workflow_id,
+        parameters={'node_ids': sorted(node_ids)},
+        environment=environment,
+        storage_path=storage_path,
+        **execute_kwargs)
+
+
+def diff(environment, blueprint_path, inputs=None, storage_path=None):
+    """
+    Diffs an installed blueprint against a new blueprint
+    :param environment: aria_local environment of the installed blueprint
+    :param blueprint_path: path to the new blueprint
+    :type blueprint_path: str
+    :param inputs: deployment inputs of the new blueprint
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :return: PlanDiff
+    """
+    new_plan = futures.aria_dsl_tasks.prepare_deployment_plan(
+        plan_cache.parse_from_path(
+            blueprint_path, resolver=utils.get_import_resolver(),
+            storage_path=storage_path),
+        inputs=utils.inputs_to_dict(inputs, 'inputs') or {})
+    unhealthy = set(instance['node_id'] for instance in
+                    environment.storage.get_node_instances()
+                    if instance.get('state') != STARTED)
+    return PlanDiff(environment.plan, new_plan, unhealthy=unhealthy)
+
+
+def update(blueprint_id,
+           blueprint_path,
+           inputs=None,
+           install_plugins=False,
+           dry_run=False,
+           storage_path=None,
+           storage_backend=None,
+           env_cache=None,
+           **execute_kwargs):
+    """
+    Redeploys only what changed in a blueprint
+    :param blueprint_id: Blueprint ID
+    :type blueprint_id: str
+    :param blueprint_path: path to the new blueprint
+    :type blueprint_path: str
+    :param inputs: deployment inputs of the new blueprint
+    :param install_plugins: install plugins of the new blueprint
+    :type install_plugins: bool
+    :param dry_run: only compute what would change
+    :type dry_run: bool
+    :param execute_kwargs: task_retries, task_retry_interval,
+                           allow_custom_parameters and retry_policy
+    :return: PlanDiff
+    """
+    environment = blueprints.load_blueprint_storage_env(
+        blueprint_id, storage_path=storage_path,
+        storage_backend=storage_backend, env_cache=env_cache)
+    plan_diff = diff(environment, blueprint_path, inputs=inputs,
+                     storage_path=storage_path)
+    LOG.info('Update of {0}: {1}'.format(
+        blueprint_id, json.dumps(plan_diff.to_dict(), sort_keys=True)))
+    if dry_run or plan_diff.is_empty:
+        return plan_diff
+
+    if plan_diff.to_uninstall:
+        _run_nodes_workflow(environment, UNINSTALL_NODES_WORKFLOW,
+                            plan_diff.to_uninstall, blueprint_id,
+                            storage_path, execute_kwargs)
+    previous_instances = _in_plan_order(
+        environment.storage.get_node_instances(), environment.plan)
+    if env_cache is not None:
+        env_cache.invalidate(blueprint_id, storage_path=storage_path)
+
+    # the new plan replaces the deployment folder of the storage,
+    # the old one is put back if initializing the new plan fails
+    deployment_dir = os.path.join(
+        utils.storage_dir(blueprint_id, storage_path=storage_path),
+        blueprint_id)
+    previous_dir = deployment_dir + '.previous'
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    os.rename(deployment_dir, previous_dir)
+    try:
+        storage = _preserve_instances(
+            blueprints.init_blueprint_storage(
+                blueprint_id, storage_path=storage_path,
+                storage_backend=storage_backend),
+            previous_instances, plan_diff.intact)
+        # plugins are installed the way the blueprint was initialized
+        environment = blueprints.initialize_blueprint(
+            blueprint_path, blueprint_id, storage,
+            install_plugins=install_plugins,
+            inputs=inputs,
+            storage_path=storage_path,
+            **blueprints.plugin_options(blueprint_id,
+                                        storage_path=storage_path))
+    except BaseException:
+        shutil.rmtree(deployment_dir, ignore_errors=True)
+        os.rename(previous_dir, deployment_dir)
+        raise
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+    if plan_diff.to_install:
+        _run_nodes_workflow(environment, INSTALL_NODES_WORKFLOW,
+                            plan_diff.to_install, blueprint_id,
+                            storage_path, execute_kwargs)
+    return plan_diff
@@ -0,0 +1,49 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Workflows of incremental redeploys, run by aria_local.
+
+Only imported while such a workflow executes, the workflow engine
+is imported along with this module.
+"""
+
+from aria_core.dependencies import futures
+
+
+def _partition(ctx, node_ids):
+    node_ids = set(node_ids)
+    instances, intact = set(), set()
+    for node in ctx.nodes:
+        (instances if node.id in node_ids else intact).update(
+            node.instances)
+    return instances, intact
+
+
+@futures.aria_workflow
+def install_nodes(ctx, node_ids, **kwargs):
+    instances, intact = _partition(ctx, node_ids)
+    if instances:
+        # intact instances get the relationship operations
+        # of their relationships with the installed ones
+        futures.aria_lifecycle.install_node_instances(
+            ctx.graph_mode(), instances, intact)
+
+
+@futures.aria_workflow
+def uninstall_nodes(ctx, node_ids, **kwargs):
+    instances, intact = _partition(ctx, node_ids)
+    if instances:
+        futures.aria_lifecycle.uninstall_node_instances(
+            ctx.graph_mode(), instances, intact)
@@ -0,0 +1,240 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Retry policies of workflow tasks.
+
+Local workflows retry a failed task after a fixed interval. While an
+execution runs with a retry policy, the retries of its tasks are
+scheduled with exponential backoff instead: the n-th retry of an
+operation waits initial_delay * backoff ** (n - 1) seconds, capped at
+max_delay and randomized by the jitter. A retry a plugin asked for
+(OperationRetry with retry_after) never waits less than it asked for.
+Retries are not slept on, the task graph holds the retried task until
+its time comes and keeps running the other tasks meanwhile.
+"""
+
+import contextlib
+import random
+import threading
+import time
+
+from aria_core import constants
+from aria_core import event_log
+from aria_core import exceptions
+from aria_core import logger
+from aria_core.dependencies import futures
+
+LOG = logger.logging.getLogger(__name__)
+
+NO_JITTER = 'none'
+# uniform in [0, delay]
+FULL_JITTER = 'full'
+# uniform in [delay / 2, delay]
+EQUAL_JITTER = 'equal'
+JITTERS = (NO_JITTER, FULL_JITTER, EQUAL_JITTER)
+
+
+class RetryPolicy(object):
+
+    def __init__(self,
+                 max_retries=constants.WORKFLOW_TASK_RETRIES,
+                 initial_delay=constants.WORKFLOW_TASK_RETRY_INITIAL_DELAY,
+                 backoff=constants.WORKFLOW_TASK_RETRY_BACKOFF,
+                 max_delay=constants.WORKFLOW_TASK_RETRY_MAX_DELAY,
+                 jitter=FULL_JITTER,
+                 overrides=None):
+        """
+        Retry policy of workflow tasks
+        :param max_retries: retries of a task, -1 for no limit
+        :type max_retries: int
+        :param initial_delay: seconds before the first retry
+        :type initial_delay: float
+        :param backoff: growth factor of the delay between retries
+        :type backoff: float
+        :param max_delay: upper bound of the delay in seconds
+        :type max_delay: float
+        :param jitter: none, full or equal
+        :type jitter: str
+        :param overrides: per operation overrides of initial_delay,
+                          backoff, max_delay and jitter, by full
+                          (cloudify.interfaces.lifecycle.create) or
+                          short (create) operation name
+        :type overrides: dict
+        :return: None
+        """
+        if jitter not in JITTERS:
+            raise exceptions.AriaValidationError(
+                'Unknown jitter {0}, expected one of {1}'.format(
+                    jitter, ', '.join(JITTERS)))
+        if initial_delay < 0 or max_delay < 0 or backoff < 1:
+            raise exceptions.AriaValidationError(
+                'Retry delays must not be negative '
+                'and backoff must be at least 1')
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.overrides = {}
+        for operation, override in (overrides or {}).items():
+            if isinstance(override, RetryPolicy):
+                override = override.to_dict()
+            settings = self.to_dict()
+            settings.update(override)
+            settings.pop('overrides', None)
+            self.overrides[operation] = RetryPolicy(**settings)
+
+    @classmethod
+    def from_dict(cls, settings):
+        return cls(**settings)
+
+    def to_dict(self):
+        settings = {
+            'max_retries': self.max_retries,
+            'initial_delay': self.initial_delay,
+            'backoff': self.backoff,
+            'max_delay': self.max_delay,
+            'jitter': self.jitter,
+        }
+        if self.overrides:
+            settings['overrides'] = dict(
+                (operation, policy.to_dict())
+                for operation, policy in self.overrides.items())
+        return settings
+
+    def for_operation(self, operation):
+        if not operation:
+            return self
+        return (self.overrides.get(operation) or
+                self.overrides.get(operation.split('.')[-1]) or
+                self)
+
+    def delay(self, retry_number, operation=None, rng=random):
+        """
+        Seconds to wait before a retry
+        :param retry_number: 1 for the first retry
+        :type retry_number: int
+        :param operation: operation name, for its override
+        :type operation: str
+        :return: float
+        """
+        policy = self.for_operation(operation)
+        delay = min(policy.max_delay, policy.initial_delay *
+                    policy.backoff ** max(retry_number - 1, 0))
+        if policy.jitter == FULL_JITTER:
+            return rng.uniform(0, delay)
+        if policy.jitter == EQUAL_JITTER:
+            return delay / 2.0 + rng.uniform(0, delay / 2.0)
+        return float(delay)
+
+
+def policy_from(retry_policy):
+    """
+    :param retry_policy: RetryPolicy, its dict or None
+    :return: RetryPolicy or None
+    """
+    if retry_policy is None or isinstance(retry_policy, RetryPolicy):
+        return retry_policy
+    return RetryPolicy.from_dict(retry_policy)
+
+
+# execution ID -> RetryPolicy of the running execution
+_policies = {}
+_lock = threading.Lock()
+_hooks_installed = False
+
+
+def _operation(task):
+    operation = (getattr(task, 'cloudify_context', None) or {}).get(
+        'operation')
+    if isinstance(operation, dict):
+        return operation.get('name')
+    return operation
+
+
+def _requested_delay(task):
+    # the error of a task the plugin asked to retry is
+    # an OperationRetry, the task already terminated
+    async_result = getattr(task, 'async_result', None)
+    if async_result is None:
+        return None
+    try:
+        error = async_result.result
+    except Exception as e:
+        error = e
+    if isinstance(error, futures.aria_aside_exceptions.OperationRetry):
+        return error.retry_after
+    return None
+
+
+def _scheduling(duplicate_for_retry):
+    def scheduling_duplicate_for_retry(self, execute_after, *args, **kwargs):
+        deployment = getattr(getattr(self, 'workflow_context', None),
+                             'deployment', None)
+        policy = _policies.get(event_log.running_execution(
+            getattr(deployment, 'id', None)))
+        if policy is not None:
+            delay = policy.delay(self.current_retries + 1,
+                                 operation=_operation(self))
+            requested = _requested_delay(self)
+            if requested is not None:
+                delay = max(delay, requested)
+            execute_after = time.time() + delay
+            LOG.debug('Retry {0} of {1} in {2:.3f}s'.format(
+                self.current_retries + 1, _operation(self), delay))
+        return duplicate_for_retry(self, execute_after, *args, **kwargs)
+    scheduling_duplicate_for_retry.aria_scheduling = True
+    return scheduling_duplicate_for_retry
+
+
+def _install_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    tasks = futures.aria_workflow_tasks
+    for class_name in ('WorkflowTask', 'RemoteWorkflowTask',
+                       'LocalWorkflowTask'):
+        cls = getattr(tasks, class_name, None)
+        # only where it is defined, subclasses inherit the wrapper
+        duplicate_for_retry = (cls.__dict__.get('duplicate_for_retry')
+                               if cls is not None else None)
+        if duplicate_for_retry is not None and not getattr(
+                duplicate_for_retry, 'aria_scheduling', False):
+            cls.duplicate_for_retry = _scheduling(duplicate_for_retry)
+    _hooks_installed = True
+
+
+@contextlib.contextmanager
+def scheduling(execution_id, retry_policy):
+    """
+    Schedules the task retries of a running
+    execution with a retry policy
+    :param execution_id: Execution ID
+    :type execution_id: str
+    :param retry_policy: RetryPolicy, None keeps fixed intervals
+    :type retry_policy: RetryPolicy
+    """
+    if retry_policy is None:
+        yield
+        return
+    with _lock:
+        _install_hooks()
+        _policies[execution_id] = retry_policy
+    try:
+        yield
+    finally:
+        with _lock:
+            if _policies.get(execution_id) is retry_policy:
+                del _policies[execution_id]
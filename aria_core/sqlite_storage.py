@@ -0,0 +1,291 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+SQLite-backed deployment storage.
+
+The plan, resources and workdir stay where FileStorage keeps them;
+node instances live in a single SQLite database (WAL journal) indexed
+by node_id and state, instead of one JSON file per instance.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+from aria_core import logger
+from aria_core import utils
+from aria_core.dependencies import futures
+
+LOG = logger.logging.getLogger(__name__)
+
+DATABASE_FILE_NAME = 'node-instances.db'
+FILE_INSTANCES_DIR_NAME = 'node-instances'
+QUERY_PAGE_SIZE = 500
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS node_instances ('
+    ' id TEXT PRIMARY KEY,'
+    ' node_id TEXT NOT NULL,'
+    ' state TEXT,'
+    ' host_id TEXT,'
+    ' version INTEGER,'
+    ' data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS node_instances_node_id'
+    ' ON node_instances (node_id)',
+    'CREATE INDEX IF NOT EXISTS node_instances_state'
+    ' ON node_instances (state)',
+    'CREATE INDEX IF NOT EXISTS node_instances_host_id'
+    ' ON node_instances (host_id)',
+)
+
+_UPSERT = ('INSERT OR REPLACE INTO node_instances'
+           ' (id, node_id, state, host_id, version, data)'
+           ' VALUES (?, ?, ?, ?, ?, ?)')
+
+# applied only while the instance still has the version it was read
+# with, another process may update it in between
+_UPDATE_IF_VERSION = ('UPDATE node_instances SET'
+                      ' node_id = ?, state = ?, host_id = ?,'
+                      ' version = ?, data = ?'
+                      ' WHERE id = ? AND version IS ?')
+
+
+def database_path(storage_dir, name):
+    return os.path.join(storage_dir, name, DATABASE_FILE_NAME)
+
+
+class _Database(object):
+    """
+    Per-thread connections to one database file,
+    writes of a thread within batch() share one transaction
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._local.connection = connection
+            self._local.batch_depth = 0
+        return connection
+
+    @contextlib.contextmanager
+    def batch(self):
+        connection = self.connection()
+        self._local.batch_depth += 1
+        try:
+            yield connection
+        except BaseException:
+            self._local.batch_depth -= 1
+            if not self._local.batch_depth:
+                connection.rollback()
+            raise
+        self._local.batch_depth -= 1
+        if not self._local.batch_depth:
+            connection.commit()
+
+    def store(self, rows):
+        with self.batch() as connection:
+            connection.executemany(_UPSERT, rows)
+
+    def query(self, statement, parameters=()):
+        return self.connection().execute(statement, parameters).fetchall()
+
+
+def _in_clause(column, values, clauses, parameters):
+    if values:
+        clauses.append('{0} IN ({1})'.format(
+            column, ', '.join('?' * len(values))))
+        parameters.extend(values)
+
+
+def _instance_row(node_instance):
+    return (node_instance['id'],
+            node_instance['node_id'],
+            node_instance.get('state'),
+            node_instance.get('host_id'),
+            node_instance.get('version'),
+            json.dumps(node_instance))
+
+
+class SQLiteStorage(futures.aria_local.FileStorage):
+    """
+    FileStorage keeps the plan, nodes and resources of a deployment,
+    the public node instance methods are served from SQLite
+    """
+
+    def __init__(self, storage_dir):
+        super(SQLiteStorage, self).__init__(storage_dir=storage_dir)
+        self._sqlite_storage_dir = storage_dir
+        self._database = None
+        self._update_lock = threading.RLock()
+
+    def _open_database(self, name):
+        if self._database is None:
+            self._database = _Database(
+                database_path(self._sqlite_storage_dir, name))
+        return self._database
+
+    def init(self, name, plan, nodes, node_instances,
+             blueprint_path, provider_context):
+        # no instance goes through FileStorage, the initial
+        # instances are written in one transaction instead
+        super(SQLiteStorage, self).init(
+            name, plan, nodes, [], blueprint_path, provider_context)
+        self._open_database(name).store(
+            [_instance_row(instance) for instance in node_instances])
+
+    def load(self, name):
+        self._open_database(name)
+        super(SQLiteStorage, self).load(name)
+
+    def _instance_data(self, node_instance_id):
+        rows = self._database.query(
+            'SELECT data FROM node_instances WHERE id = ?',
+            (node_instance_id,))
+        if not rows:
+            raise RuntimeError('Instance {0} does not exist'
+                               .format(node_instance_id))
+        return json.loads(rows[0][0])
+
+    def get_node_instance(self, node_instance_id):
+        return futures.aria_local.NodeInstance(
+            self._instance_data(node_instance_id))
+
+    def update_node_instance(self, node_instance_id, version,
+                             runtime_properties=None, state=None):
+        updated = 0
+        while not updated:
+            with self._update_lock, \
+                    self._database.batch() as connection:
+                instance = self._instance_data(node_instance_id)
+                current_version = instance.get('version')
+                if state is None and version != current_version:
+                    raise futures.aria_local.StorageConflictError(
+                        'version {0} does not match current version of '
+                        'node instance {1} which is {2}'.format(
+                            version, node_instance_id, current_version))
+                instance['version'] = (current_version or 0) + 1
+                if runtime_properties is not None:
+                    instance['runtime_properties'] = runtime_properties
+                if state is not None:
+                    instance['state'] = state
+                updated = connection.execute(
+                    _UPDATE_IF_VERSION,
+                    _instance_row(instance)[1:] +
+                    (node_instance_id, current_version)).rowcount
+
+    def get_node_instances(self, node_id=None):
+        if node_id:
+            rows = self._database.query(
+                'SELECT data FROM node_instances'
+                ' WHERE node_id = ? ORDER BY id', (node_id,))
+        else:
+            rows = self._database.query(
+                'SELECT data FROM node_instances ORDER BY id')
+        return [futures.aria_local.NodeInstance(json.loads(row[0]))
+                for row in rows]
+
+    def query_node_instances(self, node_ids=None, states=None,
+                             host_ids=None, after=None, limit=None):
+        """
+        Streams node instances matching every given filter, ordered by ID.
+        Rows are read page by page (keyset on the ID), so memory
+        stays bounded by the page size.
+        """
+        clauses, parameters = [], []
+        _in_clause('node_id', node_ids, clauses, parameters)
+        _in_clause('state', states, clauses, parameters)
+        _in_clause('host_id', host_ids, clauses, parameters)
+        clauses.append('id > ?')
+        statement = ('SELECT id, data FROM node_instances WHERE {0}'
+                     ' ORDER BY id LIMIT ?'.format(' AND '.join(clauses)))
+        remaining = limit
+        last_id = after or ''
+        while remaining is None or remaining > 0:
+            page_size = (QUERY_PAGE_SIZE if remaining is None
+                         else min(QUERY_PAGE_SIZE, remaining))
+            rows = self._database.query(
+                statement, parameters + [last_id, page_size])
+            for row in rows:
+                yield futures.aria_local.NodeInstance(json.loads(row[1]))
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+def create(storage_dir):
+    return SQLiteStorage(storage_dir)
+
+
+def migrate_file_storage(storage_dir, name, remove_files=False):
+    """
+    Moves node instances of a FileStorage deployment into SQLite
+    :param storage_dir: storage folder of the deployment
+    :type storage_dir: str
+    :param name: deployment name (Blueprint ID)
+    :type name: str
+    :param remove_files: remove the JSON instance files afterwards
+    :type remove_files: bool
+    :return: number of migrated node instances
+    """
+    instances_dir = os.path.join(storage_dir, name, FILE_INSTANCES_DIR_NAME)
+    if not os.path.isdir(instances_dir):
+        return 0
+    rows = []
+    for instance_file in sorted(os.listdir(instances_dir)):
+        with open(os.path.join(instances_dir, instance_file)) as f:
+            rows.append(_instance_row(json.load(f)))
+    _Database(database_path(storage_dir, name)).store(rows)
+    if remove_files:
+        for instance_file in os.listdir(instances_dir):
+            os.remove(os.path.join(instances_dir, instance_file))
+    LOG.info('Migrated {0} node instances of {1} to SQLite'
+             .format(len(rows), name))
+    return len(rows)
+
+
+def migrate(storage_path=None, remove_files=False):
+    """
+    Moves node instances of every FileStorage deployment
+    under an Aria CORE storage folder into SQLite
+    :param storage_path: Aria CORE storage folder
+    :type storage_path: str
+    :param remove_files: remove the JSON instance files afterwards
+    :type remove_files: bool
+    :return: dict of Blueprint ID to number of migrated node instances
+    """
+    root = os.path.join(storage_path or os.getcwd(), utils.STORAGE_DIR_NAME)
+    migrated = {}
+    if not os.path.isdir(root):
+        return migrated
+    for blueprint_id in sorted(os.listdir(root)):
+        storage_dir = utils.storage_dir(blueprint_id,
+                                        storage_path=storage_path)
+        migrated[blueprint_id] = migrate_file_storage(
+            storage_dir, blueprint_id, remove_files=remove_files)
+    return migrated
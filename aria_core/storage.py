@@ -0,0 +1,136 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Deployment storage backends.
+"""
+
+from aria_core import exceptions
+from aria_core.dependencies import futures
+
+FILE_BACKEND = 'file'
+SQLITE_BACKEND = 'sqlite'
+
+DEFAULT_BACKEND = FILE_BACKEND
+
+
+def _file_storage(storage_dir):
+    return futures.aria_local.FileStorage(storage_dir=storage_dir)
+
+
+def _sqlite_storage(storage_dir):
+    from aria_core import sqlite_storage
+    return sqlite_storage.create(storage_dir)
+
+
+_backends = {
+    FILE_BACKEND: _file_storage,
+    SQLITE_BACKEND: _sqlite_storage,
+}
+
+
+def register_backend(name, factory):
+    """
+    Registers a storage backend
+    :param name: backend name
+    :type name: str
+    :param factory: callable that takes a storage folder
+                    and returns an aria_local storage
+    :return: None
+    """
+    _backends[name] = factory
+
+
+def create_storage(storage_dir, backend=None):
+    try:
+        factory = _backends[backend or DEFAULT_BACKEND]
+    except KeyError:
+        raise exceptions.AriaValidationError(
+            'Unknown storage backend: {0}, available backends: {1}'
+            .format(backend, ', '.join(sorted(_backends))))
+    return factory(storage_dir)
+
+
+def _as_set(values):
+    if values is None:
+        return None
+    if isinstance(values, (str, type(u''))):
+        return set([values])
+    return set(values)
+
+
+def _matches(node_instance, node_ids, states, host_ids):
+    return ((node_ids is None or node_instance.get('node_id') in node_ids) and
+            (states is None or node_instance.get('state') in states) and
+            (host_ids is None or node_instance.get('host_id') in host_ids))
+
+
+def _scan_node_instances(storage, node_ids, states, host_ids, after):
+    if not hasattr(storage, '_instance_ids'):
+        for node_instance in sorted(storage.get_node_instances(),
+                                    key=lambda i: i['id']):
+            if after is None or node_instance['id'] > after:
+                yield node_instance
+        return
+    for instance_id in sorted(storage._instance_ids()):
+        if after is not None and instance_id <= after:
+            continue
+        # instance IDs are '<node_id>_<suffix>', instances of other
+        # nodes are skipped without reading their files
+        if (node_ids is not None and
+                instance_id.rsplit('_', 1)[0] not in node_ids):
+            continue
+        node_instance = storage._load_instance(instance_id)
+        if node_instance is not None:
+            yield node_instance
+
+
+def query_node_instances(storage, node_ids=None, states=None,
+                         host_ids=None, after=None, limit=None):
+    """
+    Streams node instances of a deployment storage
+    :param storage: aria_local storage
+    :param node_ids: node ID or list of node IDs
+    :param states: state or list of states
+    :param host_ids: host instance ID or list of host instance IDs
+    :param after: node instance ID to continue after (page cursor)
+    :type after: str
+    :param limit: maximum number of node instances
+    :type limit: int
+    :return: generator of node instances, ordered by ID
+    """
+    node_ids, states, host_ids = (
+        _as_set(node_ids), _as_set(states), _as_set(host_ids))
+    if limit is not None and limit < 1:
+        return
+    if set() in (node_ids, states, host_ids):
+        # an empty filter matches nothing
+        return
+    if hasattr(storage, 'query_node_instances'):
+        for node_instance in storage.query_node_instances(
+                node_ids=node_ids and sorted(node_ids),
+                states=states and sorted(states),
+                host_ids=host_ids and sorted(host_ids),
+                after=after, limit=limit):
+            yield node_instance
+        return
+    count = 0
+    for node_instance in _scan_node_instances(
+            storage, node_ids, states, host_ids, after):
+        if not _matches(node_instance, node_ids, states, host_ids):
+            continue
+        yield node_instance
+        count += 1
+        if limit is not None and count >= limit:
+            return
@@ -13,6 +13,9 @@
 #    under the License.
 
 import contextlib
+import copy
+import errno
+import fcntl
 import os
 import sys
 import yaml
@@ -23,6 +26,7 @@ from jinja2 import environment
 from aria_core import constants
 from aria_core import exceptions
 from aria_core import logger_config
+from aria_core import wd_settings
 from aria_core.dependencies import futures
 
 STORAGE_DIR_NAME = 'local-storage'
@@ -133,18 +137,7 @@ def is_initialized():
 
 
 def get_init_path():
-    current_lookup_dir = get_cwd()
-    while True:
-
-        path = os.path.join(current_lookup_dir,
-                            constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
-
-        if os.path.exists(path):
-            return path
-        else:
-            if os.path.dirname(current_lookup_dir) == current_lookup_dir:
-                return None
-            current_lookup_dir = os.path.dirname(current_lookup_dir)
+    return wd_settings.get_init_path(get_cwd())
 
 
 def get_configuration_path():
@@ -184,6 +177,8 @@ def dump_aria_working_dir_settings(cosmo_wd_settings=None, update=False):
                             constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
         if not os.path.exists(path):
             os.mkdir(path)
+        # forgets a remembered miss of this folder as well
+        wd_settings.invalidate()
         target_file_path = os.path.join(
             get_cwd(), constants.ARIA_WD_SETTINGS_DIRECTORY_NAME,
             constants.ARIA_WD_SETTINGS_FILE_NAME)
@@ -196,13 +191,35 @@ def get_import_resolver():
     if not is_initialized():
         return None
 
-    config = logger_config.AriaConfig()
+    config = logger_config.get_config()
     # get the resolver configuration from the config file
-    local_import_resolver = config.local_import_resolver
+    # the parser expects plain lists and dicts
+    local_import_resolver = copy.deepcopy(config.local_import_resolver)
     return futures.aria_dsl_utils.create_import_resolver(
         local_import_resolver)
 
 
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive lock on a file, yields whether it was acquired,
+    which is always the case unless blocking is False
+    """
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking
+                        else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            if blocking or e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 @contextlib.contextmanager
 def update_wd_settings():
     cosmo_wd_settings = load_aria_working_dir_settings()
@@ -270,6 +287,45 @@ def venv_path(blueprint_id, storage_path=None):
     return os.path.join(*parts)
 
 
+def events_dir(blueprint_id, storage_path=None):
+    parts = storage_dir(blueprint_id,
+                        storage_path=storage_path), constants.EVENTS_DIR_NAME
+    return os.path.join(*parts)
+
+
+def checkpoints_dir(blueprint_id, storage_path=None):
+    parts = (storage_dir(blueprint_id, storage_path=storage_path),
+             constants.CHECKPOINTS_DIR_NAME)
+    return os.path.join(*parts)
+
+
+def plugin_options_path(blueprint_id, storage_path=None):
+    parts = (storage_dir(blueprint_id, storage_path=storage_path),
+             constants.PLUGIN_OPTIONS_FILE_NAME)
+    return os.path.join(*parts)
+
+
+def plugin_envs_dir(storage_path=None):
+    parts = ([os.getcwd(), constants.PLUGIN_ENVS_DIR_NAME]
+             if not storage_path else
+             [storage_path, constants.PLUGIN_ENVS_DIR_NAME])
+    return os.path.join(*parts)
+
+
+def plan_cache_dir(storage_path=None):
+    parts = ([os.getcwd(), constants.PLAN_CACHE_DIRECTORY_NAME]
+             if not storage_path else
+             [storage_path, constants.PLAN_CACHE_DIRECTORY_NAME])
+    return os.path.join(*parts)
+
+
+def wheelhouse_dir(storage_path=None):
+    parts = ([os.getcwd(), constants.WHEELHOUSE_DIR_NAME]
+             if not storage_path else
+             [storage_path, constants.WHEELHOUSE_DIR_NAME])
+    return os.path.join(*parts)
+
+
 def storage_dir(blueprint_id, storage_path=None):
     parts = ([os.getcwd(), STORAGE_DIR_NAME, blueprint_id]
              if not storage_path else
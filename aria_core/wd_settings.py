@@ -0,0 +1,103 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Discovery of the Aria working directory settings folder.
+
+The folder is looked up from the current directory up to the root and
+the outcome is remembered per directory until invalidated, which
+creating or removing a settings folder through Aria does. A remembered
+folder that disappeared is looked up again. An explicit working
+directory, set for the calls of one API object, skips the discovery.
+"""
+
+import contextlib
+import os
+import threading
+
+from aria_core import constants
+
+_lock = threading.Lock()
+_init_paths = {}
+_local = threading.local()
+
+
+def _settings_path(directory):
+    path = os.path.join(directory,
+                        constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
+    return path if os.path.exists(path) else None
+
+
+def get_init_path(cwd=None):
+    """
+    Path to the settings folder
+    :param cwd: directory to start the lookup from, defaults to the cwd
+    :type cwd: str
+    :return: path, or None if not initialized
+    """
+    working_dir = getattr(_local, 'working_dir', None)
+    if working_dir is not None:
+        return _settings_path(working_dir)
+    cwd = cwd or os.getcwd()
+    if cwd in _init_paths:
+        init_path = _init_paths[cwd]
+        if init_path is None or os.path.exists(init_path):
+            return init_path
+
+    visited = []
+    current_lookup_dir = cwd
+    while True:
+        visited.append(current_lookup_dir)
+        init_path = _settings_path(current_lookup_dir)
+        if init_path is not None:
+            break
+        if os.path.dirname(current_lookup_dir) == current_lookup_dir:
+            break
+        current_lookup_dir = os.path.dirname(current_lookup_dir)
+
+    # every folder on the way up resolves to the same outcome
+    with _lock:
+        for lookup_dir in visited:
+            _init_paths[lookup_dir] = init_path
+    return init_path
+
+
+def invalidate():
+    """
+    Forgets discovered settings folders, to be called
+    once a settings folder is created or removed
+    :return: None
+    """
+    with _lock:
+        _init_paths.clear()
+
+
+@contextlib.contextmanager
+def working_dir(path):
+    """
+    Uses a working directory instead of discovering it,
+    for the calls made by the current thread in the block
+    :param path: folder holding the settings folder,
+                 None keeps the current behaviour
+    :type path: str
+    """
+    if path is None:
+        yield
+        return
+    previous = getattr(_local, 'working_dir', None)
+    _local.working_dir = os.path.abspath(path)
+    try:
+        yield
+    finally:
+        _local.working_dir = previous
@@ -12,9 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import sys
 import os
+import uuid
 
+from aria_core import checkpoint
+from aria_core import event_log
+from aria_core import importer
+from aria_core import instrumentation
+from aria_core import parallelism
+from aria_core import retry
 from aria_core import utils
 
 
@@ -26,21 +32,43 @@ def generic_execute(blueprint_id=None,
                     task_retry_interval=None,
                     environment=None,
                     default_python_interpreter='python2.7',
-                    storage_path=None):
+                    storage_path=None,
+                    execution_id=None,
+                    retry_policy=None,
+                    concurrency=None,
+                    completed_tasks=None):
+    execution_id = execution_id or str(uuid.uuid4())
+    retry_policy = retry.policy_from(retry_policy)
+    if retry_policy is not None and task_retries is None:
+        task_retries = retry_policy.max_retries
     root_venv_path = utils.venv_path(blueprint_id,
                                      storage_path=storage_path)
     venv_path = os.path.join(root_venv_path, 'lib',
                              default_python_interpreter,
                              'site-packages')
-    sys.path.append(venv_path)
-    result = environment.execute(
-        workflow=workflow_id,
-        parameters=parameters,
-        allow_custom_parameters=allow_custom_parameters,
-        task_retries=task_retries,
-        task_retry_interval=task_retry_interval)
-    del sys.path[sys.path.index(venv_path)]
-    return result
+    execute_kwargs = dict(allow_custom_parameters=allow_custom_parameters,
+                          task_retries=task_retries,
+                          task_retry_interval=task_retry_interval)
+    task_thread_pool_size = parallelism.pool_size(
+        concurrency, environment, blueprint_id, storage_path=storage_path)
+    pool_kwargs = ({'task_thread_pool_size': task_thread_pool_size}
+                   if task_thread_pool_size is not None else {})
+    with importer.plugin_path(venv_path), event_log.record(
+            blueprint_id, execution_id, storage_path=storage_path), \
+            checkpoint.track(blueprint_id, execution_id, workflow_id,
+                             parameters, execute_kwargs,
+                             storage_path=storage_path,
+                             retry_policy=retry_policy,
+                             concurrency=concurrency), \
+            checkpoint.skipping(execution_id, completed_tasks), \
+            retry.scheduling(execution_id, retry_policy), \
+            parallelism.monitor(blueprint_id, execution_id,
+                                task_thread_pool_size), \
+            instrumentation.span('workflow'):
+        return environment.execute(
+            workflow=workflow_id,
+            parameters=parameters,
+            **dict(execute_kwargs, **pool_kwargs))
 
 
 def install(blueprint_id,
@@ -48,14 +76,22 @@ def install(blueprint_id,
             allow_custom_parameters=None,
             task_retries=None,
             task_retry_interval=None,
-            environment=None):
+            environment=None,
+            storage_path=None,
+            execution_id=None,
+            retry_policy=None,
+            concurrency=None):
     return generic_execute(blueprint_id=blueprint_id,
                            workflow_id='install',
                            parameters=parameters,
                            allow_custom_parameters=allow_custom_parameters,
                            task_retries=task_retries,
                            task_retry_interval=task_retry_interval,
-                           environment=environment)
+                           environment=environment,
+                           storage_path=storage_path,
+                           execution_id=execution_id,
+                           retry_policy=retry_policy,
+                           concurrency=concurrency)
 
 
 def uninstall(blueprint_id,
@@ -63,11 +99,19 @@ def uninstall(blueprint_id,
               allow_custom_parameters=None,
               task_retries=None,
               task_retry_interval=None,
-              environment=None):
+              environment=None,
+              storage_path=None,
+              execution_id=None,
+              retry_policy=None,
+              concurrency=None):
     return generic_execute(blueprint_id=blueprint_id,
                            workflow_id='uninstall',
                            parameters=parameters,
                            allow_custom_parameters=allow_custom_parameters,
                            task_retries=task_retries,
                            task_retry_interval=task_retry_interval,
-                           environment=environment)
+                           environment=environment,
+                           storage_path=storage_path,
+                           execution_id=execution_id,
+                           retry_policy=retry_policy,
+                           concurrency=concurrency)
@@ -0,0 +1,259 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Aria CORE API benchmarks.
+
+Generates a synthetic blueprint with stub plugins and measures the API
+calls on it, every scenario in a fresh interpreter so that peak RSS is
+its own. Prints (or writes) a JSON report with latency percentiles,
+throughput and peak RSS per scenario; --compare prints the change of
+the median latencies against a report of another revision.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import blueprint_generator  # noqa
+
+SCENARIOS = ('validate', 'create_requirements', 'initialize',
+             'install', 'outputs', 'instances', 'uninstall')
+
+CONFIG = '''logging:
+  filename: {logfile}
+  loggers: {{}}
+local_provider_context: {{}}
+'''
+
+
+def _percentile(samples, q):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+    return samples[index]
+
+
+def _summary(samples, work_items=1):
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'cold_seconds': samples[0],
+        'min_seconds': min(samples),
+        'p50_seconds': _percentile(samples, 0.5),
+        'p90_seconds': _percentile(samples, 0.9),
+        'p99_seconds': _percentile(samples, 0.99),
+        'max_seconds': max(samples),
+        'throughput_per_second': len(samples) / total if total else None,
+        'items_per_second': (len(samples) * work_items / total
+                             if total else None),
+    }
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _timed(samples, call, *args, **kwargs):
+    started = time.time()
+    result = call(*args, **kwargs)
+    samples.append(time.time() - started)
+    return result
+
+
+def run_scenario(scenario, blueprint_path, work_dir, iterations, nodes):
+    from aria_core import api
+
+    core = api.AriaCoreAPI(storage_path=work_dir, working_dir=work_dir)
+    blueprints, executions = core.blueprints, core.executions
+    samples = []
+    work_items = 1
+
+    def initialize(blueprint_id, timed=False):
+        call = blueprints.initialize
+        args = (blueprint_id, blueprint_path)
+        if timed:
+            return _timed(samples, call, *args)
+        return call(*args)
+
+    deployments = ['bench-{0}'.format(i) for i in range(iterations)]
+    if scenario == 'validate':
+        for _ in deployments:
+            _timed(samples, blueprints.validate, blueprint_path)
+    elif scenario == 'create_requirements':
+        for _ in deployments:
+            _timed(samples, blueprints.create_requirements, blueprint_path)
+    elif scenario == 'initialize':
+        for blueprint_id in deployments:
+            initialize(blueprint_id, timed=True)
+    elif scenario in ('install', 'uninstall'):
+        work_items = nodes
+        for blueprint_id in deployments:
+            initialize(blueprint_id)
+            if scenario == 'install':
+                _timed(samples, executions.install, blueprint_id)
+            else:
+                executions.install(blueprint_id)
+                _timed(samples, executions.uninstall, blueprint_id)
+    elif scenario in ('outputs', 'instances'):
+        blueprint_id = deployments[0]
+        initialize(blueprint_id)
+        executions.install(blueprint_id)
+        call = getattr(blueprints, scenario)
+        for _ in deployments:
+            _timed(samples, call, blueprint_id)
+    else:
+        raise ValueError('Unknown scenario: {0}'.format(scenario))
+
+    report = _summary(samples, work_items=work_items)
+    report['peak_rss_bytes'] = _peak_rss_bytes()
+    return report
+
+
+def _prepare_work_dir(root, scenario):
+    work_dir = os.path.join(root, scenario)
+    settings_dir = os.path.join(work_dir, '.aria')
+    os.makedirs(settings_dir)
+    with open(os.path.join(settings_dir, 'config.yaml'), 'w') as f:
+        f.write(CONFIG.format(
+            logfile=os.path.join(work_dir, 'aria.log')))
+    return work_dir
+
+
+def _revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=BENCHMARKS_DIR,
+            stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_worker(args, scenario, blueprint_path, root):
+    work_dir = _prepare_work_dir(root, scenario)
+    env = dict(os.environ)
+    # stub plugins are imported from their source folders
+    plugin_paths = [
+        os.path.join(blueprint_generator.plugins_dir(root), name)
+        for name in sorted(os.listdir(
+            blueprint_generator.plugins_dir(root)))]
+    env['PYTHONPATH'] = os.pathsep.join(
+        plugin_paths + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--worker', scenario,
+         '--blueprint', blueprint_path, '--work-dir', work_dir,
+         '--iterations', str(args.iterations), '--nodes', str(args.nodes)],
+        cwd=work_dir, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def compare(report, baseline):
+    lines = []
+    for scenario, result in sorted(report['scenarios'].items()):
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous or 'p50_seconds' not in previous or \
+                'p50_seconds' not in result:
+            continue
+        ratio = result['p50_seconds'] / previous['p50_seconds']
+        lines.append('{0:<20} p50 {1:.4f}s -> {2:.4f}s ({3:+.1%})'.format(
+            scenario, previous['p50_seconds'],
+            result['p50_seconds'], ratio - 1))
+    return os.linesep.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='scenario to run, all by default')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--fan-out', type=int, default=2)
+    parser.add_argument('--import-depth', type=int, default=1)
+    parser.add_argument('--plugins', type=int, default=2)
+    parser.add_argument('--dsl-version',
+                        default=blueprint_generator.DEFAULT_DSL_VERSION)
+    parser.add_argument('--output', help='file to write the report to')
+    parser.add_argument('--compare', help='report of another revision')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the generated files')
+    # internal, runs one scenario and prints its result
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--blueprint', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scenario(args.worker, args.blueprint,
+                                      args.work_dir, args.iterations,
+                                      args.nodes)))
+        return 0
+
+    root = tempfile.mkdtemp(prefix='aria-benchmarks-')
+    try:
+        blueprint_path = blueprint_generator.generate(
+            root,
+            nodes=args.nodes,
+            fan_out=args.fan_out,
+            import_depth=args.import_depth,
+            plugins=args.plugins,
+            dsl_version=args.dsl_version)
+        report = {
+            'revision': _revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': {
+                'iterations': args.iterations,
+                'nodes': args.nodes,
+                'fan_out': args.fan_out,
+                'import_depth': args.import_depth,
+                'plugins': args.plugins,
+            },
+            'scenarios': {},
+        }
+        for scenario in args.scenario or SCENARIOS:
+            try:
+                result = _run_worker(args, scenario, blueprint_path, root)
+            except subprocess.CalledProcessError as e:
+                result = {'error': 'exit code {0}'.format(e.returncode)}
+            report['scenarios'][scenario] = result
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    document = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(document)
+    else:
+        print(document)
+    if args.compare:
+        with open(args.compare) as f:
+            sys.stderr.write(compare(report, json.load(f)) + os.linesep)
+    return 1 if any('error' in result
+                    for result in report['scenarios'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Synthetic blueprint generator.
+
+Writes a self-contained blueprint with a configurable number of nodes,
+relationships per node, import depth and plugins. Plugins are no-op
+stubs generated next to the blueprint, so that the install and
+uninstall workflows run fully offline.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+DEFAULT_DSL_VERSION = 'cloudify_dsl_1_2'
+
+LIFECYCLE_OPERATIONS = ('create', 'configure', 'start', 'stop', 'delete')
+RELATIONSHIP_OPERATIONS = ('preconfigure', 'postconfigure',
+                           'establish', 'unlink')
+
+STUB_PLUGIN_MODULE = '''from cloudify.decorators import operation
+
+
+@operation
+def noop(**kwargs):
+    pass
+'''
+
+STUB_PLUGIN_SETUP = '''from setuptools import setup
+
+setup(name='{name}', version='0.1', packages=['{name}'])
+'''
+
+
+def plugin_name(index):
+    return 'aria_bench_plugin_{0}'.format(index)
+
+
+def plugins_dir(directory):
+    return os.path.join(directory, 'plugins')
+
+
+def _write(path, content):
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _dump(path, document):
+    # JSON is a subset of YAML, no YAML writer needed
+    _write(path, json.dumps(document, indent=2, sort_keys=True))
+
+
+def _write_stub_plugin(directory, name):
+    root = os.path.join(plugins_dir(directory), name)
+    _write(os.path.join(root, 'setup.py'), STUB_PLUGIN_SETUP.format(name=name))
+    _write(os.path.join(root, name, '__init__.py'), STUB_PLUGIN_MODULE)
+
+
+def _operations(names, plugin):
+    return dict((name, '{0}.{0}.noop'.format(plugin)) for name in names)
+
+
+def _types_document(plugins, install_plugins):
+    return {
+        'plugins': dict(
+            [('default_workflows', {
+                'executor': 'central_deployment_agent',
+                'install': False,
+            })] +
+            [(plugin, {
+                'executor': 'central_deployment_agent',
+                'source': plugin,
+                'install': install_plugins,
+            }) for plugin in plugins]),
+        'workflows': {
+            'install': 'default_workflows.cloudify.plugins.workflows.install',
+            'uninstall':
+                'default_workflows.cloudify.plugins.workflows.uninstall',
+        },
+        'node_types': dict(
+            ('aria.bench.nodes.Type{0}'.format(i), {
+                'properties': {'index': {'default': 0}},
+                'interfaces': {
+                    'cloudify.interfaces.lifecycle':
+                        _operations(LIFECYCLE_OPERATIONS, plugin),
+                },
+            }) for i, plugin in enumerate(plugins)),
+        'relationships': {
+            'aria.bench.relationships.depends_on': {
+                'source_interfaces': {
+                    'cloudify.interfaces.relationship_lifecycle':
+                        _operations(RELATIONSHIP_OPERATIONS, plugins[0]),
+                },
+            },
+        },
+    }
+
+
+def generate(directory,
+             nodes=100,
+             fan_out=2,
+             import_depth=1,
+             plugins=2,
+             install_plugins=False,
+             dsl_version=DEFAULT_DSL_VERSION,
+             seed=0):
+    """
+    Writes a synthetic blueprint
+    :param directory: folder to write the blueprint to
+    :type directory: str
+    :param nodes: number of nodes
+    :type nodes: int
+    :param fan_out: relationships of every node to earlier nodes
+    :type fan_out: int
+    :param import_depth: length of the chain of imported files,
+                         the last one declares the types
+    :type import_depth: int
+    :param plugins: number of stub plugins
+    :type plugins: int
+    :param install_plugins: mark the stub plugins for installation,
+                            which makes initialize run pip
+    :type install_plugins: bool
+    :param dsl_version: tosca_definitions_version of the blueprint
+    :type dsl_version: str
+    :param seed: seed of the relationship targets
+    :type seed: int
+    :return: path to the main blueprint file
+    """
+    if nodes < 1 or plugins < 1 or import_depth < 0 or fan_out < 0:
+        raise ValueError('nodes and plugins must be positive, '
+                         'fan_out and import_depth not negative')
+    rng = random.Random(seed)
+    plugin_names = [plugin_name(i) for i in range(plugins)]
+    for name in plugin_names:
+        _write_stub_plugin(directory, name)
+
+    types = _types_document(plugin_names, install_plugins)
+    imports = []
+    if import_depth:
+        for depth in range(import_depth):
+            document = {'tosca_definitions_version': dsl_version}
+            if depth + 1 < import_depth:
+                document['imports'] = ['types-{0}.yaml'.format(depth + 1)]
+            else:
+                document.update(types)
+            _dump(os.path.join(directory, 'types-{0}.yaml'.format(depth)),
+                  document)
+        imports = ['types-0.yaml']
+
+    node_templates = {}
+    for i in range(nodes):
+        template = {
+            'type': 'aria.bench.nodes.Type{0}'.format(i % plugins),
+            'properties': {'index': i},
+        }
+        targets = rng.sample(range(i), min(fan_out, i))
+        if targets:
+            template['relationships'] = [{
+                'type': 'aria.bench.relationships.depends_on',
+                'target': 'node_{0}'.format(target),
+            } for target in sorted(targets)]
+        node_templates['node_{0}'.format(i)] = template
+
+    blueprint = {
+        'tosca_definitions_version': dsl_version,
+        'node_templates': node_templates,
+        'outputs': dict(
+            ('index_{0}'.format(i), {
+                'value': {'get_property': ['node_{0}'.format(i), 'index']},
+            }) for i in range(min(nodes, 10))),
+    }
+    if imports:
+        blueprint['imports'] = imports
+    else:
+        blueprint.update(types)
+    path = os.path.join(directory, 'blueprint.yaml')
+    _dump(path, blueprint)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('directory')
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--fan-out', type=int, default=2)
+    parser.add_argument('--import-depth', type=int, default=1)
+    parser.add_argument('--plugins', type=int, default=2)
+    parser.add_argument('--install-plugins', action='store_true')
+    parser.add_argument('--dsl-version', default=DEFAULT_DSL_VERSION)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.directory,
+                   nodes=args.nodes,
+                   fan_out=args.fan_out,
+                   import_depth=args.import_depth,
+                   plugins=args.plugins,
+                   install_plugins=args.install_plugins,
+                   dsl_version=args.dsl_version,
+                   seed=args.seed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cold start regression benchmark.
+
+Imports the Aria CORE API in fresh interpreters and fails when the
+median import time exceeds the budget, or when modules that read-only
+commands never need (the workflow engine, the DSL parser) get loaded
+at import time.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 300
+DEFAULT_REPEAT = 7
+
+HEAVY_MODULES = (
+    'cloudify.workflows.local',
+    'dsl_parser.parser',
+)
+
+_PROBE = '''
+import json, sys, time
+started = time.time()
+import {module}
+elapsed = time.time() - started
+print(json.dumps({{
+    'elapsed_ms': elapsed * 1000,
+    'loaded': [m for m in {heavy!r} if m in sys.modules],
+}}))
+'''
+
+
+def measure(module, repeat):
+    samples = []
+    loaded = set()
+    probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', probe])
+        sample = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        samples.append(sample['elapsed_ms'])
+        loaded.update(sample['loaded'])
+    samples.sort()
+    return {
+        'module': module,
+        'repeat': repeat,
+        'median_ms': samples[len(samples) // 2],
+        'min_ms': samples[0],
+        'max_ms': samples[-1],
+        'heavy_modules_loaded': sorted(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--module', default='aria_core.api')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--budget-ms', type=float, default=float(
+        os.environ.get('ARIA_IMPORT_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    args = parser.parse_args()
+
+    report = measure(args.module, args.repeat)
+    report['budget_ms'] = args.budget_ms
+    report['passed'] = (report['median_ms'] <= args.budget_ms and
+                        not report['heavy_modules_loaded'])
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
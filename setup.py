@@ -33,6 +33,7 @@ setup(
         'pyyaml==3.10',
         'jinja2==2.7.2',
         'virtualenv-api',
+        'futures; python_version < "3"',
         'aria-script-plugin'  # Legacy dependency
     ]
 )
@@ -0,0 +1,134 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import unittest
+
+from aria_core import analytics
+
+LIFECYCLE = 'cloudify.interfaces.lifecycle.'
+
+
+def _event(event_type, seconds, node, operation, task_id=None,
+           plugin='script', **context):
+    context.update(node_id='{0}_1'.format(node),
+                   node_name=node,
+                   operation=operation,
+                   task_name='{0}.tasks.run'.format(plugin))
+    if task_id is not None:
+        context['task_id'] = task_id
+    return {'event_type': event_type,
+            'timestamp': '2016-01-01 00:00:{0:06.3f}'.format(seconds),
+            'context': context}
+
+
+def _task(started, ended, node, operation, task_id, succeeded=True,
+          **context):
+    return [
+        _event(analytics.TASK_STARTED, started, node, operation, task_id,
+               **context),
+        _event(analytics.TASK_SUCCEEDED if succeeded
+               else analytics.TASK_FAILED, ended, node, operation, task_id,
+               **context),
+    ]
+
+
+def _events():
+    # vm, then app and db in parallel, db failing once
+    return (_task(0, 10, 'vm', LIFECYCLE + 'create', '1', plugin='openstack') +
+            _task(10, 12, 'app', LIFECYCLE + 'create', '2') +
+            _task(10, 15, 'db', LIFECYCLE + 'create', '3', succeeded=False) +
+            _task(15.5, 20.25, 'db', LIFECYCLE + 'create', '4'))
+
+
+class PairTasksTest(unittest.TestCase):
+
+    def test_pairs_by_task_id(self):
+        events = _events()
+        # app and db run at the same time
+        events[3], events[4] = events[4], events[3]
+        samples = dict((sample.task_id, sample)
+                       for sample in analytics.pair_tasks(events))
+        self.assertEqual(['1', '2', '3', '4'], sorted(samples))
+        self.assertEqual(10, samples['1'].duration)
+        self.assertEqual('openstack', samples['1'].plugin)
+        self.assertEqual(('create', 'db', 'db_1'),
+                         (samples['3'].operation, samples['3'].node,
+                          samples['3'].node_instance))
+        self.assertFalse(samples['3'].succeeded)
+        self.assertEqual(4.75, samples['4'].duration)
+
+    def test_pairs_without_task_id(self):
+        events = _task(0, 1.5, 'vm', LIFECYCLE + 'start', None)
+        events[0]['@timestamp'] = '2016-01-01T00:00:00.000Z'
+        samples = list(analytics.pair_tasks(events))
+        self.assertEqual([1.5], [sample.duration for sample in samples])
+
+    def test_unmatched_events_are_ignored(self):
+        events = [
+            _event(analytics.TASK_SUCCEEDED, 1, 'vm', 'create', '1'),
+            _event(analytics.TASK_STARTED, 2, 'vm', 'start', '2'),
+            _event('sending_task', 2, 'vm', 'start', '2'),
+        ]
+        self.assertEqual([], list(analytics.pair_tasks(events)))
+
+
+class ExecutionAnalyticsTest(unittest.TestCase):
+
+    def test_histograms(self):
+        result = analytics.ExecutionAnalytics(_events()).to_dict()
+        self.assertEqual(4, result['operations']['create']['count'])
+        self.assertEqual(21.75, result['operations']['create']['sum'])
+        self.assertEqual(2, result['nodes']['db']['count'])
+        self.assertEqual(1, result['plugins']['openstack']['count'])
+        self.assertEqual({'create': 1}, result['failures'])
+        self.assertEqual({'vm': 10, 'app': 2, 'db': 10.25},
+                         result['node_durations'])
+
+    def test_critical_path_of_plan_dependencies(self):
+        dependencies = analytics.node_dependencies([
+            {'id': 'vm'},
+            {'id': 'app', 'relationships': [{'target_id': 'vm'}]},
+            {'id': 'db', 'relationships': [{'target_id': 'vm'}]},
+        ])
+        self.assertEqual(
+            {'path': [{'node': 'vm', 'duration': 10},
+                      {'node': 'db', 'duration': 10.25}],
+             'duration': 20.25},
+            analytics.ExecutionAnalytics(
+                _events(), dependencies=dependencies).critical_path())
+
+    def test_critical_path_of_relationship_events(self):
+        # app depends on vm, db runs on its own
+        events = _events() + _task(
+            12, 13, 'app', 'cloudify.interfaces.relationship_lifecycle.'
+            'establish', '5', source_id='app_1', target_id='vm_1')
+        execution_analytics = analytics.ExecutionAnalytics(events)
+        self.assertEqual({'app': set(['vm'])},
+                         dict(execution_analytics.dependencies))
+        self.assertEqual(
+            {'path': [{'node': 'vm', 'duration': 10},
+                      {'node': 'app', 'duration': 3}],
+             'duration': 13},
+            execution_analytics.critical_path())
+
+    def test_critical_path_of_a_cycle(self):
+        critical_path = analytics.ExecutionAnalytics(
+            _events(), dependencies={'vm': set(['db']),
+                                     'db': set(['vm'])}).critical_path()
+        self.assertEqual(20.25, critical_path['duration'])
+
+    def test_no_events(self):
+        self.assertEqual({'path': [], 'duration': 0},
+                         analytics.ExecutionAnalytics([]).critical_path())
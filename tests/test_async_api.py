@@ -0,0 +1,82 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+import threading
+import unittest
+
+from concurrent import futures
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from aria_core import async_api
+from aria_core import exceptions
+
+
+class AsyncAPITest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp(prefix='aria-async-')
+        self.loop = asyncio.new_event_loop() if asyncio else None
+        self.execution_executor = futures.ThreadPoolExecutor(max_workers=1)
+        self.core = async_api.AsyncAriaCoreAPI(
+            storage_path=self.storage_path,
+            loop=self.loop,
+            execution_executor=self.execution_executor)
+
+    def tearDown(self):
+        self.core.close()
+        self.execution_executor.shutdown()
+        if self.loop is not None:
+            self.loop.close()
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def _wait(self, future):
+        if self.loop is None:
+            return future.result(timeout=30)
+        return self.loop.run_until_complete(future)
+
+    def test_call(self):
+        self.assertEqual(
+            [], self._wait(self.core.executions.executions('bp')))
+
+    def test_call_error(self):
+        self.assertRaises(exceptions.AriaValidationError, self._wait,
+                          self.core.executions.resume('bp', 'missing'))
+
+    def test_cancel_pending_call(self):
+        release = threading.Event()
+        self.execution_executor.submit(release.wait)
+        try:
+            future = self.core.executions.resume('bp', 'missing')
+            self.assertTrue(future.cancel())
+        finally:
+            release.set()
+        self.execution_executor.shutdown()
+        if self.loop is not None:
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(future.cancelled())
+
+    def test_streamed_call(self):
+        results = self.core.executions.execute_many([])
+        self.assertIs(async_api.DONE, self._wait(results.pull()))
+        if self.loop is not None:
+            self.assertRaises(
+                StopAsyncIteration, self.loop.run_until_complete,
+                self.core.executions.execute_many([]).__anext__())
+        self._wait(results.close())
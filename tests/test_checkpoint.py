@@ -0,0 +1,175 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from aria_core import api
+from aria_core import checkpoint
+from aria_core import exceptions
+from aria_core import workflows
+from aria_core.dependencies import futures
+
+BLUEPRINT_ID = 'blueprint'
+EXECUTION_ID = 'execution'
+NODE_INSTANCE_IDS = ['vm_1', 'vm_2', 'app_1', 'app_2']
+
+
+class FakeContext(object):
+
+    class deployment(object):
+        id = BLUEPRINT_ID
+
+
+class FakeTask(object):
+
+    def __init__(self, node_instance_id, operation):
+        self.operation = operation
+        self.cloudify_context = {
+            'task_id': '{0}.{1}'.format(node_instance_id, operation)}
+
+
+def _execute_operation(node_instance, operation, **kwargs):
+    return FakeTask(node_instance.id, operation)
+
+
+class FakeNodeInstance(object):
+
+    # wrapped like the operations of local workflow node instances
+    execute_operation = checkpoint._checkpointing(
+        _execute_operation, checkpoint._node_key)
+
+    def __init__(self, ctx, node_instance_id):
+        self.ctx = ctx
+        self.id = node_instance_id
+
+
+class FakeEnvironment(object):
+    """
+    Runs the create operation of every node instance,
+    failing at the node instance it was told to
+    """
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.ran = []
+
+    def execute(self, workflow, parameters, **kwargs):
+        for node_instance_id in NODE_INSTANCE_IDS:
+            task = FakeNodeInstance(
+                FakeContext(), node_instance_id).execute_operation('create')
+            if isinstance(task, futures.aria_workflow_tasks
+                          .NOPLocalWorkflowTask):
+                continue
+            if node_instance_id == self.fail_at:
+                raise RuntimeError('{0} failed'.format(node_instance_id))
+            self.ran.append(node_instance_id)
+            futures.aria_logs.stdout_event_out({
+                'event_type': checkpoint.TASK_SUCCEEDED,
+                'message': {'text': 'Task succeeded', 'arguments': None},
+                'context': {
+                    'deployment_id': BLUEPRINT_ID,
+                    'task_id': task.cloudify_context['task_id'],
+                    'node_id': node_instance_id,
+                    'operation': task.operation,
+                }})
+        return list(self.ran)
+
+
+class CheckpointResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp(prefix='aria-checkpoint-')
+        self.checkpoint = checkpoint.Checkpoint(
+            BLUEPRINT_ID, EXECUTION_ID, storage_path=self.storage_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def _fail(self):
+        with self.assertRaises(RuntimeError):
+            workflows.generic_execute(
+                blueprint_id=BLUEPRINT_ID,
+                workflow_id='install',
+                parameters={'port': 8080},
+                environment=FakeEnvironment(fail_at='app_1'),
+                storage_path=self.storage_path,
+                execution_id=EXECUTION_ID,
+                task_retries=3)
+
+    def _executions(self, environment):
+        executions = api.ExecutionsAPI(self.storage_path)
+
+        @contextlib.contextmanager
+        def loaded_environment(blueprint_id):
+            yield environment
+
+        executions._environment = loaded_environment
+        return executions
+
+    def test_failed_execution_journals_succeeded_tasks(self):
+        self._fail()
+        header = self.checkpoint.header()
+        self.assertEqual(checkpoint.STATUS_FAILED, header['status'])
+        self.assertEqual('app_1 failed', header['error'])
+        self.assertEqual({'port': 8080}, header['parameters'])
+        self.assertEqual(
+            set([checkpoint.task_key('vm_1', 'create'),
+                 checkpoint.task_key('vm_2', 'create')]),
+            self.checkpoint.completed_tasks())
+
+    def test_resume_skips_completed_tasks(self):
+        self._fail()
+        environment = FakeEnvironment()
+        self.assertEqual(['app_1', 'app_2'], self._executions(
+            environment).resume(BLUEPRINT_ID, EXECUTION_ID))
+        header = self.checkpoint.header()
+        self.assertEqual(checkpoint.STATUS_COMPLETED, header['status'])
+        self.assertEqual(2, header['runs'])
+        self.assertEqual(3, header['execute_kwargs']['task_retries'])
+        self.assertEqual(
+            set(checkpoint.task_key(node_instance_id, 'create')
+                for node_instance_id in NODE_INSTANCE_IDS),
+            self.checkpoint.completed_tasks())
+
+    def test_resume_of_a_failed_resume(self):
+        self._fail()
+        environment = FakeEnvironment(fail_at='app_2')
+        with self.assertRaises(RuntimeError):
+            self._executions(environment).resume(BLUEPRINT_ID, EXECUTION_ID)
+        environment = FakeEnvironment()
+        self.assertEqual(['app_2'], self._executions(
+            environment).resume(BLUEPRINT_ID, EXECUTION_ID))
+        self.assertEqual(3, self.checkpoint.header()['runs'])
+
+    def test_completed_execution_is_not_resumed(self):
+        self._fail()
+        executions = self._executions(FakeEnvironment())
+        executions.resume(BLUEPRINT_ID, EXECUTION_ID)
+        with self.assertRaises(exceptions.AriaValidationError):
+            executions.resume(BLUEPRINT_ID, EXECUTION_ID)
+
+    def test_running_execution_is_not_resumed(self):
+        self._fail()
+        header = self.checkpoint.header()
+        header.update(status=checkpoint.STATUS_RUNNING, pid=os.getpid())
+        self.checkpoint._write_header(header)
+        self.assertTrue(self.checkpoint.running())
+        with self.assertRaises(exceptions.AriaValidationError):
+            self._executions(FakeEnvironment()).resume(
+                BLUEPRINT_ID, EXECUTION_ID)
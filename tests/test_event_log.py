@@ -0,0 +1,124 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+import time
+import unittest
+
+from aria_core import event_log
+from aria_core import exceptions
+
+
+class EventLogReadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='aria-event-log-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _offsets(self, records):
+        return [record.offset for record in records]
+
+    def test_read_empty_log(self):
+        writer = event_log.EventLogWriter(self.directory)
+        self.assertEqual([], event_log.read(self.directory))
+        writer.close()
+        self.assertEqual([], event_log.read(self.directory))
+
+    def test_follow_empty_log_times_out(self):
+        event_log.EventLogWriter(self.directory)
+        started = time.time()
+        records = list(event_log.follow(self.directory, poll_interval=0.05,
+                                        timeout=0.2))
+        self.assertEqual([], records)
+        self.assertLess(time.time() - started, 5)
+
+    def test_read_across_segment_roll(self):
+        writer = event_log.EventLogWriter(self.directory, segment_bytes=64,
+                                          index_interval_bytes=32)
+        for i in range(20):
+            writer.append({'i': i})
+        self.assertGreater(len(event_log._segments(self.directory)), 1)
+        records = event_log.read(self.directory)
+        self.assertEqual(list(range(20)), self._offsets(records))
+        self.assertEqual(list(range(20)),
+                         [record.event['i'] for record in records])
+        self.assertEqual(list(range(7, 20)),
+                         self._offsets(event_log.read(self.directory,
+                                                      since=7)))
+        writer.close()
+
+    def test_read_just_rolled_segment(self):
+        writer = event_log.EventLogWriter(self.directory, segment_bytes=64)
+        offset = 0
+        while len(event_log._segments(self.directory)) < 2:
+            offset = writer.append({'i': offset}) + 1
+        # the new segment holds a single event, read it and poll
+        # again while the segment has nothing more
+        cursor = event_log._Cursor(self.directory)
+        try:
+            self.assertEqual(list(range(offset)),
+                             self._offsets(cursor.read()))
+            self.assertEqual([], cursor.read())
+            writer.append({'i': offset})
+            self.assertEqual([offset], self._offsets(cursor.read()))
+        finally:
+            cursor.close()
+            writer.close()
+
+    def test_end_offset(self):
+        self.assertEqual(0, event_log.end_offset(self.directory))
+        writer = event_log.EventLogWriter(self.directory, segment_bytes=64)
+        self.assertEqual(0, event_log.end_offset(self.directory))
+        for i in range(20):
+            writer.append({'i': i})
+        self.assertEqual(20, event_log.end_offset(self.directory))
+        writer.close()
+
+
+class EventLogRecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp(prefix='aria-storage-')
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def test_record_refuses_concurrent_execution(self):
+        with event_log.record('blueprint', 'first',
+                              storage_path=self.storage_path):
+            self.assertEqual('first',
+                             event_log.running_execution('blueprint'))
+            with self.assertRaises(exceptions.AriaValidationError):
+                with event_log.record('blueprint', 'second',
+                                      storage_path=self.storage_path):
+                    pass
+            # the refused execution leaves the running one recorded
+            self.assertEqual('first',
+                             event_log.running_execution('blueprint'))
+        self.assertIsNone(event_log.running_execution('blueprint'))
+        with event_log.record('blueprint', 'second',
+                              storage_path=self.storage_path):
+            pass
+
+    def test_executions_are_ordered_by_start(self):
+        for execution_id in ('zeta', 'alpha', 'zeta'):
+            with event_log.record('blueprint', execution_id,
+                                  storage_path=self.storage_path):
+                pass
+            time.sleep(0.01)
+        self.assertEqual(['zeta', 'alpha'], event_log.executions(
+            'blueprint', storage_path=self.storage_path))
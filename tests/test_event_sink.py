@@ -0,0 +1,112 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import json
+import threading
+import time
+import unittest
+
+from aria_core import event_sink
+
+
+class HeldWriter(object):
+    """
+    Holds the first batch until released, the background
+    thread keeps it while the test fills the queue
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.holding = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, lines):
+        self.holding.set()
+        self.released.wait(5)
+        self.lines.extend(lines)
+
+
+class EventSinkOverflowTest(unittest.TestCase):
+
+    def _sink(self, overflow, max_queue_size=3, **kwargs):
+        self.writer = HeldWriter()
+        sink = event_sink.EventSink(
+            writer=self.writer, json_lines=True,
+            max_queue_size=max_queue_size, batch_size=1,
+            flush_interval=0, overflow=overflow, **kwargs)
+        self.addCleanup(sink.close, 5)
+        self.addCleanup(self.writer.released.set)
+        sink.put({'i': 0})
+        self.assertTrue(self.writer.holding.wait(5))
+        return sink
+
+    def _written(self, sink):
+        self.writer.released.set()
+        self.assertTrue(sink.flush(5))
+        return [json.loads(line) for line in self.writer.lines]
+
+    def test_drop_newest(self):
+        sink = self._sink(event_sink.DROP_NEWEST)
+        self.assertEqual([True] * 3 + [False],
+                         [sink.put({'i': i}) for i in range(1, 5)])
+        self.assertEqual(
+            [{'i': 0}, {'type': event_sink.DROPPED_EVENT_TYPE, 'count': 1},
+             {'i': 1}, {'i': 2}, {'i': 3}],
+            self._written(sink))
+        self.assertEqual({'queued': 0, 'written': 4, 'dropped': 1},
+                         sink.stats())
+
+    def test_drop_oldest(self):
+        sink = self._sink(event_sink.DROP_OLDEST)
+        self.assertEqual([True] * 4,
+                         [sink.put({'i': i}) for i in range(1, 5)])
+        self.assertEqual(
+            [{'i': 0}, {'type': event_sink.DROPPED_EVENT_TYPE, 'count': 1},
+             {'i': 2}, {'i': 3}, {'i': 4}],
+            self._written(sink))
+
+    def test_sample(self):
+        sink = self._sink(event_sink.SAMPLE, max_queue_size=10,
+                          sample_rate=2, sample_threshold=0.5)
+        # sampling starts once 5 events are queued
+        self.assertEqual([True] * 5 + [False, True, False, True],
+                         [sink.put({'i': i}) for i in range(1, 10)])
+        written = self._written(sink)
+        self.assertEqual([0, 1, 2, 3, 4, 5, 7, 9],
+                         [event['i'] for event in written if 'i' in event])
+        self.assertEqual(2, sink.stats()['dropped'])
+
+    def test_block(self):
+        sink = self._sink(event_sink.BLOCK, max_queue_size=2)
+        sink.put({'i': 1})
+        sink.put({'i': 2})
+        blocked = threading.Thread(target=sink.put, args=({'i': 3},))
+        blocked.start()
+        time.sleep(0.2)
+        self.assertTrue(blocked.is_alive())
+        self.writer.released.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        self.assertEqual(
+            [0, 1, 2, 3], [event['i'] for event in self._written(sink)])
+        self.assertEqual(0, sink.stats()['dropped'])
+
+    def test_closed_sink_refuses_events(self):
+        sink = self._sink(event_sink.BLOCK)
+        self.writer.released.set()
+        sink.close(5)
+        self.assertEqual([{'i': 0}], self._written(sink))
+        with self.assertRaises(event_sink.exceptions.AriaError):
+            sink.put({'i': 1})
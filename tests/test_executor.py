@@ -0,0 +1,41 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import unittest
+
+from aria_core import exceptions
+from aria_core import executor
+
+
+class ExecuteManyTest(unittest.TestCase):
+
+    def _run(self, deployments, **kwargs):
+        return list(executor.execute_many(deployments, 'install', **kwargs))
+
+    def test_no_deployments(self):
+        self.assertEqual([], self._run([], concurrency=2,
+                                       retry_policy={'max_retries': 1}))
+
+    def test_repeated_blueprint_is_refused(self):
+        with self.assertRaises(exceptions.AriaValidationError):
+            self._run(['first', {'blueprint_id': 'first'}])
+
+    def test_invalid_settings_are_refused(self):
+        with self.assertRaises(exceptions.AriaValidationError):
+            self._run(['first'], concurrency=0)
+        with self.assertRaises(exceptions.AriaValidationError):
+            self._run(['first'], limits={'plugin:openstack': 0})
+        with self.assertRaises(exceptions.AriaValidationError):
+            self._run(['first'], retry_policy={'jitter': 'unknown'})
@@ -0,0 +1,80 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from aria_core import importer
+
+PLUGIN = 'aria_importer_test_plugin'
+
+
+class PluginPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='aria-importer-')
+
+    def tearDown(self):
+        sys.modules.pop(PLUGIN, None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _site_packages(self, version):
+        path = os.path.join(self.directory, version)
+        os.makedirs(os.path.join(
+            path, '{0}-{1}.dist-info'.format(PLUGIN, version)))
+        with open(os.path.join(path, PLUGIN + '.py'), 'w') as f:
+            f.write('VERSION = {0!r}\n'.format(version))
+        return path
+
+    def _version(self):
+        return __import__(PLUGIN).VERSION
+
+    def test_import_is_scoped(self):
+        path = self._site_packages('1.0')
+        with importer.plugin_path(path):
+            self.assertEqual([path], importer.active_plugin_paths())
+            self.assertEqual('1.0', self._version())
+        self.assertEqual([], importer.active_plugin_paths())
+        self.assertNotIn(PLUGIN, sys.modules)
+        self.assertRaises(ImportError, self._version)
+
+    def test_versions_are_isolated(self):
+        first = self._site_packages('1.0')
+        second = self._site_packages('2.0')
+        with importer.plugin_path(first):
+            self.assertEqual('1.0', self._version())
+        with importer.plugin_path(second):
+            self.assertEqual('2.0', self._version())
+
+    def test_conflicting_versions_are_serialized(self):
+        first = self._site_packages('1.0')
+        second = self._site_packages('2.0')
+        registered = threading.Event()
+        seen = []
+
+        def run_second():
+            with importer.plugin_path(second):
+                registered.set()
+                seen.append(importer.active_plugin_paths())
+
+        with importer.plugin_path(first):
+            thread = threading.Thread(target=run_second)
+            thread.start()
+            self.assertFalse(registered.wait(0.2))
+        thread.join(10)
+        self.assertEqual([[second]], seen)
@@ -0,0 +1,104 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import sys
+import threading
+import unittest
+
+from aria_core import instrumentation
+
+
+def first_task():
+    return sum(range(1000))
+
+
+def second_task():
+    return sum(range(1000))
+
+
+def nested_task():
+    thread = threading.Thread(target=first_task)
+    thread.start()
+    thread.join()
+
+
+def _profiled_functions(report):
+    return set(row['function'].rsplit('(', 1)[1].rstrip(')')
+               for row in report.profile)
+
+
+@unittest.skipIf(sys.version_info >= (3, 12),
+                 'cProfile follows every thread from python 3.12 on')
+class ThreadProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.configure(profile=True)
+
+    def tearDown(self):
+        instrumentation.configure()
+
+    def _measure(self, operation, target, reports, started, proceed):
+        with instrumentation.measure(operation) as report:
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+            started.set()
+            proceed.wait(5)
+        reports[operation] = report
+
+    def test_thread_is_profiled_into_the_call_that_started_it(self):
+        reports = {}
+        first_started, second_started = threading.Event(), threading.Event()
+        proceed = threading.Event()
+        calls = [
+            threading.Thread(target=self._measure, args=(
+                'first', first_task, reports, first_started, proceed)),
+            threading.Thread(target=self._measure, args=(
+                'second', second_task, reports, second_started, proceed)),
+        ]
+        for call in calls:
+            call.start()
+        # both calls are profiled while their threads run
+        first_started.wait(5)
+        second_started.wait(5)
+        proceed.set()
+        for call in calls:
+            call.join()
+        self.assertIn('first_task', _profiled_functions(reports['first']))
+        self.assertNotIn('second_task',
+                         _profiled_functions(reports['first']))
+        self.assertIn('second_task', _profiled_functions(reports['second']))
+        self.assertNotIn('first_task',
+                         _profiled_functions(reports['second']))
+
+    def test_threads_of_threads_are_profiled(self):
+        with instrumentation.measure('nested') as report:
+            thread = threading.Thread(target=nested_task)
+            thread.start()
+            thread.join()
+        self.assertTrue(set(['nested_task', 'first_task']).issubset(
+            _profiled_functions(report)))
+
+    def test_threads_started_after_the_call_are_not_profiled(self):
+        with instrumentation.measure('call'):
+            pass
+        self.assertIs(instrumentation._thread_start,
+                      threading.Thread.__dict__['start'])
+        profiles = []
+        thread = threading.Thread(
+            target=lambda: profiles.append(sys.getprofile()))
+        thread.start()
+        thread.join()
+        self.assertEqual([None], profiles)
@@ -0,0 +1,147 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from aria_core.processor import plan_cache
+
+
+class FakeResolver(object):
+
+    def __init__(self, imports):
+        self.imports = imports
+
+    def fetch_import(self, import_url):
+        return self.imports[import_url]
+
+
+class FakeParser(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def parse_from_path(self, dsl_file_path, resolver=None, **kwargs):
+        self.calls.append(kwargs)
+        with open(dsl_file_path) as f:
+            imports = f.read().split()
+        return {'imports': [resolver.fetch_import(url) for url in imports]}
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='aria-plan-cache-')
+        self.cache_dir = os.path.join(self.work_dir, 'plan-cache')
+        self.blueprint_path = os.path.join(self.work_dir, 'blueprint.yaml')
+        self._write_blueprint('types.yaml')
+        self.resolver = FakeResolver({'types.yaml': 'types: 1'})
+        self.parser = FakeParser()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _write_blueprint(self, content):
+        with open(self.blueprint_path, 'w') as f:
+            f.write(content)
+
+    def _cache(self, cache_dir=None):
+        return plan_cache.PlanCache(
+            cache_dir=cache_dir or self.cache_dir, parser=self.parser)
+
+    def _parse(self, cache, **kwargs):
+        return cache.parse_from_path(
+            self.blueprint_path, resolver=self.resolver, **kwargs)
+
+    def test_hit(self):
+        cache = self._cache()
+        plan = self._parse(cache)
+        plan['imports'].append('changed by the caller')
+        self.assertEqual({'imports': ['types: 1']}, self._parse(cache))
+        self.assertEqual(1, len(self.parser.calls))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_hit_on_disk(self):
+        self._parse(self._cache())
+        cache = self._cache()
+        self.assertEqual({'imports': ['types: 1']}, self._parse(cache))
+        self.assertEqual(1, len(self.parser.calls))
+        self.assertEqual(1, cache.hits)
+
+    def test_miss_when_an_import_changes(self):
+        cache = self._cache()
+        self._parse(cache)
+        self.resolver.imports['types.yaml'] = 'types: 2'
+        self.assertEqual({'imports': ['types: 2']}, self._parse(cache))
+        self.assertEqual(2, len(self.parser.calls))
+
+    def test_miss_when_the_blueprint_changes(self):
+        cache = self._cache()
+        self._parse(cache)
+        self.resolver.imports['other.yaml'] = 'other: 1'
+        self._write_blueprint('other.yaml')
+        self.assertEqual({'imports': ['other: 1']}, self._parse(cache))
+        self.assertEqual(2, len(self.parser.calls))
+
+    def test_default_arguments_share_an_entry(self):
+        cache = self._cache()
+        self._parse(cache)
+        self._parse(cache, validate_version=True,
+                    additional_resource_sources=())
+        self._parse(cache, validate_version=False)
+        self.assertEqual(2, len(self.parser.calls))
+
+    def test_clear(self):
+        cache = self._cache()
+        self._parse(cache)
+        cache.clear()
+        self._parse(cache)
+        self.assertEqual(2, len(self.parser.calls))
+
+    def test_private_dir(self):
+        self._parse(self._cache())
+        self.assertEqual(
+            0o700, stat.S_IMODE(os.stat(self.cache_dir).st_mode))
+        os.chmod(self.cache_dir, 0o777)
+        self._parse(self._cache())
+        self.assertEqual(
+            0o700, stat.S_IMODE(os.stat(self.cache_dir).st_mode))
+
+    def test_linked_dir_is_not_used(self):
+        target = os.path.join(self.work_dir, 'target')
+        os.mkdir(target)
+        os.symlink(target, self.cache_dir)
+        self._parse(self._cache())
+        self._parse(self._cache())
+        self.assertEqual([], os.listdir(target))
+        self.assertEqual(2, len(self.parser.calls))
+
+    @unittest.skipUnless(os.getuid() == 0, 'changing owners needs root')
+    def test_dir_of_another_user_is_not_used(self):
+        self._parse(self._cache())
+        os.chown(self.cache_dir, 4242, 4242)
+        self._parse(self._cache())
+        self.assertEqual(2, len(self.parser.calls))
+
+    def test_storage_folder_cache(self):
+        self.assertIs(
+            plan_cache.get_plan_cache(storage_path=self.work_dir),
+            plan_cache.get_plan_cache(storage_path=self.work_dir))
+        self.assertEqual(
+            self.cache_dir,
+            plan_cache.get_plan_cache(storage_path=self.work_dir)._cache_dir)
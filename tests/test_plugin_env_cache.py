@@ -0,0 +1,105 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from aria_core.processor import plugin_env_cache
+
+PYTHON = 'aria-test-python'
+
+
+class PluginEnvCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp(prefix='aria-plugin-envs-')
+        self.cache = plugin_env_cache.get_plugin_env_cache(
+            storage_path=self.storage_path)
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def _build(self, path):
+        self.builds.append(path)
+        os.makedirs(path)
+
+    def _acquire(self, blueprint_id, requirements):
+        return self.cache.acquire(blueprint_id, set(requirements),
+                                  PYTHON, self._build)
+
+    def _index(self):
+        with open(os.path.join(self.cache.root,
+                               plugin_env_cache.INDEX_FILE_NAME)) as f:
+            return json.load(f)
+
+    def test_shared_by_requirements(self):
+        first = self._acquire('bp1', ['a==1', 'b==1'])
+        second = self._acquire('bp2', ['b==1', 'a==1'])
+        other = self._acquire('bp3', ['a==2'])
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual([first, other], self.builds)
+        self.assertEqual(['bp1', 'bp2'], sorted(
+            self._index()[os.path.basename(first)]['blueprints']))
+
+    def test_released_environments_are_collected(self):
+        self.cache = plugin_env_cache.PluginEnvCache(
+            self.cache.root, max_unused=1)
+        old = self._acquire('bp1', ['a==1'])
+        shared = self._acquire('bp2', ['b==1'])
+        self._acquire('bp3', ['b==1'])
+        self.cache.release('bp1')
+        self.assertTrue(os.path.isdir(old))
+        self.cache.release('bp2')
+        self.assertTrue(os.path.isdir(shared))
+        self.cache.release('bp3')
+        # least recently used first
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.isdir(shared))
+        self.assertEqual([os.path.basename(shared)], list(self._index()))
+
+    def test_locked_environment_is_not_collected(self):
+        self.cache = plugin_env_cache.PluginEnvCache(
+            self.cache.root, max_unused=0)
+        path = self._acquire('bp1', ['a==1'])
+        with plugin_env_cache.env_lock(path):
+            self.cache.release('bp1')
+        self.assertTrue(os.path.isdir(path))
+        self.cache.release('bp1')
+        self.assertFalse(os.path.exists(path))
+
+    def test_edited_local_source_gets_its_own_environment(self):
+        source = os.path.join(self.storage_path, 'plugin')
+        os.makedirs(source)
+        with open(os.path.join(source, 'setup.py'), 'w') as f:
+            f.write('version = 1\n')
+        first = self._acquire('bp1', [source])
+        with open(os.path.join(source, 'setup.py'), 'w') as f:
+            f.write('version = 2\n')
+        self.assertNotEqual(first, self._acquire('bp1', [source]))
+
+    def test_unlink_environment(self):
+        shared = self._acquire('bp1', ['a==1'])
+        venv_path = os.path.join(self.storage_path, 'bp1', '.venv')
+        plugin_env_cache.link_environment(shared, venv_path)
+        plugin_env_cache.unlink_environment(
+            'bp1', venv_path, storage_path=self.storage_path)
+        self.assertFalse(os.path.lexists(venv_path))
+        self.assertTrue(os.path.isdir(shared))
+        self.assertEqual(
+            [], self._index()[os.path.basename(shared)]['blueprints'])
@@ -0,0 +1,144 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import shutil
+import tempfile
+import time
+import unittest
+
+from aria_core import event_log
+from aria_core import exceptions
+from aria_core import retry
+from aria_core.dependencies import futures
+
+BLUEPRINT_ID = 'blueprint'
+EXECUTION_ID = 'execution'
+
+
+class FakeContext(object):
+
+    class deployment(object):
+        id = BLUEPRINT_ID
+
+
+class FakeAsyncResult(object):
+
+    def __init__(self, error):
+        self._error = error
+
+    @property
+    def result(self):
+        raise self._error
+
+
+def _duplicate_for_retry(task, execute_after):
+    return execute_after
+
+
+class FakeTask(object):
+
+    # wrapped like the retries of local workflow tasks
+    duplicate_for_retry = retry._scheduling(_duplicate_for_retry)
+
+    def __init__(self, error, current_retries=0, operation='create'):
+        self.workflow_context = FakeContext()
+        self.current_retries = current_retries
+        self.cloudify_context = {'operation': {'name': operation}}
+        self.async_result = FakeAsyncResult(error)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_exponential_delay(self):
+        policy = retry.RetryPolicy(initial_delay=1, backoff=2, max_delay=5,
+                                   jitter=retry.NO_JITTER)
+        self.assertEqual([1, 2, 4, 5, 5],
+                         [policy.delay(i) for i in range(1, 6)])
+
+    def test_jitter(self):
+        full = retry.RetryPolicy(initial_delay=4, jitter=retry.FULL_JITTER)
+        equal = retry.RetryPolicy(initial_delay=4, jitter=retry.EQUAL_JITTER)
+        for _ in range(20):
+            self.assertTrue(0 <= full.delay(1) <= 4)
+            self.assertTrue(2 <= equal.delay(1) <= 4)
+
+    def test_operation_overrides(self):
+        policy = retry.RetryPolicy(
+            initial_delay=1, jitter=retry.NO_JITTER,
+            overrides={'create': {'initial_delay': 10},
+                       'cloudify.interfaces.lifecycle.start': {
+                           'initial_delay': 20}})
+        self.assertEqual(10, policy.delay(
+            1, operation='cloudify.interfaces.lifecycle.create'))
+        self.assertEqual(20, policy.delay(
+            1, operation='cloudify.interfaces.lifecycle.start'))
+        self.assertEqual(1, policy.delay(
+            1, operation='cloudify.interfaces.lifecycle.stop'))
+        self.assertEqual(policy.to_dict(), retry.RetryPolicy.from_dict(
+            policy.to_dict()).to_dict())
+
+    def test_invalid_policy(self):
+        with self.assertRaises(exceptions.AriaValidationError):
+            retry.RetryPolicy(jitter='unknown')
+        with self.assertRaises(exceptions.AriaValidationError):
+            retry.RetryPolicy(backoff=0.5)
+
+
+class RetrySchedulingTest(unittest.TestCase):
+
+    def setUp(self):
+        storage_path = tempfile.mkdtemp(prefix='aria-retry-')
+        self.addCleanup(shutil.rmtree, storage_path, True)
+        recording = event_log.record(BLUEPRINT_ID, EXECUTION_ID,
+                                     storage_path=storage_path)
+        recording.__enter__()
+        self.addCleanup(recording.__exit__, None, None, None)
+        self.policy = retry.RetryPolicy(initial_delay=2, backoff=2,
+                                        max_delay=60,
+                                        jitter=retry.NO_JITTER)
+
+    def _delay(self, error, current_retries=0):
+        now = time.time()
+        with retry.scheduling(EXECUTION_ID, self.policy):
+            execute_after = FakeTask(
+                error, current_retries=current_retries).duplicate_for_retry(
+                    now + 30)
+        return round(execute_after - now)
+
+    def _operation_retry(self, retry_after):
+        return futures.aria_aside_exceptions.OperationRetry(
+            'retry', retry_after=retry_after)
+
+    def test_policy_delay(self):
+        self.assertEqual(2, self._delay(ValueError('failed')))
+        self.assertEqual(8, self._delay(ValueError('failed'),
+                                        current_retries=2))
+
+    def test_retry_after_longer_than_the_policy_delay(self):
+        self.assertEqual(7, self._delay(self._operation_retry(7)))
+
+    def test_retry_after_shorter_than_the_policy_delay(self):
+        self.assertEqual(8, self._delay(self._operation_retry(1),
+                                        current_retries=2))
+
+    def test_retry_without_retry_after(self):
+        self.assertEqual(2, self._delay(self._operation_retry(None)))
+
+    def test_other_executions_keep_their_interval(self):
+        now = time.time()
+        with retry.scheduling('other execution', self.policy):
+            execute_after = FakeTask(
+                ValueError('failed')).duplicate_for_retry(now + 30)
+        self.assertEqual(30, round(execute_after - now))
@@ -0,0 +1,125 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from aria_core import api
+from aria_core import blueprints
+from aria_core import sqlite_storage
+from aria_core import storage
+from aria_core.dependencies import futures
+
+BLUEPRINT_ID = 'blueprint'
+NODE_INSTANCES = [
+    {'id': '{0}_{1}'.format(node_id, i),
+     'node_id': node_id,
+     'state': 'started' if i % 2 else 'deleted',
+     'host_id': 'vm_{0}'.format(i % 3),
+     'version': 1}
+    for node_id in ('app', 'db', 'vm') for i in range(7)]
+
+
+class QueryNodeInstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_path = tempfile.mkdtemp(prefix='aria-storage-')
+        blueprint_dir = os.path.join(self.storage_path, 'blueprint-dir')
+        os.mkdir(blueprint_dir)
+        self.blueprint_path = os.path.join(blueprint_dir, 'blueprint.yaml')
+        with open(self.blueprint_path, 'w') as f:
+            f.write('tosca_definitions_version: cloudify_dsl_1_3\n')
+        # pages of the SQLite backend end inside the result
+        self._page_size = sqlite_storage.QUERY_PAGE_SIZE
+        sqlite_storage.QUERY_PAGE_SIZE = 4
+
+    def tearDown(self):
+        sqlite_storage.QUERY_PAGE_SIZE = self._page_size
+        shutil.rmtree(self.storage_path, ignore_errors=True)
+
+    def _storage(self, backend):
+        return blueprints.init_blueprint_storage(
+            BLUEPRINT_ID, storage_path=self.storage_path,
+            storage_backend=backend)
+
+    def _init(self, backend):
+        deployment_storage = self._storage(backend)
+        deployment_storage.init(BLUEPRINT_ID, {}, [],
+                                [dict(i) for i in NODE_INSTANCES],
+                                self.blueprint_path, {})
+        return deployment_storage
+
+    @staticmethod
+    def _ids(node_instances):
+        return [node_instance['id'] for node_instance in node_instances]
+
+    def _pages(self, deployment_storage, limit, **filters):
+        pages, after = [], None
+        while True:
+            page = self._ids(storage.query_node_instances(
+                deployment_storage, after=after, limit=limit, **filters))
+            if not page:
+                return pages
+            pages.append(page)
+            after = page[-1]
+
+    def _check_queries(self, deployment_storage):
+        all_ids = sorted(i['id'] for i in NODE_INSTANCES)
+        self.assertEqual(all_ids, self._ids(
+            storage.query_node_instances(deployment_storage)))
+        self.assertEqual(
+            [all_ids[i:i + 5] for i in range(0, len(all_ids), 5)],
+            self._pages(deployment_storage, 5))
+        self.assertEqual(
+            [['app_1', 'app_3'], ['app_5', 'vm_1'], ['vm_3', 'vm_5']],
+            self._pages(deployment_storage, 2,
+                        node_ids=['vm', 'app'], states='started'))
+        self.assertEqual(['db_1', 'db_4'], self._ids(
+            storage.query_node_instances(
+                deployment_storage, node_ids='db', host_ids='vm_1')))
+        self.assertEqual([], self._ids(
+            storage.query_node_instances(deployment_storage, node_ids=[])))
+
+    def test_file_backend(self):
+        self._check_queries(self._init(storage.FILE_BACKEND))
+
+    def test_sqlite_backend(self):
+        self._check_queries(self._init(storage.SQLITE_BACKEND))
+
+    def test_sqlite_version_conflict(self):
+        deployment_storage = self._init(storage.SQLITE_BACKEND)
+        deployment_storage.update_node_instance(
+            'vm_0', 1, runtime_properties={'ip': '10.0.0.1'})
+        with self.assertRaises(futures.aria_local.StorageConflictError):
+            deployment_storage.update_node_instance(
+                'vm_0', 1, runtime_properties={'ip': '10.0.0.2'})
+        # state updates apply whatever the version
+        deployment_storage.update_node_instance('vm_0', 1, state='stopped')
+        node_instance = deployment_storage.get_node_instance('vm_0')
+        self.assertEqual(3, node_instance['version'])
+        self.assertEqual('stopped', node_instance['state'])
+        self.assertEqual({'ip': '10.0.0.1'},
+                         node_instance['runtime_properties'])
+
+    def test_migrate_storage(self):
+        self._init(storage.FILE_BACKEND)
+        core = api.AriaCoreAPI(storage_path=self.storage_path)
+        self.assertEqual({BLUEPRINT_ID: len(NODE_INSTANCES)},
+                         core.migrate_storage())
+        deployment_storage = self._storage(storage.SQLITE_BACKEND)
+        deployment_storage.load(BLUEPRINT_ID)
+        self._check_queries(deployment_storage)
@@ -0,0 +1,77 @@
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from aria_core import constants
+from aria_core import wd_settings
+
+
+class WorkingDirSettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='aria-wd-')
+        self.settings = os.path.join(
+            self.directory, constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
+        wd_settings.invalidate()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        wd_settings.invalidate()
+
+    def test_uninitialized_working_dir(self):
+        with wd_settings.working_dir(self.directory):
+            self.assertIsNone(wd_settings.get_init_path())
+            os.mkdir(self.settings)
+            self.assertEqual(self.settings, wd_settings.get_init_path())
+
+    def test_working_dir_is_scoped_to_the_thread(self):
+        os.mkdir(self.settings)
+        other = tempfile.mkdtemp(prefix='aria-wd-', dir=self.directory)
+        other_settings = os.path.join(
+            other, constants.ARIA_WD_SETTINGS_DIRECTORY_NAME)
+        os.mkdir(other_settings)
+        seen = {}
+
+        def lookup(name, cwd):
+            seen[name] = wd_settings.get_init_path(cwd=cwd)
+
+        with wd_settings.working_dir(self.directory):
+            thread = threading.Thread(target=lookup, args=('thread', other))
+            thread.start()
+            thread.join()
+            lookup('main', other)
+        self.assertEqual({'main': self.settings, 'thread': other_settings},
+                         seen)
+
+    def test_miss_is_remembered_until_invalidated(self):
+        nested = os.path.join(self.directory, 'nested')
+        os.mkdir(nested)
+        self.assertIsNone(wd_settings.get_init_path(cwd=nested))
+        os.mkdir(self.settings)
+        self.assertIsNone(wd_settings.get_init_path(cwd=nested))
+        wd_settings.invalidate()
+        self.assertEqual(self.settings, wd_settings.get_init_path(cwd=nested))
+
+    def test_removed_folder_is_looked_up_again(self):
+        nested = os.path.join(self.directory, 'nested')
+        os.mkdir(nested)
+        os.mkdir(self.settings)
+        self.assertEqual(self.settings, wd_settings.get_init_path(cwd=nested))
+        shutil.rmtree(self.settings)
+        self.assertIsNone(wd_settings.get_init_path(cwd=nested))